@@ -34,6 +34,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "retailing.middleware.CompressionMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -101,6 +102,23 @@ STATIC_URL = "/static/"
 
 AUTH_USER_MODEL = "users.Users"
 
+# Алгоритмы хеширования паролей. Новые пароли хешируются первым алгоритмом, хеши других алгоритмов
+# (или с устаревшим количеством итераций) заменяются при успешном входе пользователя. Алгоритмы, требующие
+# дополнительных пакетов (Argon2, BCrypt), не используются.
+PASSWORD_HASHERS = [
+    "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+]
+
+# Вход в систему: количество потоков проверки паролей в процессе, длина очереди проверок, значение Retry-After
+# при переполнении очереди и время кеширования обновления access-токена по refresh-токену (секунды). Проверки
+# в пуле и в очереди занимают рабочие потоки запросов, поэтому LOGIN_HASH_WORKERS + LOGIN_HASH_QUEUE вместе
+# с ADMISSION_CONTROL должны быть заметно меньше количества потоков процесса.
+LOGIN_HASH_WORKERS = 2
+LOGIN_HASH_QUEUE = 2
+LOGIN_RETRY_AFTER = 1
+TOKEN_REFRESH_CACHE_TIMEOUT = 30
+
 LOGIN_REDIRECT_URL = "/"
 LOGOUT_REDIRECT_URL = "/"
 
@@ -111,12 +129,19 @@ EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
 
 REST_FRAMEWORK = {
     "DEFAULT_FILTER_BACKENDS": ["django_filters.rest_framework.DjangoFilterBackend"],
-    "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
-    ),
+    "DEFAULT_AUTHENTICATION_CLASSES": ("users.authentication.CachedJWTAuthentication",),
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
+    "DEFAULT_RENDERER_CLASSES": [
+        "retailing.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "retailing.renderers.ORJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
     "DATETIME_FORMAT": "%d-%m-%Y %H:%M:%S",
     "DATE_FORMAT": "%d-%m-%Y",
 }
@@ -130,9 +155,132 @@ SIMPLE_JWT = {
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
 }
 
+# Кеш ответов публичных справочников. По умолчанию локальная память процесса, в продакшене задается общий
+# кеш через переменные окружения (например django.core.cache.backends.redis.RedisCache).
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv(
+            "CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.getenv("CACHE_LOCATION", ""),
+    }
+}
+CATALOG_CACHE_ALIAS = "default"
+CATALOG_CACHE_TIMEOUT = int(os.getenv("CATALOG_CACHE_TIMEOUT", 60))
+CATALOG_CACHE_LOCK_TIMEOUT = 10
+CATALOG_FRAGMENT_TIMEOUT = 24 * 60 * 60
+
+# Максимальное количество id в одном запросе пакетного получения объектов.
+BATCH_MAX_IDS = 5000
+
+# Максимальный размер страницы журнала изменений для синхронизации и срок хранения журнала в днях (prune_sync).
+SYNC_PAGE_SIZE = 500
+SYNC_RETENTION_DAYS = 30
+
+# Поток событий поставщика (SSE): интервал heartbeat в секундах, размер порции, максимальное отставание
+# клиента при возобновлении и количество одновременных потоков в процессе.
+EVENT_STREAM_HEARTBEAT = 15
+EVENT_STREAM_BATCH_SIZE = 100
+EVENT_STREAM_MAX_BACKLOG = 1000
+EVENT_STREAM_MAX_CONNECTIONS = 500
+
+# Рейтинги товаров: размер счетчика просмотров в процессе, интервал записи просмотров в БД (секунды),
+# окна рейтингов (дни) и количество мест в рейтинге.
+LEADERBOARD_COUNTER_CAPACITY = 1000
+LEADERBOARD_FLUSH_INTERVAL = 60
+LEADERBOARD_WINDOWS = (1, 7, 30)
+LEADERBOARD_SIZE = 20
+
+# Секционирование журнала операций по месяцам: количество заранее создаваемых будущих секций, срок хранения
+# секций в таблице (месяцы) и каталог архивов выгруженных секций.
+ORDER_PARTITION_PREMAKE_MONTHS = 3
+ORDER_PARTITION_RETENTION_MONTHS = 24
+ORDER_ARCHIVE_DIR = os.path.join(BASE_DIR, "archive")
+
+# Архивация списанных задолженностей: возраст списания в днях и размер порции переноса.
+PAYABLE_ARCHIVE_DAYS = 90
+PAYABLE_ARCHIVE_BATCH_SIZE = 1000
+
+# Пакетная загрузка операций: количество рабочих потоков, размер порции, максимальное количество строк файла
+# и время без прогресса (секунды), после которого задание считается прерванным (команда requeue_imports).
+ORDER_IMPORT_WORKERS = 2
+ORDER_IMPORT_BATCH_SIZE = 500
+ORDER_IMPORT_MAX_LINES = 100000
+ORDER_IMPORT_STALE_TIMEOUT = 600
+
+# Исходящие уведомления: размер порции, максимальная частота отправки (в секунду), количество попыток,
+# начальная пауза перед повтором и время, на которое забранное процессом уведомление откладывается (секунды).
+# Захват продлевается перед отправкой каждого уведомления, поэтому OUTBOX_CLAIM_TIMEOUT должен превышать
+# время отправки одного уведомления (EMAIL_TIMEOUT, TELEGRAM_TIMEOUT), а не всей порции.
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_RATE_LIMIT = 20
+OUTBOX_MAX_ATTEMPTS = 8
+OUTBOX_RETRY_DELAY = 30
+OUTBOX_CLAIM_TIMEOUT = 300
+
+# Ограничение одновременных запросов на запись в рабочем процессе по областям представлений: concurrency -
+# количество одновременно выполняемых запросов, queue - длина очереди ожидающих, max_wait - максимальное ожидание
+# в очереди (секунды), per_supplier - количество одновременных запросов одного поставщика (suppliers - отдельные
+# значения по id поставщика), retry_after - значение заголовка Retry-After ответов 429 и 503. Значения действуют
+# в каждом процессе отдельно и рассчитаны на многопоточные рабочие процессы: при N процессах общий предел
+# и предел поставщика делятся на N (retailing/admission.py). Ожидающие в очереди запросы тоже занимают потоки
+# процесса, поэтому сумма concurrency + queue по всем областям (вместе с проверками паролей, LOGIN_HASH_*)
+# должна быть заметно меньше количества потоков: значения ниже рассчитаны на 16 потоков и оставляют потоки
+# для чтения.
+ADMISSION_CONTROL = {
+    "order_write": {
+        "concurrency": 4,
+        "queue": 2,
+        "max_wait": 2,
+        "per_supplier": 2,
+        "suppliers": {},
+        "retry_after": 1,
+    },
+    "order_import": {
+        "concurrency": 1,
+        "queue": 0,
+        "max_wait": 0,
+        "per_supplier": 1,
+        "suppliers": {},
+        "retry_after": 5,
+    },
+}
+
+# Варианты изображений продуктов и аватаров: количество фоновых потоков обработки, размеры вариантов
+# (вписываются в прямоугольник), качество JPEG/WebP и срок кеширования вариантов клиентом (секунды; при DEBUG
+# варианты отдает Django, в рабочем режиме такой же срок задается в настройках веб-сервера).
+IMAGE_WORKERS = 1
+IMAGE_VARIANTS = {
+    "thumbnail": (160, 160),
+    "card": (480, 480),
+    "full": (1600, 1600),
+}
+IMAGE_QUALITY = 85
+IMAGE_VARIANTS_MAX_AGE = 365 * 24 * 60 * 60
+
+# Сжатие ответов: минимальный размер тела для сжатия (потоковые ответы сжимаются всегда).
+COMPRESSION_MIN_LENGTH = 1024
+
+# Шина инвалидации локальных кешей рабочих процессов через LISTEN/NOTIFY PostgreSQL.
+CACHE_INVALIDATION_LISTENER = os.getenv("CACHE_INVALIDATION_LISTENER", False) == "True"
+CACHE_INVALIDATION_CHANNEL = "cache_invalidation"
+
 EMAIL_HOST = os.getenv("EMAIL_HOST")
 EMAIL_PORT = os.getenv("EMAIL_PORT")
 EMAIL_HOST_USER = os.getenv("EMAIL_HOST_USER")
 EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD")
 EMAIL_USE_TLS = os.getenv("EMAIL_USE_TLS", False) == "True"
 EMAIL_USE_SSL = os.getenv("EMAIL_USE_SSL", False) == "True"
+EMAIL_TIMEOUT = int(os.getenv("EMAIL_TIMEOUT", 10))
+
+TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+TELEGRAM_TIMEOUT = int(os.getenv("TELEGRAM_TIMEOUT", 10))
+
+# Заранее построенная схема OpenAPI (команда build_schema): каталог файлов схемы и версия кода, для которой
+# схема строится (например, хеш коммита; по умолчанию - хеш исходных файлов). Страницы swagger/ и redoc/
+# загружают схему с адреса swagger.json.
+OPENAPI_SCHEMA_DIR = os.path.join(BASE_DIR, "openapi")
+OPENAPI_CODE_VERSION = os.getenv("OPENAPI_CODE_VERSION")
+SWAGGER_SETTINGS = {"SPEC_URL": "schema-json"}
+REDOC_SETTINGS = {"SPEC_URL": "schema-json"}
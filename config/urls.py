@@ -1,17 +1,36 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import include, path
 
+from retailing.images import VARIANTS_DIR
 from retailing.urls import schema_view
+from retailing.views import openapi_schema, schema_ui, serve_image_variant
 
 urlpatterns = [
     path("", include("retailing.urls", namespace="supplier")),
     path("", include("retailing.urls", namespace="order")),
     path("admin/", admin.site.urls),
     path("users/", include("users.urls", namespace="users")),
+    path("swagger.json", openapi_schema, {"schema_format": "json"}, name="schema-json"),
+    path("swagger.yaml", openapi_schema, {"schema_format": "yaml"}, name="schema-yaml"),
     path(
         "swagger/",
-        schema_view.with_ui("swagger", cache_timeout=0),
+        schema_ui(schema_view.with_ui("swagger", cache_timeout=0)),
         name="schema-swagger-ui",
     ),
-    path("redoc/", schema_view.with_ui("redoc", cache_timeout=0), name="schema-redoc"),
+    path(
+        "redoc/",
+        schema_ui(schema_view.with_ui("redoc", cache_timeout=0)),
+        name="schema-redoc",
+    ),
 ]
+
+if settings.DEBUG:
+    # в рабочем режиме медиафайлы и варианты изображений отдает веб-сервер (или хранилище/CDN)
+    urlpatterns += [
+        path(
+            f"{settings.MEDIA_URL.lstrip('/')}{VARIANTS_DIR}/<path:path>",
+            serve_image_variant,
+            name="image_variant",
+        ),
+    ]
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
 
 application = get_wsgi_application()
+
+# слушатель инвалидации локальных кешей запускается в каждом рабочем процессе
+from retailing.invalidation import start_listener  # noqa: E402
+
+start_listener()
@@ -2,7 +2,8 @@ from datetime import date
 
 from django.contrib import admin
 
-from retailing.models import Payable, Supplier
+from retailing.models import (HotStock, OutboxMessage, Payable, PayableArchive,
+                              Supplier)
 
 
 @admin.register(Supplier)
@@ -36,3 +37,33 @@ class PayableAdmin(admin.ModelAdmin):
         queryset.update(amount=0, is_paid=True, paid_date=date.today())
 
     clear_payable.short_description = "Погасить задолженность перед поставщиком"
+
+
+@admin.register(PayableArchive)
+class PayableArchiveAdmin(admin.ModelAdmin):
+    list_display = ("id", "owner", "supplier", "amount", "paid_date", "archived_at")
+    list_filter = ("paid_date",)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(HotStock)
+class HotStockAdmin(admin.ModelAdmin):
+    list_display = ("owner", "product", "shards")
+
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = (
+        "channel",
+        "recipient",
+        "subject",
+        "status",
+        "attempts",
+        "created_at",
+    )
+    list_filter = ("status", "channel")
@@ -0,0 +1,151 @@
+import threading
+import time
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import APIException, Throttled
+
+# Ограничение количества одновременно выполняемых запросов на запись (admission control). Представление
+# с admission_scope занимает слот области ADMISSION_CONTROL[scope] после аутентификации и освобождает его после
+# ответа. Если слотов нет, запрос ждет в очереди не дольше max_wait секунд; при переполненной очереди или
+# истечении ожидания сразу возвращается 503 с Retry-After. Один поставщик может занимать не более
+# per_supplier слотов (для отдельных поставщиков - suppliers[id]), сверх этого - 429 с Retry-After.
+# Ограничения действуют в пределах рабочего процесса, поэтому запросы на запись не могут занять все потоки
+# процесса и чтение продолжает обслуживаться.
+#
+# Состояние слотов хранится в памяти процесса и не разделяется между процессами:
+# - схема рассчитана на многопоточные рабочие процессы WSGI (gunicorn --worker-class gthread, uwsgi с threads,
+#   runserver). Ожидание в очереди блокирует поток, поэтому с асинхронными рабочими (ASGI, gevent/eventlet)
+#   ожидание останавливает весь цикл событий процесса;
+# - при N процессах одновременно выполняется до N * concurrency запросов области, а один поставщик занимает до
+#   N * per_supplier слотов. Значения задаются на процесс, а общий предел (например, по соединениям с БД)
+#   и предел поставщика делятся на количество процессов;
+# - ожидающий в очереди запрос тоже занимает поток процесса. Сумма concurrency + queue по всем областям
+#   не должна превышать количество потоков процесса за вычетом потоков, оставляемых для чтения.
+
+
+class ServiceOverloaded(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Сервис перегружен, повторите запрос позже !"
+    default_code = "overloaded"
+
+    def __init__(self, wait):
+        super().__init__()
+        self.wait = wait
+
+
+class ConcurrencyLimiter:
+    """concurrency одновременных владельцев слота и очередь ожидающих не длиннее queue."""
+
+    def __init__(self, concurrency, queue):
+        self.concurrency = concurrency
+        self.queue = queue
+        self.active = 0
+        self.waiting = 0
+        self.condition = threading.Condition()
+
+    def acquire(self, timeout):
+        with self.condition:
+            if self.active < self.concurrency:
+                self.active += 1
+                return True
+            if self.waiting >= self.queue:
+                return False
+            self.waiting += 1
+            try:
+                deadline = time.monotonic() + timeout
+                while self.active >= self.concurrency:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    self.condition.wait(remaining)
+                self.active += 1
+                return True
+            finally:
+                self.waiting -= 1
+
+    def release(self):
+        with self.condition:
+            self.active -= 1
+            self.condition.notify()
+
+
+class SupplierLimiter:
+    """Не более limit одновременных запросов одного поставщика, без ожидания."""
+
+    def __init__(self):
+        self.active = {}
+        self.lock = threading.Lock()
+
+    def acquire(self, supplier_id, limit):
+        with self.lock:
+            if self.active.get(supplier_id, 0) >= limit:
+                return False
+            self.active[supplier_id] = self.active.get(supplier_id, 0) + 1
+            return True
+
+    def release(self, supplier_id):
+        with self.lock:
+            self.active[supplier_id] -= 1
+            if not self.active[supplier_id]:
+                del self.active[supplier_id]
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_scope_config(scope):
+    return getattr(settings, "ADMISSION_CONTROL", {}).get(scope)
+
+
+def get_limiters(scope, config):
+    with _limiters_lock:
+        if scope not in _limiters:
+            _limiters[scope] = (
+                ConcurrencyLimiter(config["concurrency"], config.get("queue", 0)),
+                SupplierLimiter(),
+            )
+        return _limiters[scope]
+
+
+def reset_limiters():
+    with _limiters_lock:
+        _limiters.clear()
+
+
+class AdmissionControlMixin:
+    """Ограничение одновременных запросов представления по области admission_scope."""
+
+    admission_scope = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        config = get_scope_config(self.admission_scope)
+        if config is None:
+            return
+        limiter, supplier_limiter = get_limiters(self.admission_scope, config)
+        retry_after = config.get("retry_after", 1)
+
+        supplier_id = getattr(request.user, "supplier_id", None)
+        limit = config.get("suppliers", {}).get(supplier_id, config.get("per_supplier"))
+        if supplier_id is not None and limit is not None:
+            if not supplier_limiter.acquire(supplier_id, limit):
+                raise Throttled(wait=retry_after)
+        else:
+            supplier_id = None
+        if not limiter.acquire(config.get("max_wait", 0)):
+            if supplier_id is not None:
+                supplier_limiter.release(supplier_id)
+            raise ServiceOverloaded(wait=retry_after)
+        self.admission_slot = (limiter, supplier_limiter, supplier_id)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        slot = getattr(self, "admission_slot", None)
+        if slot is not None:
+            limiter, supplier_limiter, supplier_id = slot
+            self.admission_slot = None
+            limiter.release()
+            if supplier_id is not None:
+                supplier_limiter.release(supplier_id)
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class RetailingConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "retailing"
+
+    def ready(self):
+        import retailing.signals  # noqa: F401
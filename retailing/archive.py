@@ -0,0 +1,58 @@
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import transaction
+
+from retailing.models import Payable, PayableArchive
+
+# Перенос списанных задолженностей в архивную таблицу. Перенос идет порциями по PAYABLE_ARCHIVE_BATCH_SIZE строк,
+# каждая порция - отдельная короткая транзакция. Строки порции блокируются с пропуском уже заблокированных
+# (SKIP LOCKED), поэтому архивация не ждет проведение операций и не задерживает его. Новые долги к списанным
+# строкам не добавляются (orders.add_payable), поэтому id в архиве не повторяются, а повтор завершается ошибкой.
+
+
+def get_archive_days():
+    return getattr(settings, "PAYABLE_ARCHIVE_DAYS", 90)
+
+
+def get_archive_batch_size():
+    return getattr(settings, "PAYABLE_ARCHIVE_BATCH_SIZE", 1000)
+
+
+def archive_batch(border, batch_size):
+    """Переносим одну порцию задолженностей, списанных раньше border. Возвращает количество перенесенных строк."""
+    with transaction.atomic():
+        payables = list(
+            Payable.objects.filter(is_paid=True, paid_date__lt=border)
+            .select_for_update(skip_locked=True)
+            .order_by("pk")[:batch_size]
+        )
+        if not payables:
+            return 0
+        PayableArchive.objects.bulk_create(
+            [
+                PayableArchive(
+                    id=payable.pk,
+                    owner_id=payable.owner_id,
+                    supplier_id=payable.supplier_id,
+                    amount=payable.amount,
+                    created_at=payable.created_at,
+                    paid_date=payable.paid_date,
+                )
+                for payable in payables
+            ]
+        )
+        Payable.objects.filter(pk__in=[payable.pk for payable in payables]).delete()
+    return len(payables)
+
+
+def archive_payables(days=None, batch_size=None, today=None):
+    days = get_archive_days() if days is None else days
+    batch_size = batch_size or get_archive_batch_size()
+    border = (today or date.today()) - timedelta(days=days)
+    archived = 0
+    while True:
+        count = archive_batch(border, batch_size)
+        archived += count
+        if count < batch_size:
+            return archived
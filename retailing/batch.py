@@ -0,0 +1,59 @@
+from django.conf import settings
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+
+def get_batch_max_ids():
+    return getattr(settings, "BATCH_MAX_IDS", 5000)
+
+
+def parse_ids(request):
+    """Список id из GET-параметра ids=1,2,3 или из тела POST-запроса {"ids": [1, 2, 3]}. Повторы удаляются,
+    порядок сохраняется."""
+    if request.method == "GET":
+        raw_ids = [
+            item for item in request.query_params.get("ids", "").split(",") if item
+        ]
+    else:
+        data = request.data
+        raw_ids = data.get("ids", []) if hasattr(data, "get") else data
+        if isinstance(raw_ids, str):
+            raw_ids = [item for item in raw_ids.split(",") if item]
+    if not isinstance(raw_ids, (list, tuple)):
+        raise ValidationError("Параметр ids должен быть списком идентификаторов !")
+
+    try:
+        ids = list(dict.fromkeys(int(item) for item in raw_ids))
+    except (TypeError, ValueError):
+        raise ValidationError("Идентификаторы должны быть целыми числами !")
+    if not ids:
+        raise ValidationError("Не указаны идентификаторы (ids) !")
+    if len(ids) > get_batch_max_ids():
+        raise ValidationError(
+            f"Можно запросить не более {get_batch_max_ids()} объектов за один запрос !"
+        )
+    return ids
+
+
+class BatchRetrieveMixin:
+    """Получение нескольких объектов по списку id одним запросом к БД. Для каждого не найденного или недоступного
+    объекта в ответ добавляется ошибка (not_found или forbidden)."""
+
+    def has_batch_object_permission(self, obj):
+        return True
+
+    def batch_retrieve(self, request, *args, **kwargs):
+        ids = parse_ids(request)
+        objects = {obj.pk: obj for obj in self.get_queryset().filter(pk__in=ids)}
+        found = []
+        errors = []
+        for pk in ids:
+            obj = objects.get(pk)
+            if obj is None:
+                errors.append({"id": pk, "error": "not_found"})
+            elif not self.has_batch_object_permission(obj):
+                errors.append({"id": pk, "error": "forbidden"})
+            else:
+                found.append(obj)
+        serializer = self.get_serializer(found, many=True)
+        return Response({"results": serializer.data, "errors": errors})
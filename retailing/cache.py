@@ -0,0 +1,204 @@
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import serializers, status
+from rest_framework.response import Response
+
+# Кеш ответов публичных справочников (поставщики, продукты). Ответ хранится под ключом, составленным из области
+# (scope), ее поколения и нормализованного URL. При изменении данных поколение области увеличивается, и все старые
+# ключи этой области перестают использоваться без перебора и удаления записей в самом кеше.
+
+CACHE_PREFIX = "catalog"
+
+
+def get_cache():
+    return caches[getattr(settings, "CATALOG_CACHE_ALIAS", "default")]
+
+
+def get_timeout():
+    return getattr(settings, "CATALOG_CACHE_TIMEOUT", 60)
+
+
+def get_fragment_timeout():
+    return getattr(settings, "CATALOG_FRAGMENT_TIMEOUT", 24 * 60 * 60)
+
+
+def get_lock_timeout():
+    return getattr(settings, "CATALOG_CACHE_LOCK_TIMEOUT", 10)
+
+
+def generation_key(scope):
+    return f"{CACHE_PREFIX}:gen:{scope}"
+
+
+def get_generation(scope):
+    """Текущее поколение области. Начальное значение берется от времени, чтобы после вытеснения ключа поколения
+    из кеша не совпасть со старыми записями."""
+    cache = get_cache()
+    key = generation_key(scope)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, time.time_ns(), None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_generation(scope):
+    """Инвалидируем все закешированные ответы области."""
+    cache = get_cache()
+    key = generation_key(scope)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+
+
+def normalize_url(request):
+    """Путь запроса и отсортированные параметры (search, ordering, page и т.д.), чтобы одинаковые запросы
+    с разным порядком параметров попадали в один ключ."""
+    params = sorted(
+        (name, value)
+        for name, values in request.query_params.lists()
+        for value in values
+    )
+    # хост входит в ключ: ссылки на изображения строятся абсолютными
+    return f"{request.build_absolute_uri(request.path)}?{urlencode(params)}"
+
+
+def response_key(scopes, request):
+    generations = ":".join(f"{scope}={get_generation(scope)}" for scope in scopes)
+    digest = hashlib.md5(
+        f"{generations}|{normalize_url(request)}".encode("utf-8")
+    ).hexdigest()
+    return f"{CACHE_PREFIX}:response:{digest}"
+
+
+def get_or_compute(key, compute):
+    """Защита от лавины запросов (stampede): холодный ключ вычисляет только тот процесс, который первым получил
+    блокировку (cache.add атомарен), остальные ждут появления значения в кеше."""
+    cache = get_cache()
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    lock_key = f"{key}:lock"
+    lock_timeout = get_lock_timeout()
+    if cache.add(lock_key, 1, lock_timeout):
+        try:
+            value = compute()
+            if value is not None:
+                cache.set(key, value, get_timeout())
+        finally:
+            cache.delete(lock_key)
+        return value
+
+    deadline = time.monotonic() + lock_timeout
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        value = cache.get(key)
+        if value is not None:
+            return value
+    # владелец блокировки не успел, вычисляем сами
+    return compute()
+
+
+class CatalogCacheMixin:
+    """Кеширование ответов list/retrieve для публичных (AllowAny) представлений. Области кеша задаются
+    в get_cache_scopes(), пустой список отключает кеширование для действия."""
+
+    cache_scopes = ()
+
+    def get_cache_scopes(self):
+        return self.cache_scopes
+
+    def cached_response(self, request, handler, *args, **kwargs):
+        scopes = self.get_cache_scopes()
+        if request.method != "GET" or not scopes:
+            return handler(request, *args, **kwargs)
+
+        computed = {}
+
+        def compute():
+            response = handler(request, *args, **kwargs)
+            computed["response"] = response
+            if response.status_code != status.HTTP_200_OK:
+                # ошибки не кешируем
+                return None
+            return response.data
+
+        data = get_or_compute(response_key(scopes, request), compute)
+        if "response" in computed:
+            return computed["response"]
+        return Response(data)
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(request, super().retrieve, *args, **kwargs)
+
+
+class FragmentListSerializer(serializers.ListSerializer):
+    """Список собирается из закешированных представлений объектов, промахи читаются одним get_many
+    и записываются одним set_many."""
+
+    def to_representation(self, data):
+        instances = list(data.all() if hasattr(data, "all") else data)
+        keys = [self.child.fragment_key(instance) for instance in instances]
+        cache = get_cache()
+        fragments = cache.get_many(keys)
+        missing = {}
+        result = []
+        for key, instance in zip(keys, instances):
+            fragment = fragments.get(key)
+            if fragment is None:
+                fragment = self.child.to_representation(instance, use_cache=False)
+                missing[key] = fragment
+            else:
+                fragment = self.child.refresh_volatile(instance, fragment)
+            result.append(fragment)
+        if missing:
+            cache.set_many(missing, get_fragment_timeout())
+        return result
+
+
+class FragmentCacheMixin:
+    """Кеширование сериализованного представления объекта под ключом (модель, pk, версия). Версия увеличивается
+    при каждом сохранении объекта (models.bump_version). Поля volatile_fields меняются без увеличения версии
+    и в закешированном фрагменте заменяются значениями объекта."""
+
+    volatile_fields = ()
+
+    def fragment_key(self, instance):
+        request = self.context.get("request")
+        base_url = request.build_absolute_uri("/") if request is not None else ""
+        label = instance._meta.label_lower
+        digest = hashlib.md5(base_url.encode("utf-8")).hexdigest()[:8]
+        return (
+            f"{CACHE_PREFIX}:fragment:{type(self).__name__}:{label}:"
+            f"{instance.pk}:{instance.version}:{digest}"
+        )
+
+    def to_representation(self, instance, use_cache=True):
+        if not use_cache:
+            return super().to_representation(instance)
+        cache = get_cache()
+        key = self.fragment_key(instance)
+        fragment = cache.get(key)
+        if fragment is None:
+            fragment = super().to_representation(instance)
+            cache.set(key, fragment, get_fragment_timeout())
+            return fragment
+        return self.refresh_volatile(instance, fragment)
+
+    def refresh_volatile(self, instance, fragment):
+        if not self.volatile_fields:
+            return fragment
+        fragment = dict(fragment)
+        for name in self.volatile_fields:
+            field = self.fields[name]
+            fragment[name] = field.to_representation(field.get_attribute(instance))
+        return fragment
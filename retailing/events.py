@@ -0,0 +1,139 @@
+import asyncio
+import json
+import threading
+
+from django.conf import settings
+from django.db import transaction
+
+from retailing.invalidation import model_label, publish, subscribe
+from retailing.models import StreamEvent
+
+# Поток событий поставщика (server-sent events). События пишутся в таблицу StreamEvent в транзакции
+# бизнес-операции, после чего через шину NOTIFY будятся соединения этого поставщика во всех рабочих процессах.
+# Без слушателя шины (или при потере сообщения) соединение само перечитывает таблицу раз в heartbeat-интервал.
+# Обратное давление обеспечивает ASGI-сервер: следующая порция событий читается только после того,
+# как предыдущая отправлена клиенту.
+
+EVENT_LABEL = model_label(StreamEvent)
+
+_waiters = {}
+_waiters_lock = threading.Lock()
+_streams = 0
+
+
+def get_heartbeat():
+    return getattr(settings, "EVENT_STREAM_HEARTBEAT", 15)
+
+
+def get_batch_size():
+    return getattr(settings, "EVENT_STREAM_BATCH_SIZE", 100)
+
+
+def get_max_backlog():
+    return getattr(settings, "EVENT_STREAM_MAX_BACKLOG", 1000)
+
+
+def get_max_streams():
+    return getattr(settings, "EVENT_STREAM_MAX_CONNECTIONS", 500)
+
+
+def record_event(supplier_id, event_type, data):
+    """Записываем событие и будим соединения поставщика после фиксации транзакции."""
+    if supplier_id is None:
+        return
+    StreamEvent.objects.create(supplier_id=supplier_id, type=event_type, data=data)
+    publish_event(supplier_id)
+
+
+def record_events(events):
+    """Пакетная запись событий [(id поставщика, тип, данные)], соединения каждого поставщика будятся один раз."""
+    StreamEvent.objects.bulk_create(
+        [
+            StreamEvent(supplier_id=supplier_id, type=event_type, data=data)
+            for supplier_id, event_type, data in events
+            if supplier_id is not None
+        ]
+    )
+    for supplier_id in {supplier_id for supplier_id, _, _ in events}:
+        if supplier_id is not None:
+            publish_event(supplier_id)
+
+
+def publish_event(supplier_id):
+    pk = str(supplier_id)
+    transaction.on_commit(lambda: publish(EVENT_LABEL, pk))
+
+
+def wake(pk):
+    """Подписчик шины: будим ожидающие соединения поставщика (pk=None - все соединения)."""
+    with _waiters_lock:
+        if pk is None:
+            waiters = [waiter for items in _waiters.values() for waiter in items]
+        else:
+            waiters = list(_waiters.get(str(pk), ()))
+    for loop, event in waiters:
+        try:
+            loop.call_soon_threadsafe(event.set)
+        except RuntimeError:
+            # цикл событий соединения уже закрыт
+            pass
+
+
+subscribe(EVENT_LABEL, wake)
+
+
+def stream_available():
+    """Ограничение количества одновременных потоков в процессе."""
+    with _waiters_lock:
+        return _streams < get_max_streams()
+
+
+def format_event(event):
+    return (
+        f"id: {event.id}\nevent: {event.type}\n"
+        f"data: {json.dumps(event.data, ensure_ascii=False)}\n\n"
+    )
+
+
+async def event_stream(supplier_id, last_event_id):
+    """Асинхронный генератор SSE. Начинает с событий после last_event_id. Если клиент отстал больше чем на
+    EVENT_STREAM_MAX_BACKLOG событий, отправляется событие reset: клиенту нужно пересинхронизироваться через
+    sync/ и продолжить с последнего события."""
+    global _streams
+    key = str(supplier_id)
+    waiter = (asyncio.get_running_loop(), asyncio.Event())
+    with _waiters_lock:
+        _waiters.setdefault(key, set()).add(waiter)
+        _streams += 1
+    try:
+        yield "retry: 3000\n\n"
+        events = StreamEvent.objects.filter(supplier_id=supplier_id)
+        if last_event_id:
+            backlog = await events.filter(id__gt=last_event_id).acount()
+            if backlog > get_max_backlog():
+                latest = await events.order_by("-id").afirst()
+                last_event_id = latest.id
+                yield f"id: {last_event_id}\nevent: reset\ndata: {{}}\n\n"
+        else:
+            latest = await events.order_by("-id").afirst()
+            last_event_id = latest.id if latest is not None else 0
+
+        while True:
+            waiter[1].clear()
+            pending = events.filter(id__gt=last_event_id).order_by("id")
+            batch = [event async for event in pending[: get_batch_size()]]
+            for event in batch:
+                last_event_id = event.id
+                yield format_event(event)
+            if len(batch) == get_batch_size():
+                continue
+            try:
+                await asyncio.wait_for(waiter[1].wait(), timeout=get_heartbeat())
+            except asyncio.TimeoutError:
+                yield ": heartbeat\n\n"
+    finally:
+        with _waiters_lock:
+            _waiters[key].discard(waiter)
+            if not _waiters[key]:
+                del _waiters[key]
+            _streams -= 1
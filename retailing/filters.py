@@ -0,0 +1,28 @@
+from django_filters import rest_framework as filters
+
+from retailing.models import Order, Supplier
+
+
+class SupplierFilter(filters.FilterSet):
+    """Фильтрация поставщиков по стране (id или код), типу участника сети и городу. Под комбинации фильтров
+    с сортировкой по названию заведены составные индексы модели Supplier."""
+
+    country_code = filters.CharFilter(method="filter_country_code")
+
+    class Meta:
+        model = Supplier
+        fields = ("country", "type", "city")
+
+    def filter_country_code(self, queryset, name, value):
+        return queryset.filter(country__code=value.upper())
+
+
+class OrderFilter(filters.FilterSet):
+    """Фильтрация операций по периоду (created_at_after, created_at_before), товару, поставщику и виду операции.
+    Для каждого фильтра в сочетании с собственником заведен составной индекс модели Order."""
+
+    created_at = filters.DateFromToRangeFilter()
+
+    class Meta:
+        model = Order
+        fields = ("created_at", "product", "supplier", "operation")
@@ -0,0 +1,56 @@
+from django.shortcuts import get_object_or_404
+
+from retailing.models import Supplier
+
+# Карта объектов запроса (identity map). Объекты, загруженные по первичному ключу, хранятся в словаре
+# HTTP-запроса, поэтому представления, сериализаторы и проверки прав одного запроса получают один и тот же
+# экземпляр, а каждый объект читается из БД не более одного раза за запрос. Между запросами карта не живет.
+
+
+def get_identity_map(request):
+    # DRF Request оборачивает HttpRequest: карта хранится в исходном запросе и доступна обоим
+    request = getattr(request, "_request", request)
+    if not hasattr(request, "identity_map"):
+        request.identity_map = {}
+    return request.identity_map
+
+
+def identity_key(model, pk):
+    return model._meta.label_lower, str(pk)
+
+
+def remember(request, instance):
+    """Добавляем уже загруженный объект в карту запроса."""
+    if instance is not None and instance.pk is not None:
+        get_identity_map(request)[identity_key(type(instance), instance.pk)] = instance
+    return instance
+
+
+def get_instance(request, model, pk):
+    """Объект модели по первичному ключу из карты запроса, при отсутствии - из БД (Http404, если объекта нет)."""
+    identity_map = get_identity_map(request)
+    key = identity_key(model, pk)
+    if key not in identity_map:
+        identity_map[key] = get_object_or_404(model, pk=pk)
+    return identity_map[key]
+
+
+def get_supplier(request):
+    """Компания текущего пользователя или None. Экземпляр из карты запроса присваивается request.user.supplier."""
+    user = request.user
+    if user.supplier_id is None:
+        return None
+    supplier = get_instance(request, Supplier, user.supplier_id)
+    user.supplier = supplier
+    return supplier
+
+
+class IdentityMapMixin:
+    """get_object выполняет запрос один раз за запрос, найденный объект добавляется в карту запроса. Из карты
+    get_object не читает: объекты в ней могли быть загружены без ограничений get_queryset.
+    """
+
+    def get_object(self):
+        if getattr(self, "_identity_object", None) is None:
+            self._identity_object = remember(self.request, super().get_object())
+        return self._identity_object
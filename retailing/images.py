@@ -0,0 +1,171 @@
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps, features
+
+# Варианты изображений (изображение продукта, аватар пользователя). После сохранения объекта с новым файлом
+# изображение в фоне (пул из IMAGE_WORKERS потоков) уменьшается до размеров IMAGE_VARIANTS и перекодируется
+# в JPEG (PNG для изображений с прозрачностью) и WebP, если Pillow собран с его поддержкой. Варианты лежат
+# в MEDIA_ROOT/variants/<модель>/<pk>/<хеш содержимого>/, поэтому адрес варианта не меняется, пока не изменится
+# исходный файл, и варианты отдаются с долгим сроком кеширования. Пути вариантов хранятся в поле
+# <поле>_variants объекта вместе с именем исходного файла (source), по которому определяется смена изображения.
+
+logger = logging.getLogger(__name__)
+
+VARIANTS_DIR = "variants"
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_image_workers():
+    return getattr(settings, "IMAGE_WORKERS", 1)
+
+
+def get_image_variants():
+    return getattr(
+        settings,
+        "IMAGE_VARIANTS",
+        {"thumbnail": (160, 160), "card": (480, 480), "full": (1600, 1600)},
+    )
+
+
+def get_image_quality():
+    return getattr(settings, "IMAGE_QUALITY", 85)
+
+
+def get_variants_max_age():
+    return getattr(settings, "IMAGE_VARIANTS_MAX_AGE", 365 * 24 * 60 * 60)
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=get_image_workers(), thread_name_prefix="image-variants"
+            )
+        return _executor
+
+
+def variants_field(field_name):
+    return f"{field_name}_variants"
+
+
+def schedule_variants(instance, field_name):
+    """Ставим построение вариантов в очередь после фиксации транзакции, если файл изображения сменился."""
+    name = getattr(instance, field_name).name or ""
+    variants = getattr(instance, variants_field(field_name)) or {}
+    if name == variants.get("source", ""):
+        return
+    label = instance._meta.label_lower
+    pk = instance.pk
+    transaction.on_commit(
+        lambda: get_executor().submit(process_image, label, pk, field_name)
+    )
+
+
+def has_alpha(image):
+    return image.mode in ("RGBA", "LA") or (
+        image.mode == "P" and "transparency" in image.info
+    )
+
+
+def encode(image, image_format):
+    buffer = BytesIO()
+    if image_format == "jpeg":
+        image.save(
+            buffer, "JPEG", quality=get_image_quality(), optimize=True, progressive=True
+        )
+    elif image_format == "png":
+        image.save(buffer, "PNG", optimize=True)
+    else:
+        image.save(buffer, "WEBP", quality=get_image_quality(), method=4)
+    return buffer.getvalue()
+
+
+def build_variants(content, directory):
+    """Сохраняем варианты изображения в directory. Возвращает {вариант: {формат: путь}}."""
+    with Image.open(BytesIO(content)) as source:
+        image = ImageOps.exif_transpose(source)
+        base_format = "png" if has_alpha(image) else "jpeg"
+        image = image.convert("RGBA" if base_format == "png" else "RGB")
+    formats = [base_format]
+    if features.check("webp"):
+        formats.append("webp")
+
+    variants = {}
+    for name, size in get_image_variants().items():
+        variant = image.copy()
+        variant.thumbnail(size, Image.Resampling.LANCZOS)
+        paths = {}
+        for image_format in formats:
+            extension = "jpg" if image_format == "jpeg" else image_format
+            path = f"{directory}/{name}.{extension}"
+            if not default_storage.exists(path):
+                path = default_storage.save(
+                    path, ContentFile(encode(variant, image_format))
+                )
+            paths[image_format] = path
+        variants[name] = paths
+    return variants
+
+
+def variant_paths(variants):
+    return {
+        path
+        for name, paths in variants.items()
+        if name != "source"
+        for path in paths.values()
+    }
+
+
+def process_image(label, pk, field_name):
+    """Построение вариантов изображения в рабочем потоке. Ошибка чтения изображения записывается в журнал,
+    объект остается без вариантов (отдается только исходный файл)."""
+    close_old_connections()
+    try:
+        model = apps.get_model(label)
+        instance = model.objects.filter(pk=pk).first()
+        if instance is None:
+            return
+        file = getattr(instance, field_name)
+        variants = {"source": file.name or ""}
+        if file:
+            try:
+                with file.open("rb") as opened:
+                    content = opened.read()
+                digest = hashlib.sha256(content).hexdigest()[:16]
+                variants.update(
+                    build_variants(content, f"{VARIANTS_DIR}/{label}/{pk}/{digest}")
+                )
+            except (OSError, ValueError, Image.DecompressionBombError):
+                logger.exception("Не удалось обработать изображение %s:%s", label, pk)
+        save_variants(model, pk, field_name, variants)
+    finally:
+        close_old_connections()
+
+
+def save_variants(model, pk, field_name, variants):
+    """Записываем варианты, если за время обработки изображение объекта не сменилось, и удаляем варианты
+    прежнего изображения."""
+    with transaction.atomic():
+        instance = model.objects.select_for_update().filter(pk=pk).first()
+        if (
+            instance is None
+            or (getattr(instance, field_name).name or "") != variants["source"]
+        ):
+            return
+        old_paths = variant_paths(getattr(instance, variants_field(field_name)) or {})
+        setattr(instance, variants_field(field_name), variants)
+        instance.save(update_fields=[variants_field(field_name)])
+    for path in old_paths - variant_paths(variants):
+        default_storage.delete(path)
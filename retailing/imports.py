@@ -0,0 +1,265 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from retailing.models import (
+    Order,
+    OrderImportJob,
+    OrderImportResult,
+    Product,
+    Supplier,
+    Warehouse,
+)
+from retailing.orders import check_order_rules, check_stock, post_orders
+
+# Пакетная загрузка операций. Файл JSONL обрабатывается в фоне пулом из ORDER_IMPORT_WORKERS потоков порциями
+# по ORDER_IMPORT_BATCH_SIZE строк. Для порции поставщики, товары и остатки поставщиков читаются одним запросом
+# каждые, правила проверяются в памяти, операции создаются одним INSERT, а остатки, задолженности и последние
+# цены изменяются один раз на товар и поставщика (post_orders). Каждая порция - отдельная транзакция, в которой
+# проводятся операции, одним INSERT записываются результаты строк и обновляется прогресс задания.
+# Пул работает в памяти процесса: после остановки процесса его задания остаются в pending или running.
+# Команда requeue_imports (по расписанию) находит задания без прогресса дольше ORDER_IMPORT_STALE_TIMEOUT секунд
+# и выполняет их заново с первой необработанной порции. Задание выполняется только после перевода из pending
+# в running одним UPDATE (claim_job), поэтому одно задание не обрабатывается двумя потоками одновременно.
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_import_workers():
+    return getattr(settings, "ORDER_IMPORT_WORKERS", 2)
+
+
+def get_import_batch_size():
+    return getattr(settings, "ORDER_IMPORT_BATCH_SIZE", 500)
+
+
+def get_import_max_lines():
+    return getattr(settings, "ORDER_IMPORT_MAX_LINES", 100000)
+
+
+def get_stale_timeout():
+    return getattr(settings, "ORDER_IMPORT_STALE_TIMEOUT", 600)
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=get_import_workers(), thread_name_prefix="order-import"
+            )
+        return _executor
+
+
+def submit_job(job):
+    """Ставим задание в очередь пула после фиксации транзакции, в которой оно создано."""
+    job_id = job.pk
+    transaction.on_commit(lambda: get_executor().submit(run_job, job_id))
+
+
+def read_lines(file):
+    """Непустые строки файла с их номерами."""
+    return [
+        (number, line)
+        for number, line in enumerate(file.read().decode("utf-8").splitlines(), 1)
+        if line.strip()
+    ]
+
+
+def to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_line(raw, suppliers, products):
+    """Операция строки файла: {"supplier": id, "product": id, "operation": ..., "quantity": ..., "price": ...}."""
+    try:
+        data = json.loads(raw)
+    except ValueError:
+        raise ValidationError("Строка не является корректным JSON !")
+    if not isinstance(data, dict):
+        raise ValidationError("Строка должна содержать объект операции !")
+
+    operation = data.get("operation")
+    if operation not in dict(Order.OPERATION):
+        raise ValidationError("Неизвестная операция !")
+    supplier = suppliers.get(to_int(data.get("supplier")))
+    if supplier is None:
+        raise ValidationError("Поставщик не найден !")
+    product = products.get(to_int(data.get("product")))
+    if product is None:
+        raise ValidationError("Товар не найден !")
+    quantity = to_int(data.get("quantity"))
+    if quantity is None or quantity <= 0:
+        raise ValidationError("Количество должно быть положительным целым числом !")
+    try:
+        price = Decimal(str(data.get("price"))).quantize(Decimal("0.01"))
+    except InvalidOperation:
+        raise ValidationError("Некорректная цена !")
+    if not Decimal(0) <= price < Decimal("1000000"):
+        raise ValidationError("Некорректная цена !")
+    return supplier, product, operation, quantity, price
+
+
+def line_ids(lines, key):
+    ids = set()
+    for _, raw in lines:
+        try:
+            data = json.loads(raw)
+        except ValueError:
+            continue
+        if isinstance(data, dict) and to_int(data.get(key)) is not None:
+            ids.add(to_int(data.get(key)))
+    return ids
+
+
+def import_batch(user, lines):
+    """Проверяем и проводим порцию строк. Возвращает несохраненные результаты строк в порядке строк."""
+    suppliers = Supplier.objects.in_bulk(line_ids(lines, "supplier"))
+    products = Product.objects.in_bulk(line_ids(lines, "product"))
+    available = {
+        (row["owner"], row["product"]): row["total"]
+        for row in Warehouse.objects.filter(owner__in=suppliers, product__in=products)
+        .values("owner", "product")
+        .annotate(total=Sum("quantity"))
+    }
+
+    results = {}
+    orders = []
+    for number, raw in lines:
+        try:
+            supplier, product, operation, quantity, price = parse_line(
+                raw, suppliers, products
+            )
+            check_order_rules(user, operation, supplier)
+            if operation == "buying":
+                key = (supplier.pk, product.pk)
+                check_stock(available.get(key), quantity)
+                available[key] -= quantity
+        except ValidationError as error:
+            results[number] = OrderImportResult(line=number, error=str(error.detail[0]))
+            continue
+        orders.append(
+            (
+                number,
+                Order(
+                    owner=user.supplier,
+                    supplier=supplier,
+                    product=product,
+                    user=user,
+                    operation=operation,
+                    quantity=quantity,
+                    price=price,
+                    amount=price * quantity,
+                ),
+            )
+        )
+
+    try:
+        with transaction.atomic():
+            created = Order.objects.bulk_create([order for _, order in orders])
+            post_orders(created, user)
+    except ValidationError as error:
+        # остаток поставщика изменился параллельно, порция не проведена
+        for number, _ in orders:
+            results[number] = OrderImportResult(line=number, error=str(error.detail[0]))
+    else:
+        for number, order in orders:
+            results[number] = OrderImportResult(line=number, order_id=order.pk)
+    return [results[number] for number, _ in lines]
+
+
+def claim_job(job_id):
+    """Переводим задание из pending в running. False - задание уже выполняется или завершено."""
+    return (
+        OrderImportJob.objects.filter(pk=job_id, status="pending").update(
+            status="running", heartbeat_at=timezone.now()
+        )
+        == 1
+    )
+
+
+class JobTakenOver(Exception):
+    """Порцию задания уже провел другой поток (медленное задание было возвращено в очередь)."""
+
+
+def save_progress(job, start, results):
+    """Записываем прогресс задания, только если в БД он все еще равен началу порции. Иначе порцию провел другой
+    поток, и вызывается JobTakenOver, откатывающий транзакцию порции."""
+    failed = sum(1 for result in results if result.error)
+    now = timezone.now()
+    updated = OrderImportJob.objects.filter(
+        pk=job.pk, status="running", processed=start
+    ).update(
+        processed=F("processed") + len(results),
+        failed=F("failed") + failed,
+        heartbeat_at=now,
+    )
+    if not updated:
+        raise JobTakenOver()
+    job.processed += len(results)
+    job.failed += failed
+    job.heartbeat_at = now
+
+
+def run_job(job_id):
+    """Обработка задания загрузки в рабочем потоке. Прерванное задание продолжается с первой необработанной
+    порции: порция и прогресс задания фиксируются одной транзакцией. Если задание, возвращенное в очередь,
+    одновременно выполняют два потока, каждую порцию проводит только один из них, второй прекращает работу."""
+    close_old_connections()
+    if not claim_job(job_id):
+        close_old_connections()
+        return
+    job = OrderImportJob.objects.select_related("user__supplier").get(pk=job_id)
+    try:
+        with job.file.open("rb") as file:
+            lines = read_lines(file)
+        job.total = len(lines)
+        job.save(update_fields=["total"])
+        batch_size = get_import_batch_size()
+        for start in range(job.processed, len(lines), batch_size):
+            with transaction.atomic():
+                results = import_batch(job.user, lines[start : start + batch_size])
+                for result in results:
+                    result.job = job
+                OrderImportResult.objects.bulk_create(results)
+                save_progress(job, start, results)
+        job.status = "done"
+    except JobTakenOver:
+        # задание продолжает другой поток, его состояние не меняем
+        close_old_connections()
+        return
+    except Exception as error:
+        job.status = "failed"
+        job.error = str(error)
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "error", "finished_at"])
+    close_old_connections()
+
+
+def requeue_stale_jobs(now=None):
+    """Задания, не начатые или без прогресса дольше ORDER_IMPORT_STALE_TIMEOUT секунд (процесс, в пуле которого
+    они выполнялись, остановлен), возвращаются в pending. Возвращает их id."""
+    now = now or timezone.now()
+    border = now - timedelta(seconds=get_stale_timeout())
+    job_ids = list(
+        OrderImportJob.objects.filter(
+            Q(status="pending", created_at__lt=border)
+            | Q(status="running", heartbeat_at__lt=border)
+        ).values_list("pk", flat=True)
+    )
+    OrderImportJob.objects.filter(
+        pk__in=job_ids, status="running", heartbeat_at__lt=border
+    ).update(status="pending")
+    return job_ids
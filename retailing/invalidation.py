@@ -0,0 +1,173 @@
+import logging
+import select
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+
+# Шина инвалидации локальных (внутрипроцессных) кешей между процессами. Запись модели публикует сообщение
+# "app_label.model_name:pk" через NOTIFY PostgreSQL. Сообщение доставляется слушателям только после фиксации
+# транзакции, поэтому отдельного on_commit не требуется. В каждом рабочем процессе поток-слушатель выполняет
+# LISTEN и вызывает подписчиков, которые удаляют соответствующие записи своих кешей.
+
+logger = logging.getLogger(__name__)
+
+_subscribers = {}
+_subscribers_lock = threading.Lock()
+
+
+def get_channel():
+    return getattr(settings, "CACHE_INVALIDATION_CHANNEL", "cache_invalidation")
+
+
+def model_label(model):
+    return model._meta.label_lower
+
+
+def subscribe(label, handler):
+    """Подписка на изменения модели. handler(pk) вызывается при изменении объекта, handler(None) - когда
+    сообщения могли быть потеряны (переподключение слушателя) и нужно сбросить все записи."""
+    with _subscribers_lock:
+        _subscribers.setdefault(label, []).append(handler)
+
+
+def dispatch(label, pk):
+    with _subscribers_lock:
+        handlers = list(_subscribers.get(label, ()))
+    for handler in handlers:
+        try:
+            handler(pk)
+        except Exception:
+            logger.exception("Ошибка инвалидации кеша %s:%s", label, pk)
+
+
+def dispatch_all():
+    with _subscribers_lock:
+        labels = list(_subscribers)
+    for label in labels:
+        dispatch(label, None)
+
+
+def parse_payload(payload):
+    label, _, pk = payload.partition(":")
+    return label, (pk or None)
+
+
+def publish(label, pk):
+    """Сбрасываем локальные кеши текущего процесса и оповещаем остальные процессы."""
+    dispatch(label, None if pk is None else str(pk))
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_notify(%s, %s)", [get_channel(), f"{label}:{pk or ''}"]
+            )
+
+
+class LocalCache:
+    """Простой кеш в памяти процесса с ограничением времени жизни записей. Записи удаляются по сообщениям
+    шины инвалидации для указанной модели."""
+
+    def __init__(self, label, timeout=300):
+        self.label = label
+        self.timeout = timeout
+        self._data = {}
+        self._lock = threading.Lock()
+        subscribe(label, self.evict)
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(str(key))
+        if item is None:
+            return None
+        value, expires = item
+        if expires < time.monotonic():
+            self.evict(key)
+            return None
+        return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[str(key)] = (value, time.monotonic() + self.timeout)
+
+    def evict(self, key=None):
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(str(key), None)
+
+
+class InvalidationListener(threading.Thread):
+    """Поток-слушатель канала NOTIFY. Работает на отдельном соединении в режиме autocommit и при обрыве
+    переподключается, сбрасывая все локальные кеши (сообщения за время обрыва потеряны)."""
+
+    poll_interval = 5
+    reconnect_delay = 1
+
+    def __init__(self):
+        super().__init__(name="cache-invalidation-listener", daemon=True)
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def connect(self):
+        import psycopg2
+
+        db = settings.DATABASES["default"]
+        conn = psycopg2.connect(
+            dbname=db["NAME"],
+            user=db["USER"],
+            password=db["PASSWORD"],
+            host=db["HOST"],
+            port=db["PORT"],
+        )
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute(f'LISTEN "{get_channel()}";')
+        return conn
+
+    def listen(self):
+        conn = self.connect()
+        dispatch_all()
+        try:
+            while not self._stop_event.is_set():
+                if select.select([conn], [], [], self.poll_interval) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    dispatch(*parse_payload(notify.payload))
+        finally:
+            conn.close()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.listen()
+            except Exception:
+                logger.exception("Слушатель инвалидации кеша отключился")
+                time.sleep(self.reconnect_delay)
+
+
+_listener = None
+
+
+def listener_running():
+    """Локальные кеши допустимо использовать только при работающем слушателе: без него изменения из других
+    процессов не сбрасывают записи."""
+    return _listener is not None and _listener.is_alive()
+
+
+def start_listener():
+    """Запускается один раз в каждом рабочем процессе (config/wsgi.py, config/asgi.py) при включенной настройке
+    CACHE_INVALIDATION_LISTENER и базе PostgreSQL."""
+    global _listener
+    if not getattr(settings, "CACHE_INVALIDATION_LISTENER", False):
+        return None
+    if connection.vendor != "postgresql" or _listener is not None:
+        return _listener
+    _listener = InvalidationListener()
+    _listener.start()
+    return _listener
@@ -0,0 +1,127 @@
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+from django.db import connection, transaction
+from django.db.models import Sum
+
+from rest_framework.exceptions import ValidationError
+
+from retailing.models import Order, StockSnapshot, Warehouse
+from retailing.partitions import history_start
+
+# Остатки на дату. Остаток собственника меняют операции пополнения и покупки, где он покупатель (owner),
+# и покупки, где он поставщик (supplier). Остаток на дату считается от ближайшей опорной точки: от последнего
+# снимка не позже даты с применением операций после снимка либо от текущих остатков с откатом операций после
+# даты - что ближе. Время запроса ограничено количеством операций между снимками, а не длиной журнала.
+# Остатки и операции читаются разными запросами, поэтому оба чтения выполняются в одной транзакции
+# REPEATABLE READ: иначе проведенная между ними операция учитывалась бы в одном чтении и не учитывалась в другом.
+# Операции старше срока хранения секций журнала выгружаются в архив, поэтому остатки считаются только на даты
+# не раньше дня перед самой старой секцией (history_start) и только от снимков не раньше этого дня.
+
+INCOMING_OPERATIONS = ("addition", "buying")
+
+
+def order_deltas(after, until, owner_id=None):
+    """Изменение остатков по операциям с датой в интервале (after, until]: {(собственник, товар): количество}.
+    Граница None - без ограничения."""
+    incoming = Order.objects.filter(operation__in=INCOMING_OPERATIONS)
+    outgoing = Order.objects.filter(operation="buying")
+    if owner_id is not None:
+        incoming = incoming.filter(owner_id=owner_id)
+        outgoing = outgoing.filter(supplier_id=owner_id)
+    if after is not None:
+        incoming = incoming.filter(created_at__gt=after)
+        outgoing = outgoing.filter(created_at__gt=after)
+    if until is not None:
+        incoming = incoming.filter(created_at__lte=until)
+        outgoing = outgoing.filter(created_at__lte=until)
+
+    deltas = {}
+    for queryset, field, sign in ((incoming, "owner", 1), (outgoing, "supplier", -1)):
+        rows = queryset.values(field, "product").annotate(total=Sum("quantity"))
+        for row in rows:
+            key = (row[field], row["product"])
+            deltas[key] = deltas.get(key, 0) + sign * row["total"]
+    return deltas
+
+
+def current_stock(owner_id=None):
+    """Текущие остатки {(собственник, товар): количество} с суммированием секций остатка."""
+    warehouses = Warehouse.objects.filter(quantity__gt=0)
+    if owner_id is not None:
+        warehouses = warehouses.filter(owner_id=owner_id)
+    rows = warehouses.values("owner", "product").annotate(total=Sum("quantity"))
+    return {(row["owner"], row["product"]): row["total"] for row in rows}
+
+
+@contextmanager
+def consistent_read():
+    """Транзакция, все запросы которой видят один снимок БД (REPEATABLE READ в PostgreSQL). Уровень изоляции
+    задается только для внешней транзакции, вложенная использует уровень внешней."""
+    outermost = not connection.in_atomic_block
+    with transaction.atomic():
+        if outermost and connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+        yield
+
+
+def apply_deltas(stock, deltas, sign):
+    for key, quantity in deltas.items():
+        stock[key] = stock.get(key, 0) + sign * quantity
+    return stock
+
+
+def history_border():
+    """Первый день, на конец которого остатки считаются по сохраненному журналу операций, или None."""
+    start = history_start()
+    return start - timedelta(days=1) if start is not None else None
+
+
+def stock_as_of(owner_id, day, today=None):
+    """Остатки собственника на конец дня day: {id товара: количество}. Для дат раньше сохраненного журнала
+    операций вызывается ValidationError."""
+    today = today or date.today()
+    snapshots = StockSnapshot.objects.filter(owner_id=owner_id, day__lte=day)
+    border = history_border()
+    if border is not None:
+        if day < border:
+            raise ValidationError(
+                f"Операции до {border + timedelta(days=1)} выгружены в архив, "
+                f"остатки доступны на даты начиная с {border} !"
+            )
+        snapshots = snapshots.filter(day__gte=border)
+    snapshot = snapshots.order_by("-day").first()
+    if snapshot is not None and (day - snapshot.day) <= (today - day):
+        stock = {
+            (owner_id, int(product)): quantity
+            for product, quantity in snapshot.quantities.items()
+        }
+        apply_deltas(stock, order_deltas(snapshot.day, day, owner_id), 1)
+    else:
+        with consistent_read():
+            stock = current_stock(owner_id)
+            apply_deltas(stock, order_deltas(day, None, owner_id), -1)
+    return {product: quantity for (_, product), quantity in stock.items() if quantity}
+
+
+def take_snapshots(day=None):
+    """Снимки остатков всех собственников на конец дня day (по умолчанию вчера): текущие остатки с откатом
+    операций после этого дня. Возвращает количество снимков."""
+    day = day or date.today() - timedelta(days=1)
+    with consistent_read():
+        stock = apply_deltas(current_stock(), order_deltas(day, None), -1)
+    quantities = {}
+    for (owner_id, product_id), quantity in stock.items():
+        owner_quantities = quantities.setdefault(owner_id, {})
+        if quantity:
+            owner_quantities[str(product_id)] = quantity
+    with transaction.atomic():
+        StockSnapshot.objects.filter(day=day).delete()
+        StockSnapshot.objects.bulk_create(
+            [
+                StockSnapshot(owner_id=owner_id, day=day, quantities=items)
+                for owner_id, items in quantities.items()
+            ]
+        )
+    return len(quantities)
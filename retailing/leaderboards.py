@@ -0,0 +1,159 @@
+import atexit
+import heapq
+import threading
+import time
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+
+from retailing.models import Leaderboard, Order, Product, ProductViewStat
+
+# Рейтинги товаров. Просмотры копятся в памяти рабочего процесса в структуре Space-Saving ограниченного размера
+# (самые частые товары считаются точно, редкие вытесняются с наследованием минимального счетчика) и пишутся
+# в ProductViewStat пачкой раз в LEADERBOARD_FLUSH_INTERVAL секунд. Рейтинги за окна LEADERBOARD_WINDOWS
+# пересчитываются командой refresh_leaderboards в таблицу Leaderboard.
+
+
+def get_capacity():
+    return getattr(settings, "LEADERBOARD_COUNTER_CAPACITY", 1000)
+
+
+def get_flush_interval():
+    return getattr(settings, "LEADERBOARD_FLUSH_INTERVAL", 60)
+
+
+def get_windows():
+    return getattr(settings, "LEADERBOARD_WINDOWS", (1, 7, 30))
+
+
+def get_size():
+    return getattr(settings, "LEADERBOARD_SIZE", 20)
+
+
+class SpaceSaving:
+    """Счетчик частых элементов (heavy hitters) на capacity элементов. Значение счетчика может завышать
+    реальное количество не более чем на минимальный счетчик в момент вытеснения."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = {}
+
+    def add(self, item, count=1):
+        if item in self.counts or len(self.counts) < self.capacity:
+            self.counts[item] = self.counts.get(item, 0) + count
+            return
+        victim = min(self.counts, key=self.counts.get)
+        self.counts[item] = self.counts.pop(victim) + count
+
+    def pop_all(self):
+        counts, self.counts = self.counts, {}
+        return counts
+
+
+_views = SpaceSaving(get_capacity())
+_views_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+
+def record_view(product_id):
+    """Учитываем просмотр продукта, при необходимости сбрасываем накопленное в БД."""
+    global _last_flush
+    with _views_lock:
+        _views.add(product_id)
+        if time.monotonic() - _last_flush < get_flush_interval():
+            return
+        _last_flush = time.monotonic()
+    flush_views()
+
+
+def flush_views(day=None):
+    """Записываем накопленные просмотры. Недостающие строки дня создаются с нулем (параллельная запись
+    другого процесса игнорируется), затем счетчики увеличиваются одним UPDATE на каждое значение прироста.
+    """
+    with _views_lock:
+        counts = _views.pop_all()
+    if not counts:
+        return
+    day = day or date.today()
+    by_count = {}
+    for product_id, count in counts.items():
+        by_count.setdefault(count, []).append(product_id)
+    with transaction.atomic():
+        ProductViewStat.objects.bulk_create(
+            [
+                ProductViewStat(product_id=product_id, day=day, views=0)
+                for product_id in counts
+            ],
+            ignore_conflicts=True,
+        )
+        for count, product_ids in by_count.items():
+            ProductViewStat.objects.filter(day=day, product__in=product_ids).update(
+                views=F("views") + count
+            )
+
+
+atexit.register(flush_views)
+
+
+def product_scores(kind, since):
+    if kind == "viewed":
+        rows = (
+            ProductViewStat.objects.filter(day__gte=since)
+            .values("product")
+            .annotate(score=Sum("views"))
+        )
+    else:
+        rows = (
+            Order.objects.filter(operation="buying", created_at__gte=since)
+            .values("product")
+            .annotate(score=Sum("quantity"))
+        )
+    return {row["product"]: row["score"] for row in rows}
+
+
+def build_leaderboard(kind, window, today):
+    """Строки рейтинга для всех срезов одного вида и окна."""
+    scores = product_scores(kind, today - timedelta(days=window - 1))
+    products = Product.objects.filter(pk__in=scores).values(
+        "pk", "category_id", "supplier__country_id"
+    )
+    groups = {("global", None): []}
+    for product in products:
+        item = (scores[product["pk"]], product["pk"])
+        groups[("global", None)].append(item)
+        groups.setdefault(("category", product["category_id"]), []).append(item)
+        if product["supplier__country_id"] is not None:
+            groups.setdefault(("country", product["supplier__country_id"]), []).append(
+                item
+            )
+
+    rows = []
+    for (scope, scope_id), items in groups.items():
+        for rank, (score, product_id) in enumerate(
+            heapq.nlargest(get_size(), items), start=1
+        ):
+            rows.append(
+                Leaderboard(
+                    kind=kind,
+                    scope=scope,
+                    scope_id=scope_id,
+                    window=window,
+                    rank=rank,
+                    product_id=product_id,
+                    score=score,
+                )
+            )
+    return rows
+
+
+def refresh_leaderboards(today=None):
+    today = today or date.today()
+    flush_views(today)
+    for kind, _ in Leaderboard.KIND:
+        for window in get_windows():
+            rows = build_leaderboard(kind, window, today)
+            with transaction.atomic():
+                Leaderboard.objects.filter(kind=kind, window=window).delete()
+                Leaderboard.objects.bulk_create(rows)
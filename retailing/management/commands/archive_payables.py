@@ -0,0 +1,16 @@
+from django.core.management import BaseCommand
+
+from retailing.archive import archive_payables
+
+
+class Command(BaseCommand):
+    """Перенос списанных задолженностей старше заданного количества дней (по умолчанию PAYABLE_ARCHIVE_DAYS)
+    в архив задолженностей."""
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int)
+        parser.add_argument("--batch-size", type=int)
+
+    def handle(self, *args, **options):
+        archived = archive_payables(options["days"], options["batch_size"])
+        self.stdout.write(f"Перенесено в архив задолженностей: {archived}")
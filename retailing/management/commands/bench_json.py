@@ -0,0 +1,78 @@
+import time
+from datetime import date
+from decimal import Decimal
+
+from django.core.management import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from retailing.models import Category, Order, Product, Supplier
+from retailing.renderers import ORJSONRenderer
+from retailing.serialaizer import OrderSerializerReadOnly, ProductSerializerReadOnly
+
+
+class Command(BaseCommand):
+    """Сравнение скорости JSONRenderer и ORJSONRenderer на страницах операций и продуктов. Объекты создаются
+    в памяти без обращения к БД."""
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1000)
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        rows = options["rows"]
+        repeat = options["repeat"]
+        payloads = {
+            "order": Command.order_payload(rows),
+            "product": Command.product_payload(rows),
+        }
+        for name, payload in payloads.items():
+            for renderer in (JSONRenderer(), ORJSONRenderer()):
+                start = time.perf_counter()
+                for _ in range(repeat):
+                    content = renderer.render(payload)
+                elapsed = (time.perf_counter() - start) / repeat * 1000
+                self.stdout.write(
+                    f"{name:8} {type(renderer).__name__:15} {elapsed:8.2f} мс "
+                    f"{len(content)} байт"
+                )
+
+    @staticmethod
+    def order_payload(rows):
+        orders = [
+            Order(
+                pk=pk,
+                owner_id=1,
+                supplier_id=2,
+                product_id=pk % 50 + 1,
+                user_id=1,
+                operation="buying",
+                quantity=pk % 7 + 1,
+                price=Decimal("45000.00"),
+                amount=Decimal("45000.00") * (pk % 7 + 1),
+                payment_amount=Decimal("0.00"),
+                created_at=date.today(),
+            )
+            for pk in range(1, rows + 1)
+        ]
+        results = OrderSerializerReadOnly(orders, many=True).data
+        return {"count": rows, "next": None, "previous": None, "results": results}
+
+    @staticmethod
+    def product_payload(rows):
+        category = Category(pk=1, name="Телевизоры")
+        supplier = Supplier(pk=1, name="Sony Corporation", type="vendor")
+        products = [
+            Product(
+                pk=pk,
+                name=f"Sony {pk}",
+                model="Bravia",
+                category=category,
+                supplier=supplier,
+                user_id=1,
+                release_date=date.today(),
+                view_counter=pk,
+            )
+            for pk in range(1, rows + 1)
+        ]
+        results = ProductSerializerReadOnly(products, many=True, context={}).data
+        return {"count": rows, "next": None, "previous": None, "results": results}
@@ -0,0 +1,18 @@
+from django.core.management import BaseCommand
+
+from retailing.schema import build_schema, get_schema_dir
+
+
+class Command(BaseCommand):
+    """Построение схемы OpenAPI для текущей версии кода (openapi.json и openapi.yaml в OPENAPI_SCHEMA_DIR).
+    Запускается при сборке или развертывании, схема уже построенной версии не перестраивается без --force."""
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true")
+
+    def handle(self, *args, **options):
+        version, built = build_schema(options["force"])
+        if built:
+            self.stdout.write(f"Схема версии {version} записана в {get_schema_dir()}")
+        else:
+            self.stdout.write(f"Схема версии {version} уже построена")
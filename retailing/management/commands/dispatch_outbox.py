@@ -0,0 +1,23 @@
+import time
+
+from django.core.management import BaseCommand
+
+from retailing.outbox import dispatch_pending
+
+
+class Command(BaseCommand):
+    """Процесс отправки исходящих уведомлений. С --once отправляет готовые уведомления и завершается (для
+    запуска по расписанию), иначе проверяет очередь каждые --interval секунд."""
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true")
+        parser.add_argument("--interval", type=float, default=5)
+
+    def handle(self, *args, **options):
+        while True:
+            sent = dispatch_pending()
+            if sent:
+                self.stdout.write(f"Отправлено уведомлений: {sent}")
+            if options["once"]:
+                return
+            time.sleep(options["interval"])
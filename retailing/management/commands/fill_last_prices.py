@@ -0,0 +1,30 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from retailing.models import LastPrice, Order
+
+
+class Command(BaseCommand):
+    """Заполнение таблицы последних цен по журналу операций. Последняя продажа каждого товара каждым поставщиком
+    выбирается одним запросом DISTINCT ON (product, supplier) PostgreSQL."""
+
+    def handle(self, *args, **options):
+        last_orders = (
+            Order.objects.filter(operation="buying", supplier__isnull=False)
+            .order_by("product", "supplier", "-created_at", "-id")
+            .distinct("product", "supplier")
+            .values("product", "supplier", "price", "created_at")
+        )
+        prices = [
+            LastPrice(
+                product_id=order["product"],
+                supplier_id=order["supplier"],
+                price=order["price"],
+                sold_at=order["created_at"],
+            )
+            for order in last_orders.iterator()
+        ]
+        with transaction.atomic():
+            LastPrice.objects.all().delete()
+            LastPrice.objects.bulk_create(prices, batch_size=1000)
+        self.stdout.write(f"Записано цен: {len(prices)}")
@@ -0,0 +1,32 @@
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+
+from retailing.partitions import (
+    archive_partitions,
+    convert_to_partitioned,
+    ensure_partitions,
+)
+
+
+class Command(BaseCommand):
+    """Секционирование журнала операций по месяцам. --convert выполняется один раз после migrate, без параметров
+    команда создает будущие секции, --archive отсоединяет и выгружает секции старше срока хранения. Команда без
+    параметров и с --archive запускается по расписанию (например, ежедневно)."""
+
+    def add_arguments(self, parser):
+        parser.add_argument("--convert", action="store_true")
+        parser.add_argument("--archive", action="store_true")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("Секционирование поддерживается только для PostgreSQL !")
+        if options["convert"]:
+            if convert_to_partitioned():
+                self.stdout.write("Таблица операций секционирована.")
+            else:
+                self.stdout.write("Таблица операций уже секционирована.")
+        for name in ensure_partitions():
+            self.stdout.write(f"Создана секция {name}")
+        if options["archive"]:
+            for path in archive_partitions():
+                self.stdout.write(f"Секция выгружена в {path}")
@@ -0,0 +1,19 @@
+from datetime import timedelta
+
+from django.core.management import BaseCommand
+from django.utils import timezone
+
+from retailing.models import StreamEvent
+
+
+class Command(BaseCommand):
+    """Удаление событий потока SSE старше заданного количества дней. Клиент, отставший сильнее, получает
+    событие reset и пересинхронизируется."""
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=7)
+
+    def handle(self, *args, **options):
+        border = timezone.now() - timedelta(days=options["days"])
+        deleted, _ = StreamEvent.objects.filter(created_at__lt=border).delete()
+        self.stdout.write(f"Удалено событий: {deleted}")
@@ -0,0 +1,19 @@
+from datetime import timedelta
+
+from django.core.management import BaseCommand
+from django.utils import timezone
+
+from retailing.sync import get_sync_retention_days, prune_changes
+
+
+class Command(BaseCommand):
+    """Удаление журнала синхронизации старше заданного количества дней (по умолчанию SYNC_RETENTION_DAYS).
+    Клиент с курсором до границы очистки получает ответ resync и загружает данные заново."""
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=get_sync_retention_days())
+
+    def handle(self, *args, **options):
+        border = timezone.now() - timedelta(days=options["days"])
+        deleted = prune_changes(border)
+        self.stdout.write(f"Удалено изменений: {deleted}")
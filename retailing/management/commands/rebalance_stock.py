@@ -0,0 +1,11 @@
+from django.core.management import BaseCommand
+
+from retailing.stock import rebalance_all
+
+
+class Command(BaseCommand):
+    """Выравнивание остатков популярных товаров между секциями. Запускается по расписанию."""
+
+    def handle(self, *args, **options):
+        count = rebalance_all()
+        self.stdout.write(f"Выровнено остатков: {count}")
@@ -0,0 +1,10 @@
+from django.core.management import BaseCommand
+
+from retailing.leaderboards import refresh_leaderboards
+
+
+class Command(BaseCommand):
+    """Пересчет рейтингов товаров. Запускается по расписанию (cron), например раз в 10 минут."""
+
+    def handle(self, *args, **options):
+        refresh_leaderboards()
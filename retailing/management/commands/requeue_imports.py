@@ -0,0 +1,15 @@
+from django.core.management import BaseCommand
+
+from retailing.imports import requeue_stale_jobs, run_job
+from retailing.models import OrderImportJob
+
+
+class Command(BaseCommand):
+    """Выполнение заданий загрузки операций, прерванных остановкой процесса: задания без прогресса дольше
+    ORDER_IMPORT_STALE_TIMEOUT секунд продолжаются в этом процессе с первой необработанной порции. Запускается
+    после перезапуска сервера и по расписанию."""
+
+    def handle(self, *args, **options):
+        for job_id in requeue_stale_jobs():
+            run_job(job_id)
+            self.stdout.write(str(OrderImportJob.objects.get(pk=job_id)))
@@ -0,0 +1,16 @@
+from datetime import date
+
+from django.core.management import BaseCommand
+
+from retailing.inventory import take_snapshots
+
+
+class Command(BaseCommand):
+    """Снимки остатков всех собственников на конец дня (по умолчанию вчерашнего). Запускается ежедневно."""
+
+    def add_arguments(self, parser):
+        parser.add_argument("--date", type=date.fromisoformat)
+
+    def handle(self, *args, **options):
+        count = take_snapshots(options["date"])
+        self.stdout.write(f"Создано снимков остатков: {count}")
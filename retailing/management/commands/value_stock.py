@@ -0,0 +1,18 @@
+from django.core.management import BaseCommand
+
+from retailing.valuation import value_stock
+
+
+class Command(BaseCommand):
+    """Стоимостная оценка остатков собственника (по средневзвешенной себестоимости и FIFO)."""
+
+    def add_arguments(self, parser):
+        parser.add_argument("owner", type=int)
+
+    def handle(self, *args, **options):
+        for item in value_stock(options["owner"]):
+            self.stdout.write(
+                f"Товар {item['product']}: {item['quantity']} шт., "
+                f"средняя {item['average_cost']}, по средней {item['average_value']}, "
+                f"по FIFO {item['fifo_value']}"
+            )
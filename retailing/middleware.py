@@ -0,0 +1,178 @@
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Сжатие ответов по заголовку Accept-Encoding. Поддерживаются gzip (всегда), br и zstd (если установлены
+# пакеты brotli и zstandard). Потоковые ответы сжимаются по частям, каждая часть сбрасывается клиенту сразу,
+# без накопления всего тела в памяти. HTML (админ-панель) не сжимается: страницы содержат CSRF-токены,
+# а сжатие таких страниц открывает атаку BREACH.
+
+DEFAULT_CONTENT_TYPES = (
+    "application/json",
+    "application/javascript",
+    "application/x-ndjson",
+    "application/yaml",
+    "text/css",
+    "text/csv",
+    "text/javascript",
+    "text/plain",
+)
+
+
+class GzipCompressor:
+    def __init__(self):
+        self._compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+
+    def compress(self, data):
+        return self._compressor.compress(data) + self._compressor.flush(
+            zlib.Z_SYNC_FLUSH
+        )
+
+    def finish(self):
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class BrotliCompressor:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=5)
+
+    def compress(self, data):
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class ZstdCompressor:
+    def __init__(self):
+        self._compressor = zstandard.ZstdCompressor(level=3).compressobj()
+
+    def compress(self, data):
+        return self._compressor.compress(data) + self._compressor.flush(
+            zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        )
+
+    def finish(self):
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+
+def available_compressors():
+    """Кодировки в порядке предпочтения сервера."""
+    compressors = {}
+    if zstandard is not None:
+        compressors["zstd"] = ZstdCompressor
+    if brotli is not None:
+        compressors["br"] = BrotliCompressor
+    compressors["gzip"] = GzipCompressor
+    return compressors
+
+
+def parse_accept_encoding(header):
+    """Кодировки из заголовка Accept-Encoding с q > 0."""
+    accepted = {}
+    for item in header.split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name] = quality
+    return {name for name, quality in accepted.items() if quality > 0}
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """Согласованное сжатие ответов API и выгрузок. Размещается в MIDDLEWARE после SecurityMiddleware,
+    чтобы сжимать окончательное тело ответа."""
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.compressors = available_compressors()
+        self.min_length = getattr(settings, "COMPRESSION_MIN_LENGTH", 1024)
+        self.content_types = getattr(
+            settings, "COMPRESSION_CONTENT_TYPES", DEFAULT_CONTENT_TYPES
+        )
+
+    def select_encoding(self, request):
+        accepted = parse_accept_encoding(request.headers.get("Accept-Encoding", ""))
+        for encoding in self.compressors:
+            if encoding in accepted:
+                return encoding
+        return None
+
+    def is_compressible(self, response):
+        if response.has_header("Content-Encoding"):
+            return False
+        content_type = response.get("Content-Type", "").split(";")[0].strip().lower()
+        return content_type in self.content_types
+
+    def process_response(self, request, response):
+        if not self.is_compressible(response):
+            return response
+        # ответ зависит от Accept-Encoding даже если в этот раз он не сжат
+        patch_vary_headers(response, ("Accept-Encoding",))
+        if not response.streaming and len(response.content) < self.min_length:
+            return response
+
+        encoding = self.select_encoding(request)
+        if encoding is None:
+            return response
+        compressor_class = self.compressors[encoding]
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = self.compress_async(
+                    compressor_class(), response.streaming_content
+                )
+            else:
+                response.streaming_content = self.compress_sequence(
+                    compressor_class(), response.streaming_content
+                )
+            del response.headers["Content-Length"]
+        else:
+            compressor = compressor_class()
+            compressed = compressor.compress(response.content) + compressor.finish()
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers["Content-Length"] = str(len(compressed))
+
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            # тело изменилось, сильный ETag становится слабым
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = encoding
+        return response
+
+    @staticmethod
+    def compress_sequence(compressor, sequence):
+        for item in sequence:
+            data = compressor.compress(item)
+            if data:
+                yield data
+        yield compressor.finish()
+
+    @staticmethod
+    async def compress_async(compressor, sequence):
+        async for item in sequence:
+            data = compressor.compress(item)
+            if data:
+                yield data
+        yield compressor.finish()
@@ -1,11 +1,43 @@
 from datetime import date
 
 from django.db import models
+from django.db.models import F
 
 from config import settings
 
 NULLABLE = {"blank": True, "null": True}
 
+OPERATION_CHOICES = [
+    ("addition", "пополнение склада"),
+    ("buying", "покупка"),
+    ("return", "возврат"),
+    ("write_off", "списание"),
+]
+
+
+def bump_version(instance, save_kwargs, volatile_fields=()):
+    """Увеличиваем версию объекта при каждом сохранении. По версии строится ключ кеша сериализованного
+    представления объекта, поэтому старые фрагменты после изменения больше не используются. Версия
+    увеличивается в самом UPDATE (version = version + 1), поэтому одновременные сохранения не получают
+    одинаковую версию. Сохранение только полей volatile_fields (они не берутся из кеша, см.
+    cache.FragmentCacheMixin) версию не меняет. Возвращает True, если после сохранения версию нужно
+    перечитать (refresh_version)."""
+    update_fields = save_kwargs.get("update_fields")
+    if instance._state.adding:
+        return False
+    if update_fields is not None and set(update_fields) <= set(volatile_fields):
+        return False
+    instance.version = F("version") + 1
+    if update_fields is not None:
+        save_kwargs["update_fields"] = {*update_fields, "version"}
+    return True
+
+
+def refresh_version(instance, bumped):
+    """Версия после сохранения становится отложенным полем и читается из БД при первом обращении."""
+    if bumped:
+        del instance.__dict__["version"]
+
 
 class Country(models.Model):
     """Страна где зарегистрован поставщик товара."""
@@ -58,14 +90,28 @@ class Supplier(models.Model):
     street = models.CharField(max_length=100, verbose_name="улица")
     house_number = models.CharField(max_length=10, verbose_name="номер дома")
     created_at = models.DateTimeField(verbose_name="время создания", auto_now_add=True)
+    updated_at = models.DateTimeField(
+        verbose_name="время изменения", auto_now=True, db_index=True
+    )
+    version = models.PositiveIntegerField(default=0, verbose_name="версия")
 
     class Meta:
         verbose_name = "Поставщик"
         verbose_name_plural = "Поставщики"
+        indexes = [
+            models.Index(fields=["country", "type", "name"]),
+            models.Index(fields=["type", "name"]),
+            models.Index(fields=["city", "name"]),
+        ]
 
     def __str__(self):
         return f"Наименование: {self.name}, страна: {self.country}"
 
+    def save(self, *args, **kwargs):
+        bumped = bump_version(self, kwargs)
+        super().save(*args, **kwargs)
+        refresh_version(self, bumped)
+
 
 class Category(models.Model):
     """Товары электроники как и другие типы товаров могут делиться на разные категории
@@ -117,6 +163,13 @@ class Product(models.Model):
     image = models.ImageField(
         upload_to="catalog/media", verbose_name="изображение", **NULLABLE
     )
+    image_variants = models.JSONField(
+        default=dict, blank=True, verbose_name="варианты изображения"
+    )
+    updated_at = models.DateTimeField(
+        verbose_name="время изменения", auto_now=True, db_index=True
+    )
+    version = models.PositiveIntegerField(default=0, verbose_name="версия")
 
     class Meta:
         verbose_name = "Продукт"
@@ -125,9 +178,31 @@ class Product(models.Model):
     def __str__(self):
         return f"Наименование: {self.name}, модель: {self.name}, производитель: {self.supplier}"
 
+    def save(self, *args, **kwargs):
+        bumped = bump_version(self, kwargs, volatile_fields=("view_counter",))
+        super().save(*args, **kwargs)
+        refresh_version(self, bumped)
+
+
+class WarehouseQuerySet(models.QuerySet):
+    def with_totals(self):
+        """Основные строки остатков (секция 0) с суммарным количеством по всем секциям в total_quantity."""
+        totals = (
+            Warehouse.objects.filter(
+                owner=models.OuterRef("owner"), product=models.OuterRef("product")
+            )
+            .order_by()
+            .values("owner", "product")
+            .annotate(total=models.Sum("quantity"))
+            .values("total")
+        )
+        return self.filter(shard=0).annotate(total_quantity=models.Subquery(totals))
+
 
 class Warehouse(models.Model):
-    """Склад запасы товаров (остатки). Доступ только для сотрудников заводов изготовителей (вендоров)."""
+    """Склад запасы товаров (остатки). Доступ только для сотрудников заводов изготовителей (вендоров).
+    Остаток популярного товара (HotStock) хранится в нескольких строках-секциях (shard), остаток товара -
+    сумма секций."""
 
     owner = models.ForeignKey(
         Supplier,
@@ -142,14 +217,72 @@ class Warehouse(models.Model):
         related_name="owner_product",
     )
     quantity = models.PositiveIntegerField(verbose_name="количество")
+    shard = models.PositiveSmallIntegerField(verbose_name="секция", default=0)
+    updated_at = models.DateTimeField(
+        verbose_name="время изменения", auto_now=True, db_index=True
+    )
+
+    objects = WarehouseQuerySet.as_manager()
 
     class Meta:
         verbose_name = "Остаток"
         verbose_name_plural = "Остатки"
+        indexes = [
+            models.Index(
+                fields=["product", "owner"],
+                condition=models.Q(quantity__gt=0),
+                name="warehouse_in_stock_idx",
+            )
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["owner", "product", "shard"],
+                name="warehouse_owner_product_shard",
+            )
+        ]
 
     def __str__(self):
         return f"Владелец: {self.owner.name}, продукт: {self.product.name}, количество: {self.quantity}"
 
+    @property
+    def stock_quantity(self):
+        """Остаток товара по всем секциям, если строка выбрана через with_totals(), иначе остаток строки."""
+        return getattr(self, "total_quantity", self.quantity)
+
+
+class HotStock(models.Model):
+    """Популярный товар собственника, остаток которого разбивается на shards секций. Покупки списывают остаток
+    со случайной незаблокированной секции, поэтому параллельные покупки не ждут друг друга на одной строке.
+    Остаток между секциями выравнивается командой rebalance_stock."""
+
+    owner = models.ForeignKey(
+        Supplier,
+        verbose_name="собственник",
+        on_delete=models.CASCADE,
+        related_name="owner_hot_stock",
+    )
+    product = models.ForeignKey(
+        Product,
+        verbose_name="товар",
+        on_delete=models.CASCADE,
+        related_name="product_hot_stock",
+    )
+    shards = models.PositiveSmallIntegerField(
+        verbose_name="количество секций", default=4
+    )
+
+    class Meta:
+        verbose_name = "Популярный товар"
+        verbose_name_plural = "Популярные товары"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["owner", "product"], name="hot_stock_owner_product"
+            )
+        ]
+
+    def __str__(self):
+        return f"Владелец: {self.owner}, товар: {self.product}, секций: {self.shards}"
+
 
 class Payable(models.Model):
     """Задолженность. Могут быть оба вида заолженности, за поставщиком (недопоставлен товар) и покупателем
@@ -179,22 +312,109 @@ class Payable(models.Model):
     class Meta:
         verbose_name = "Задолженность"
         verbose_name_plural = "Задолженности"
+        indexes = [
+            models.Index(
+                fields=["owner"],
+                condition=models.Q(is_paid=False),
+                name="payable_owner_unpaid_idx",
+            ),
+            models.Index(
+                fields=["supplier"],
+                condition=models.Q(is_paid=False),
+                name="payable_supplier_unpaid_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"Должник: {self.owner}, поставщик: {self.supplier}, сумма задолежности: {self.amount}"
 
 
+class PayableArchive(models.Model):
+    """Архив списанных задолженностей. Списанные задолженности старше PAYABLE_ARCHIVE_DAYS дней переносятся
+    сюда командой archive_payables с сохранением id, чтобы не мешать выборкам действующих задолженностей."""
+
+    id = models.BigIntegerField(primary_key=True, verbose_name="id задолженности")
+    owner = models.ForeignKey(
+        Supplier,
+        verbose_name="покупатель",
+        on_delete=models.PROTECT,
+        related_name="owner_payable_archive",
+        **NULLABLE,
+    )
+    supplier = models.ForeignKey(
+        Supplier,
+        verbose_name="поставщик",
+        on_delete=models.PROTECT,
+        related_name="supplier_payable_archive",
+    )
+    amount = models.DecimalField(
+        max_digits=10, decimal_places=2, verbose_name="сумма задолженности"
+    )
+    created_at = models.DateField(verbose_name="дата возникновения")
+    paid_date = models.DateField(verbose_name="дата списания", **NULLABLE)
+    archived_at = models.DateTimeField(verbose_name="дата архивации", auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Архивная задолженность"
+        verbose_name_plural = "Архив задолженностей"
+        indexes = [
+            models.Index(fields=["owner", "paid_date"]),
+            models.Index(fields=["supplier", "paid_date"]),
+        ]
+
+    def __str__(self):
+        return f"Должник: {self.owner}, поставщик: {self.supplier}, списано: {self.paid_date}"
+
+
+class OrderDocument(models.Model):
+    """Документ операции с несколькими товарами: заголовок (поставщик, покупатель, оплата) и строки - операции
+    Order с этим документом. Документ проводится целиком в одной транзакции."""
+
+    owner = models.ForeignKey(
+        Supplier,
+        verbose_name="собственник",
+        on_delete=models.PROTECT,
+        related_name="document_owner",
+        **NULLABLE,
+    )
+    supplier = models.ForeignKey(
+        Supplier,
+        verbose_name="поставщик",
+        on_delete=models.PROTECT,
+        related_name="document_supplier",
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.PROTECT,
+        verbose_name="сотрудник",
+        related_name="document_user",
+        **NULLABLE,
+    )
+    operation = models.CharField(
+        max_length=10, verbose_name="действие", choices=OPERATION_CHOICES
+    )
+    amount = models.DecimalField(
+        max_digits=12, decimal_places=2, verbose_name="сумма документа", default=0
+    )
+    payment_amount = models.DecimalField(
+        max_digits=12, decimal_places=2, verbose_name="сумма оплаты", default=0
+    )
+    created_at = models.DateField(verbose_name="дата документа", default=date.today)
+
+    class Meta:
+        verbose_name = "Документ операции"
+        verbose_name_plural = "Документы операций"
+
+    def __str__(self):
+        return f"Документ {self.pk}: {self.operation}, поставщик: {self.supplier}, сумма: {self.amount}"
+
+
 class Order(models.Model):
     """Операции с товарами. Операция addition может быть только у завода после отправки произведенной продукции
     на склад. У остальных участников торговой сети пополнение склада происходит после покупки (buying). В текущей
     версии проекта реализованы только две операции: пополение склада и продажа."""
 
-    OPERATION = [
-        ("addition", "пополнение склада"),
-        ("buying", "покупка"),
-        ("return", "возврат"),
-        ("write_off", "списание"),
-    ]
+    OPERATION = OPERATION_CHOICES
 
     owner = models.ForeignKey(
         Supplier,
@@ -235,10 +455,311 @@ class Order(models.Model):
         max_digits=10, decimal_places=2, verbose_name="сумма оплаты", default=0
     )
     created_at = models.DateField(verbose_name="дата операции", default=date.today)
+    document = models.ForeignKey(
+        OrderDocument,
+        verbose_name="документ",
+        on_delete=models.PROTECT,
+        related_name="document_line",
+        **NULLABLE,
+    )
 
     class Meta:
         verbose_name = "Задолженность"
         verbose_name_plural = "Задолженности"
+        indexes = [
+            models.Index(fields=["operation", "created_at"]),
+            models.Index(fields=["owner", "id"]),
+            models.Index(fields=["owner", "product", "created_at"]),
+            models.Index(fields=["owner", "supplier", "created_at"]),
+            models.Index(fields=["owner", "operation", "created_at"]),
+            models.Index(fields=["supplier", "operation", "created_at"]),
+        ]
 
     def __str__(self):
         return f"Должник: {self.owner}, поставщик: {self.supplier}, сумма задолженности: {self.amount}"
+
+
+class SyncChange(models.Model):
+    """Журнал изменений поставщиков, продуктов и складов для инкрементальной синхронизации (зеркала каталога
+    и остатков в POS-системах). Заполняется сигналами при сохранении и удалении объектов. Поле txid - номер
+    транзакции PostgreSQL, записи выдаются в порядке (txid, id) только для завершенных транзакций, поэтому
+    клиент не пропускает изменения, зафиксированные позже более ранних по номеру. Запись prune - граница
+    очистки журнала (retailing/sync.py)."""
+
+    OPERATION = [
+        ("upsert", "изменение"),
+        ("delete", "удаление"),
+        ("prune", "граница очистки"),
+    ]
+
+    model = models.CharField(max_length=20, verbose_name="модель")
+    object_id = models.BigIntegerField(verbose_name="id объекта")
+    owner_id = models.BigIntegerField(verbose_name="id собственника", **NULLABLE)
+    operation = models.CharField(
+        max_length=6, choices=OPERATION, verbose_name="действие"
+    )
+    txid = models.BigIntegerField(default=0, verbose_name="номер транзакции")
+    created_at = models.DateTimeField(verbose_name="время изменения", auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Изменение"
+        verbose_name_plural = "Журнал изменений"
+        indexes = [models.Index(fields=["txid", "id"])]
+
+    def __str__(self):
+        return f"{self.operation} {self.model}: {self.object_id}"
+
+
+class StreamEvent(models.Model):
+    """События для потока server-sent events: проведенные покупки у поставщика (order_posted) и изменения его
+    остатков (stock_changed). Хранятся для возобновления потока с заданного id (Last-Event-ID)."""
+
+    TYPE = [
+        ("order_posted", "проведена покупка"),
+        ("stock_changed", "изменен остаток"),
+    ]
+
+    supplier_id = models.BigIntegerField(verbose_name="id поставщика")
+    type = models.CharField(max_length=20, choices=TYPE, verbose_name="тип события")
+    data = models.JSONField(verbose_name="данные события")
+    created_at = models.DateTimeField(verbose_name="время события", auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Событие"
+        verbose_name_plural = "События"
+        indexes = [models.Index(fields=["supplier_id", "id"])]
+
+    def __str__(self):
+        return f"{self.type}: поставщик {self.supplier_id}"
+
+
+class LastPrice(models.Model):
+    """Последняя цена продажи товара поставщиком. Обновляется при каждой покупке (buying), чтобы не искать
+    цену в журнале операций (Order) при выводе предложений по товару."""
+
+    supplier = models.ForeignKey(
+        Supplier,
+        verbose_name="поставщик",
+        on_delete=models.CASCADE,
+        related_name="supplier_last_price",
+    )
+    product = models.ForeignKey(
+        Product,
+        verbose_name="товар",
+        on_delete=models.CASCADE,
+        related_name="product_last_price",
+    )
+    price = models.DecimalField(max_digits=8, decimal_places=2, verbose_name="цена")
+    sold_at = models.DateField(verbose_name="дата продажи")
+
+    class Meta:
+        verbose_name = "Последняя цена"
+        verbose_name_plural = "Последние цены"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["product", "supplier"], name="last_price_product_supplier"
+            )
+        ]
+
+    def __str__(self):
+        return f"Поставщик: {self.supplier}, товар: {self.product}, цена: {self.price}"
+
+
+class ProductViewStat(models.Model):
+    """Количество просмотров продукта за день. Пишется пачками из счетчика просмотров рабочего процесса
+    (retailing.leaderboards), а не при каждом просмотре."""
+
+    product = models.ForeignKey(
+        Product,
+        verbose_name="товар",
+        on_delete=models.CASCADE,
+        related_name="product_view_stat",
+    )
+    day = models.DateField(verbose_name="день")
+    views = models.PositiveIntegerField(default=0, verbose_name="просмотры")
+
+    class Meta:
+        verbose_name = "Просмотры за день"
+        verbose_name_plural = "Просмотры по дням"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["product", "day"], name="view_stat_product_day"
+            )
+        ]
+
+    def __str__(self):
+        return f"Товар: {self.product_id}, день: {self.day}, просмотры: {self.views}"
+
+
+class Leaderboard(models.Model):
+    """Предрасчитанные рейтинги товаров (самые просматриваемые и самые продаваемые) за скользящее окно дней:
+    общий, по категории и по стране производителя. Пересчитывается командой refresh_leaderboards по расписанию,
+    запрос рейтинга читает не более LEADERBOARD_SIZE строк по индексу."""
+
+    KIND = [
+        ("viewed", "самые просматриваемые"),
+        ("selling", "самые продаваемые"),
+    ]
+    SCOPE = [
+        ("global", "общий"),
+        ("category", "по категории"),
+        ("country", "по стране производителя"),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND, verbose_name="рейтинг")
+    scope = models.CharField(max_length=10, choices=SCOPE, verbose_name="срез")
+    scope_id = models.BigIntegerField(verbose_name="id среза", **NULLABLE)
+    window = models.PositiveSmallIntegerField(verbose_name="окно, дней")
+    rank = models.PositiveSmallIntegerField(verbose_name="место")
+    product = models.ForeignKey(
+        Product,
+        verbose_name="товар",
+        on_delete=models.CASCADE,
+        related_name="product_leaderboard",
+    )
+    score = models.PositiveBigIntegerField(verbose_name="значение")
+
+    class Meta:
+        verbose_name = "Рейтинг товаров"
+        verbose_name_plural = "Рейтинги товаров"
+        indexes = [models.Index(fields=["kind", "scope", "scope_id", "window", "rank"])]
+
+    def __str__(self):
+        return f"{self.kind} {self.scope}: {self.rank}. {self.product_id}"
+
+
+class StockSnapshot(models.Model):
+    """Снимок остатков собственника на конец дня: словарь {id товара: количество} без нулевых остатков.
+    Остаток на произвольную дату считается от ближайшего снимка применением операций после него
+    (retailing.inventory). Снимки создаются командой snapshot_stock по расписанию."""
+
+    owner = models.ForeignKey(
+        Supplier,
+        verbose_name="собственник",
+        on_delete=models.CASCADE,
+        related_name="owner_stock_snapshot",
+    )
+    day = models.DateField(verbose_name="дата снимка")
+    quantities = models.JSONField(verbose_name="остатки")
+    created_at = models.DateTimeField(verbose_name="время создания", auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Снимок остатков"
+        verbose_name_plural = "Снимки остатков"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["owner", "day"], name="stock_snapshot_owner_day"
+            )
+        ]
+
+    def __str__(self):
+        return f"Остатки {self.owner} на {self.day}"
+
+
+class OrderImportJob(models.Model):
+    """Пакетная загрузка операций из файла JSONL (одна операция в строке). Файл обрабатывается в фоне
+    пулом рабочих потоков (retailing.imports), результат каждой строки (id созданной операции или ошибка)
+    записывается в OrderImportResult. heartbeat_at обновляется после каждой порции, по нему команда
+    requeue_imports находит задания, прерванные остановкой процесса."""
+
+    STATUS = [
+        ("pending", "ожидает"),
+        ("running", "выполняется"),
+        ("done", "завершена"),
+        ("failed", "ошибка"),
+    ]
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        verbose_name="сотрудник",
+        related_name="order_import_job",
+    )
+    file = models.FileField(upload_to="imports/", verbose_name="файл операций")
+    status = models.CharField(
+        max_length=10, choices=STATUS, default="pending", verbose_name="статус"
+    )
+    total = models.PositiveIntegerField(default=0, verbose_name="всего строк")
+    processed = models.PositiveIntegerField(default=0, verbose_name="обработано строк")
+    failed = models.PositiveIntegerField(default=0, verbose_name="строк с ошибками")
+    error = models.TextField(verbose_name="ошибка загрузки", **NULLABLE)
+    created_at = models.DateTimeField(verbose_name="время создания", auto_now_add=True)
+    heartbeat_at = models.DateTimeField(
+        verbose_name="время последней обработанной порции", **NULLABLE
+    )
+    finished_at = models.DateTimeField(verbose_name="время завершения", **NULLABLE)
+
+    class Meta:
+        verbose_name = "Загрузка операций"
+        verbose_name_plural = "Загрузки операций"
+
+    def __str__(self):
+        return f"Загрузка {self.pk}: {self.status}, {self.processed}/{self.total}"
+
+
+class OrderImportResult(models.Model):
+    """Результат строки файла пакетной загрузки операций."""
+
+    job = models.ForeignKey(
+        OrderImportJob,
+        on_delete=models.CASCADE,
+        verbose_name="загрузка",
+        related_name="job_result",
+    )
+    line = models.PositiveIntegerField(verbose_name="номер строки")
+    order_id = models.BigIntegerField(verbose_name="id операции", **NULLABLE)
+    error = models.CharField(max_length=255, verbose_name="ошибка", **NULLABLE)
+
+    class Meta:
+        verbose_name = "Результат строки загрузки"
+        verbose_name_plural = "Результаты строк загрузки"
+        indexes = [models.Index(fields=["job", "line"])]
+
+    def __str__(self):
+        return (
+            f"Загрузка {self.job_id}, строка {self.line}: {self.error or self.order_id}"
+        )
+
+
+class OutboxMessage(models.Model):
+    """Исходящее уведомление (e-mail или Telegram). Записывается в той же транзакции, что и изменение, о котором
+    уведомляет, и отправляется отдельным процессом dispatch_outbox порциями с ограничением частоты и повторами."""
+
+    CHANNEL = [
+        ("email", "e-mail"),
+        ("telegram", "Telegram"),
+    ]
+    STATUS = [
+        ("pending", "ожидает отправки"),
+        ("sent", "отправлено"),
+        ("failed", "не отправлено"),
+    ]
+
+    channel = models.CharField(max_length=10, choices=CHANNEL, verbose_name="канал")
+    recipient = models.CharField(max_length=254, verbose_name="получатель")
+    subject = models.CharField(max_length=255, verbose_name="тема")
+    body = models.TextField(verbose_name="текст")
+    status = models.CharField(
+        max_length=10, choices=STATUS, default="pending", verbose_name="статус"
+    )
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="попытки")
+    next_attempt_at = models.DateTimeField(
+        verbose_name="время следующей попытки", auto_now_add=True
+    )
+    last_error = models.TextField(verbose_name="последняя ошибка", **NULLABLE)
+    created_at = models.DateTimeField(verbose_name="время создания", auto_now_add=True)
+    sent_at = models.DateTimeField(verbose_name="время отправки", **NULLABLE)
+
+    class Meta:
+        verbose_name = "Уведомление"
+        verbose_name_plural = "Исходящие уведомления"
+        indexes = [
+            models.Index(
+                fields=["next_attempt_at"],
+                condition=models.Q(status="pending"),
+                name="outbox_pending_idx",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.channel} {self.recipient}: {self.subject}"
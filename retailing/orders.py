@@ -0,0 +1,226 @@
+from django.db.models import Sum
+from rest_framework.exceptions import ValidationError
+
+from retailing.events import record_events
+from retailing.models import LastPrice, Order, OrderDocument, Payable, Warehouse
+from retailing.outbox import notify_suppliers
+from retailing.stock import add_stock_many, take_stock_many
+
+# Проведение операций с товарами: правила участников сети, проверка остатка поставщика и изменение остатков,
+# последних цен и задолженностей. Используется при создании одной операции и при пакетной загрузке операций.
+
+
+def check_order_rules(user, operation, supplier):
+    """Проверяем, может ли сотрудник участника сети провести операцию с поставщиком. Запросов к БД нет."""
+    if operation == "addition" and user.supplier_type != "vendor":
+        raise ValidationError(
+            f"Пополнить склад готовой продукций может только вендор !"
+        )
+    if (
+        operation == "addition"
+        and user.supplier_type == "vendor"
+        and supplier.pk != user.supplier_id
+    ):
+        raise ValidationError(
+            f"Пополнить склад готовой продукции может только сотрудник вендора !"
+        )
+
+    if operation == "buying" and supplier.pk == user.supplier_id:
+        raise ValidationError(f"Нельзя купить товар у самого себя !")
+
+    if operation == "buying" and user.supplier_type == "vendor":
+        raise ValidationError(
+            f"Вендор может пополнить склад готовой продукции но не может купить !"
+        )
+
+    if (
+        operation == "buying"
+        and user.supplier_type == "distributor"
+        and supplier.type != "vendor"
+    ):
+        raise ValidationError(
+            f"Дистрибьютор может купить товар только у завода производителя !"
+        )
+
+    if (
+        operation == "buying"
+        and user.supplier_type == "retailer"
+        and supplier.type not in ["vendor", "distributor"]
+    ):
+        raise ValidationError(
+            f"Ритейлер может купить товар только у завода производителя (вендора) или дистрибьютера !"
+        )
+
+
+def check_stock(available, quantity):
+    """Проверяем остаток поставщика available (None - товара на складе нет) перед покупкой quantity штук."""
+    if available is None:
+        raise ValidationError(f"У поставщика отсутствует требуемый товар !")
+    if available < quantity:
+        raise ValidationError(f"У поставщика недостаточно требуемого товара !")
+
+
+def get_available(supplier, product):
+    return Warehouse.objects.filter(owner=supplier.pk, product=product).aggregate(
+        Sum("quantity")
+    )["quantity__sum"]
+
+
+def add_payable(owner, supplier, amount):
+    """Записываем разницу стоимости и оплаты в долг. Если положительная сумма должник покупатель,
+    отрицательная - поставщик."""
+    # списанные строки не используются: команда archive_payables переносит их в архив и удаляет
+    payable = (
+        Payable.objects.select_for_update()
+        .filter(owner=owner, supplier=supplier, is_paid=False)
+        .order_by("pk")
+        .first()
+    )
+    if payable is not None:
+        payable.amount += amount
+        payable.save(update_fields=["amount"])
+    else:
+        Payable.objects.create(owner=owner, supplier=supplier, amount=amount)
+        notify_suppliers(
+            [owner.pk, supplier.pk],
+            "Новая задолженность",
+            f"Возникла задолженность между {owner.name} и {supplier.name} "
+            f"на сумму {amount}.",
+        )
+
+
+def post_order(order, user):
+    """Проводим сохраненную операцию: сумма, последняя цена, событие поставщику, остатки и задолженность.
+    Вызывается в транзакции."""
+    order.user = user
+    order.owner = user.supplier
+    order.amount = order.price * order.quantity
+    order.save()
+    post_orders([order], user)
+
+
+def post_orders(orders, user):
+    """Проводим сохраненные операции сотрудника. Остатки покупателя и каждого поставщика изменяются одним
+    блокирующим запросом на собственника, задолженность - один раз на поставщика, последние цены - одним
+    запросом. Поставщики обрабатываются в порядке id, чтобы параллельные проведения не блокировали друг друга
+    взаимно. Вызывается в транзакции."""
+    incoming = {}
+    outgoing = {}
+    payables = {}
+    last_prices = {}
+    events = []
+    for order in orders:
+        if order.operation == "buying":
+            last_prices[(order.product_id, order.supplier_id)] = LastPrice(
+                product_id=order.product_id,
+                supplier_id=order.supplier_id,
+                price=order.price,
+                sold_at=order.created_at,
+            )
+            events.append(
+                (
+                    order.supplier_id,
+                    "order_posted",
+                    {
+                        "order": order.pk,
+                        "owner": order.owner_id,
+                        "product": order.product_id,
+                        "quantity": order.quantity,
+                        "price": str(order.price),
+                    },
+                )
+            )
+        if order.operation not in ["addition", "buying"]:
+            continue
+        # перемещаем купленный товар на остаток покупателя
+        incoming[order.product] = incoming.get(order.product, 0) + order.quantity
+        if user.supplier_type != "vendor":
+            # уменьшаем у поставщика остаток товара если это покупка
+            products = outgoing.setdefault(order.supplier, {})
+            products[order.product] = products.get(order.product, 0) + order.quantity
+            if order.quantity != order.payment_amount:
+                payables[order.supplier] = (
+                    payables.get(order.supplier, 0)
+                    + order.amount
+                    - order.payment_amount
+                )
+
+    if last_prices:
+        LastPrice.objects.bulk_create(
+            last_prices.values(),
+            update_conflicts=True,
+            unique_fields=["product", "supplier"],
+            update_fields=["price", "sold_at"],
+        )
+    record_events(events)
+    purchases = {}
+    for order in orders:
+        if order.operation == "buying":
+            count, amount = purchases.get(order.supplier_id, (0, 0))
+            purchases[order.supplier_id] = (count + 1, amount + order.amount)
+    for supplier_id, (count, amount) in sorted(purchases.items()):
+        notify_suppliers(
+            [supplier_id],
+            "Новая покупка",
+            f"{user.supplier.name} купил у вас товары: позиций {count}, "
+            f"на сумму {amount}.",
+        )
+    if incoming:
+        add_stock_many(user.supplier, incoming)
+    for supplier, products in sorted(outgoing.items(), key=lambda item: item[0].pk):
+        take_stock_many(supplier, products)
+    for supplier, amount in sorted(payables.items(), key=lambda item: item[0].pk):
+        add_payable(user.supplier, supplier, amount)
+
+
+def post_document(user, supplier, operation, lines, payment_amount):
+    """Проводим документ из строк [(товар, количество, цена)]. Правила проверяются один раз на документ,
+    остатки поставщика по всем товарам - одним запросом. Оплата документа распределяется по строкам по порядку,
+    поэтому задолженность изменяется один раз на документ. Вызывается в транзакции."""
+    check_order_rules(user, operation, supplier)
+    if payment_amount < 0:
+        raise ValidationError("Сумма оплаты не может быть отрицательной !")
+    if operation == "buying":
+        quantities = {}
+        for product, quantity, _ in lines:
+            quantities[product] = quantities.get(product, 0) + quantity
+        available = dict(
+            Warehouse.objects.filter(owner=supplier.pk, product__in=quantities)
+            .values("product")
+            .annotate(total=Sum("quantity"))
+            .values_list("product", "total")
+        )
+        for product, quantity in quantities.items():
+            check_stock(available.get(product.pk), quantity)
+
+    document = OrderDocument.objects.create(
+        owner=user.supplier,
+        supplier=supplier,
+        user=user,
+        operation=operation,
+        amount=sum(price * quantity for _, quantity, price in lines),
+        payment_amount=payment_amount,
+    )
+    orders = []
+    unpaid = payment_amount
+    for number, (product, quantity, price) in enumerate(lines, 1):
+        amount = price * quantity
+        paid = unpaid if number == len(lines) else min(amount, unpaid)
+        unpaid -= paid
+        orders.append(
+            Order(
+                document=document,
+                owner=user.supplier,
+                supplier=supplier,
+                product=product,
+                user=user,
+                operation=operation,
+                quantity=quantity,
+                price=price,
+                amount=amount,
+                payment_amount=paid,
+                created_at=document.created_at,
+            )
+        )
+    post_orders(Order.objects.bulk_create(orders), user)
+    return document
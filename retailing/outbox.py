@@ -0,0 +1,214 @@
+import time
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from retailing.models import OutboxMessage
+
+# Исходящие уведомления (transactional outbox). Бизнес-операция только записывает уведомления в таблицу
+# OutboxMessage в своей транзакции, поэтому внешние серверы не добавляют задержку запросам, а уведомление
+# отправляется тогда и только тогда, когда изменение зафиксировано. Процесс dispatch_outbox забирает порции
+# готовых к отправке уведомлений (FOR UPDATE SKIP LOCKED, можно запускать несколько процессов), отправляет
+# e-mail через одно SMTP-соединение на порцию и сообщения Telegram через Bot API с ограничением частоты,
+# при ошибке откладывает повтор с экспоненциально растущей паузой.
+
+
+def get_batch_size():
+    return getattr(settings, "OUTBOX_BATCH_SIZE", 100)
+
+
+def get_rate_limit():
+    return getattr(settings, "OUTBOX_RATE_LIMIT", 20)
+
+
+def get_max_attempts():
+    return getattr(settings, "OUTBOX_MAX_ATTEMPTS", 8)
+
+
+def get_retry_delay():
+    return getattr(settings, "OUTBOX_RETRY_DELAY", 30)
+
+
+def get_claim_timeout():
+    return getattr(settings, "OUTBOX_CLAIM_TIMEOUT", 300)
+
+
+def get_telegram_url():
+    return getattr(settings, "TELEGRAM_API_URL", "https://api.telegram.org")
+
+
+def get_telegram_timeout():
+    return getattr(settings, "TELEGRAM_TIMEOUT", 10)
+
+
+def get_telegram_token():
+    return getattr(settings, "TELEGRAM_BOT_TOKEN", None)
+
+
+def enqueue(users, subject, body):
+    """Записываем уведомления пользователям: e-mail каждому и Telegram тем, у кого указан tg_chat_id."""
+    messages = []
+    for user in users:
+        if user.email:
+            messages.append(
+                OutboxMessage(
+                    channel="email", recipient=user.email, subject=subject, body=body
+                )
+            )
+        if user.tg_chat_id:
+            messages.append(
+                OutboxMessage(
+                    channel="telegram",
+                    recipient=user.tg_chat_id,
+                    subject=subject,
+                    body=body,
+                )
+            )
+    OutboxMessage.objects.bulk_create(messages)
+
+
+def notify_suppliers(supplier_ids, subject, body):
+    """Уведомления активным сотрудникам компаний."""
+    enqueue(
+        get_user_model().objects.filter(supplier__in=supplier_ids, is_active=True),
+        subject,
+        body,
+    )
+
+
+def notify_superusers(subject, body):
+    enqueue(get_user_model().objects.filter(is_superuser=True), subject, body)
+
+
+def claim_batch(now=None):
+    """Забираем порцию готовых уведомлений. На время отправки следующая попытка переносится на
+    OUTBOX_CLAIM_TIMEOUT секунд, поэтому уведомления процесса, завершившегося аварийно, будут отправлены
+    повторно. Перед отправкой каждого уведомления захват продлевается (extend_claim), поэтому срок захвата
+    ограничивает время отправки одного уведомления, а не всей порции."""
+    now = now or timezone.now()
+    claimed_until = now + timedelta(seconds=get_claim_timeout())
+    with transaction.atomic():
+        messages = list(
+            OutboxMessage.objects.filter(status="pending", next_attempt_at__lte=now)
+            .select_for_update(skip_locked=True)
+            .order_by("next_attempt_at", "id")[: get_batch_size()]
+        )
+        OutboxMessage.objects.filter(
+            pk__in=[message.pk for message in messages]
+        ).update(next_attempt_at=claimed_until)
+    for message in messages:
+        message.next_attempt_at = claimed_until
+    return messages
+
+
+def extend_claim(message):
+    """Продлеваем захват уведомления на OUTBOX_CLAIM_TIMEOUT секунд. Если захват уже истек и уведомление забрал
+    другой процесс, возвращает False - такое уведомление не отправляем."""
+    claimed_until = timezone.now() + timedelta(seconds=get_claim_timeout())
+    extended = OutboxMessage.objects.filter(
+        pk=message.pk, status="pending", next_attempt_at=message.next_attempt_at
+    ).update(next_attempt_at=claimed_until)
+    if extended:
+        message.next_attempt_at = claimed_until
+    return bool(extended)
+
+
+class RateLimiter:
+    """Не более rate отправок в секунду."""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.next_at = time.monotonic()
+
+    def wait(self):
+        now = time.monotonic()
+        if self.next_at > now:
+            time.sleep(self.next_at - now)
+        self.next_at = max(now, self.next_at) + self.interval
+
+
+def send_email(message, connection):
+    # соединение открывается при первом письме порции и используется для остальных писем
+    connection.open()
+    EmailMessage(
+        message.subject,
+        message.body,
+        settings.EMAIL_HOST_USER,
+        [message.recipient],
+        connection=connection,
+    ).send()
+
+
+def send_telegram(message, session):
+    response = session.post(
+        f"{get_telegram_url()}/bot{get_telegram_token()}/sendMessage",
+        json={
+            "chat_id": message.recipient,
+            "text": f"{message.subject}\n\n{message.body}",
+        },
+        timeout=get_telegram_timeout(),
+    )
+    response.raise_for_status()
+
+
+def dispatch_batch(messages, limiter=None):
+    """Отправляем порцию уведомлений. Возвращает количество отправленных."""
+    limiter = limiter or RateLimiter(get_rate_limit())
+    sent = 0
+    connection = get_connection()
+    try:
+        with requests.Session() as session:
+            for message in messages:
+                limiter.wait()
+                if not extend_claim(message):
+                    continue
+                message.attempts += 1
+                try:
+                    if message.channel == "email":
+                        send_email(message, connection)
+                    else:
+                        send_telegram(message, session)
+                except Exception as error:
+                    if message.channel == "email":
+                        # после ошибки SMTP следующее письмо откроет новое соединение
+                        connection.close()
+                    message.last_error = str(error)
+                    if message.attempts >= get_max_attempts():
+                        message.status = "failed"
+                    else:
+                        delay = get_retry_delay() * 2 ** (message.attempts - 1)
+                        message.next_attempt_at = timezone.now() + timedelta(
+                            seconds=delay
+                        )
+                else:
+                    message.status = "sent"
+                    message.sent_at = timezone.now()
+                    sent += 1
+                message.save(
+                    update_fields=[
+                        "status",
+                        "attempts",
+                        "next_attempt_at",
+                        "last_error",
+                        "sent_at",
+                    ]
+                )
+    finally:
+        connection.close()
+    return sent
+
+
+def dispatch_pending():
+    """Отправляем все готовые уведомления порциями. Возвращает количество отправленных."""
+    limiter = RateLimiter(get_rate_limit())
+    sent = 0
+    while True:
+        messages = claim_batch()
+        if not messages:
+            return sent
+        sent += dispatch_batch(messages, limiter)
@@ -1,4 +1,4 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 
 class CategoryPaginator(PageNumberPagination):
@@ -31,13 +31,29 @@ class WarehousePaginator(PageNumberPagination):
     max_page_size = 10
 
 
-class OrderPaginator(PageNumberPagination):
+class OrderPaginator(CursorPagination):
+    """Постраничный вывод операций по ключу id от новых к старым. Курсор строится только по первому полю
+    сортировки, поэтому ключ уникален: по дате операции курсор пропускал бы операции одного дня смещением."""
+
     page_size = 5
     page_size_query_param = "page_size"
     max_page_size = 10
+    ordering = "-id"
 
 
 class PayablePaginator(PageNumberPagination):
     page_size = 5
     page_size_query_param = "page_size"
     max_page_size = 10
+
+
+class OfferPaginator(PageNumberPagination):
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+
+class OrderImportResultPaginator(PageNumberPagination):
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 1000
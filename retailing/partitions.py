@@ -0,0 +1,248 @@
+import gzip
+import os
+import re
+from datetime import date
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from retailing.models import Order
+
+# Секционирование журнала операций (Order) PostgreSQL по месяцам created_at. Таблица retailing_order
+# преобразуется в секционированную (PARTITION BY RANGE), для каждого месяца создается секция
+# retailing_order_pYYYY_MM и секция по умолчанию для дат вне созданных диапазонов (ее строки переносятся
+# в секцию месяца при создании секции). Первичный ключ секционированной таблицы - (id, created_at), для Django
+# ключом остается id. Запросы с условием или сортировкой по created_at
+# (список операций собственника, итоги за период) затрагивают только нужные секции.
+
+PARTITION_RE = re.compile(r"_p(\d{4})_(\d{2})$")
+
+
+def table_name():
+    return Order._meta.db_table
+
+
+def get_premake_months():
+    return getattr(settings, "ORDER_PARTITION_PREMAKE_MONTHS", 3)
+
+
+def get_retention_months():
+    return getattr(settings, "ORDER_PARTITION_RETENTION_MONTHS", 24)
+
+
+def get_archive_dir():
+    return getattr(
+        settings, "ORDER_ARCHIVE_DIR", os.path.join(settings.BASE_DIR, "archive")
+    )
+
+
+def month_start(day):
+    return date(day.year, day.month, 1)
+
+
+def add_months(day, months):
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"{table_name()}_p{month.year}_{month.month:02d}"
+
+
+def is_partitioned(cursor):
+    cursor.execute(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table p "
+        "JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = %s)",
+        [table_name()],
+    )
+    return cursor.fetchone()[0]
+
+
+def default_partition():
+    return f"{table_name()}_default"
+
+
+def has_default_partition(cursor):
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [default_partition()])
+    return cursor.fetchone()[0]
+
+
+def create_partition(cursor, month):
+    """Секция месяца. Если у таблицы есть секция по умолчанию, PostgreSQL не создаст секцию, пока в секции по
+    умолчанию есть строки ее диапазона: секция создается отдельной таблицей, строки месяца переносятся в нее
+    из секции по умолчанию, затем секция присоединяется к таблице операций."""
+    name = partition_name(month)
+    bounds = [month, add_months(month, 1)]
+    if not has_default_partition(cursor):
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF '
+            f'"{table_name()}" FOR VALUES FROM (%s) TO (%s)',
+            bounds,
+        )
+        return
+    cursor.execute(f'CREATE TABLE "{name}" (LIKE "{table_name()}" INCLUDING DEFAULTS)')
+    cursor.execute(
+        f'WITH moved AS (DELETE FROM "{default_partition()}" '
+        f"WHERE created_at >= %s AND created_at < %s RETURNING *) "
+        f'INSERT INTO "{name}" SELECT * FROM moved',
+        bounds,
+    )
+    cursor.execute(
+        f'ALTER TABLE "{table_name()}" ATTACH PARTITION "{name}" '
+        f"FOR VALUES FROM (%s) TO (%s)",
+        bounds,
+    )
+
+
+def parse_partitions(names):
+    partitions = []
+    for name in names:
+        match = PARTITION_RE.search(name)
+        if match:
+            partitions.append((date(int(match[1]), int(match[2]), 1), name))
+    return sorted(partitions)
+
+
+def list_partitions(cursor):
+    """Месячные секции (месяц, имя) в порядке возрастания."""
+    cursor.execute(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = %s",
+        [table_name()],
+    )
+    return parse_partitions(name for (name,) in cursor.fetchall())
+
+
+def list_detached(cursor):
+    """Отсоединенные, но еще не удаленные секции (архивация была прервана после отсоединения)."""
+    cursor.execute(
+        "SELECT c.relname FROM pg_class c WHERE c.relkind = 'r' AND c.relname LIKE %s "
+        "AND NOT EXISTS (SELECT 1 FROM pg_inherits i WHERE i.inhrelid = c.oid)",
+        [f"{table_name()}\\_p%"],
+    )
+    return parse_partitions(name for (name,) in cursor.fetchall())
+
+
+def history_start():
+    """Первый день самой старой присоединенной секции журнала операций: более ранние операции выгружены в архив
+    (archive_partitions). None - журнал не секционирован и хранится полностью."""
+    if connection.vendor != "postgresql":
+        return None
+    with connection.cursor() as cursor:
+        partitions = list_partitions(cursor)
+    return partitions[0][0] if partitions else None
+
+
+def convert_to_partitioned(today=None):
+    """Однократное преобразование таблицы операций в секционированную. Выполняется после migrate в одной
+    транзакции: таблица переименовывается, создается секционированная копия с индексами и внешними ключами модели,
+    строки переносятся, старая таблица удаляется."""
+    today = today or date.today()
+    table = table_name()
+    old_table = f"{table}_unpartitioned"
+    with transaction.atomic(), connection.cursor() as cursor:
+        if is_partitioned(cursor):
+            return False
+        cursor.execute(f'ALTER TABLE "{table}" RENAME TO "{old_table}"')
+        # имена индексов и ограничений старой таблицы освобождаем для новой
+        cursor.execute(
+            "SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass",
+            [old_table],
+        )
+        for (name,) in cursor.fetchall():
+            cursor.execute(f'ALTER TABLE "{old_table}" DROP CONSTRAINT "{name}"')
+        cursor.execute(
+            "SELECT indexname FROM pg_indexes WHERE tablename = %s", [old_table]
+        )
+        for (name,) in cursor.fetchall():
+            cursor.execute(f'DROP INDEX "{name}"')
+
+        cursor.execute(
+            f'CREATE TABLE "{table}" (LIKE "{old_table}" INCLUDING DEFAULTS '
+            f"INCLUDING IDENTITY) PARTITION BY RANGE (created_at)"
+        )
+        cursor.execute(f'ALTER TABLE "{table}" ADD PRIMARY KEY (id, created_at)')
+        for field in Order._meta.concrete_fields:
+            if field.remote_field is None:
+                continue
+            target = field.remote_field.model._meta
+            cursor.execute(
+                f'ALTER TABLE "{table}" ADD FOREIGN KEY ("{field.column}") '
+                f'REFERENCES "{target.db_table}" ("{target.pk.column}") '
+                f"DEFERRABLE INITIALLY DEFERRED"
+            )
+        for field in Order._meta.concrete_fields:
+            if field.db_index and not field.primary_key:
+                cursor.execute(
+                    f'CREATE INDEX "{table}_{field.column}_idx" '
+                    f'ON "{table}" ("{field.column}")'
+                )
+        with connection.schema_editor(atomic=False) as schema_editor:
+            for index in Order._meta.indexes:
+                schema_editor.add_index(Order, index)
+
+        cursor.execute(f'SELECT min(created_at) FROM "{old_table}"')
+        first = cursor.fetchone()[0] or today
+        month = month_start(first)
+        while month <= add_months(month_start(today), get_premake_months()):
+            create_partition(cursor, month)
+            month = add_months(month, 1)
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS "{default_partition()}" '
+            f'PARTITION OF "{table}" DEFAULT'
+        )
+
+        cursor.execute(f'INSERT INTO "{table}" SELECT * FROM "{old_table}"')
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence(%s, 'id'), "
+            f'COALESCE((SELECT max(id) FROM "{table}"), 0) + 1, false)',
+            [table],
+        )
+        cursor.execute(f'DROP TABLE "{old_table}"')
+    return True
+
+
+def ensure_partitions(today=None):
+    """Создаем секции на текущий и ORDER_PARTITION_PREMAKE_MONTHS следующих месяцев. Запускается по расписанию."""
+    today = today or date.today()
+    created = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        existing = {name for _, name in list_partitions(cursor)}
+        for months in range(get_premake_months() + 1):
+            month = add_months(month_start(today), months)
+            if partition_name(month) not in existing:
+                create_partition(cursor, month)
+                created.append(partition_name(month))
+    return created
+
+
+def archive_partitions(today=None):
+    """Секции старше срока хранения отсоединяются от таблицы операций, выгружаются в сжатый CSV
+    (ORDER_ARCHIVE_DIR/<секция>.csv.gz) и удаляются. Каждый шаг выполняется отдельной транзакцией: отсоединение
+    фиксируется сразу и блокирует таблицу операций только на время изменения каталога, выгрузка читает уже
+    отдельную таблицу. Секции, отсоединенные прерванным запуском, выгружаются и удаляются при следующем."""
+    today = today or date.today()
+    border = add_months(month_start(today), -get_retention_months())
+    archive_dir = get_archive_dir()
+    os.makedirs(archive_dir, exist_ok=True)
+    archived = []
+    with connection.cursor() as cursor:
+        partitions = [name for month, name in list_partitions(cursor) if month < border]
+        detached = [name for _, name in list_detached(cursor)]
+    for name in partitions:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'ALTER TABLE "{table_name()}" DETACH PARTITION "{name}"')
+        detached.append(name)
+    for name in detached:
+        path = os.path.join(archive_dir, f"{name}.csv.gz")
+        # архив появляется под своим именем только после полной выгрузки
+        with connection.cursor() as cursor:
+            with gzip.open(f"{path}.tmp", "wb") as file:
+                cursor.copy_expert(
+                    f'COPY "{name}" TO STDOUT WITH (FORMAT csv, HEADER true)', file
+                )
+            os.replace(f"{path}.tmp", path)
+            cursor.execute(f'DROP TABLE "{name}"')
+        archived.append(path)
+    return archived
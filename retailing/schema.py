@@ -0,0 +1,158 @@
+import hashlib
+import os
+import tempfile
+import threading
+from importlib import import_module
+
+from django.apps import apps
+from django.conf import settings
+from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+from drf_yasg.generators import OpenAPISchemaGenerator
+
+# Заранее построенная схема OpenAPI. Схема строится командой build_schema при сборке или развертывании
+# и сохраняется в OPENAPI_SCHEMA_DIR в форматах JSON и YAML вместе с версией кода. Рабочий процесс читает файлы
+# один раз и отдает схему из памяти с ETag. Если файлов нет или версия кода изменилась, схема строится
+# при первом обращении и записывается заново. Версия кода - OPENAPI_CODE_VERSION (например, хеш коммита),
+# по умолчанию - хеш исходных файлов приложений проекта.
+
+FORMATS = {
+    "json": ("openapi.json", "application/json"),
+    "yaml": ("openapi.yaml", "application/yaml"),
+}
+VERSION_FILE = "VERSION"
+
+
+def get_schema_dir():
+    return getattr(
+        settings, "OPENAPI_SCHEMA_DIR", os.path.join(settings.BASE_DIR, "openapi")
+    )
+
+
+def source_files():
+    """Исходные файлы приложений проекта и пакета настроек."""
+    base_dir = str(settings.BASE_DIR)
+    roots = {
+        app.path for app in apps.get_app_configs() if app.path.startswith(base_dir)
+    }
+    roots.add(os.path.dirname(import_module(settings.SETTINGS_MODULE).__file__))
+    for root in sorted(roots):
+        for directory, dirs, files in os.walk(root):
+            dirs.sort()
+            for name in sorted(files):
+                if name.endswith(".py"):
+                    yield os.path.join(directory, name)
+
+
+def get_code_version():
+    version = getattr(settings, "OPENAPI_CODE_VERSION", None)
+    if version:
+        return version
+    digest = hashlib.sha256()
+    for path in source_files():
+        digest.update(path.encode("utf-8"))
+        with open(path, "rb") as file:
+            digest.update(file.read())
+    return digest.hexdigest()[:16]
+
+
+def is_schema_view(view):
+    """Представление создано генератором схемы (drf_yasg) без запроса и аргументов URL: get_queryset и
+    get_serializer_class должны обходиться без пользователя и pk."""
+    return getattr(view, "swagger_fake_view", False)
+
+
+def generate_schema():
+    """Схема всех конечных точек в JSON и YAML. Строится без запроса: адрес сервера в схему не попадает,
+    интерфейс документации использует адрес, с которого схема загружена."""
+    from retailing.urls import api_info
+
+    schema = OpenAPISchemaGenerator(api_info).get_schema(request=None, public=True)
+    return {
+        "json": OpenAPICodecJson(validators=[]).encode(schema),
+        "yaml": OpenAPICodecYaml(validators=[]).encode(schema),
+    }
+
+
+def replace_file(path, body):
+    """Файл заменяется целиком: содержимое пишется во временный файл того же каталога и переименовывается,
+    поэтому читающие процессы видят либо старый, либо новый файл, но не частично записанный."""
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(body)
+        # mkstemp создает файл с правами 0600
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def write_schema(documents, version):
+    schema_dir = get_schema_dir()
+    os.makedirs(schema_dir, exist_ok=True)
+    for schema_format, body in documents.items():
+        replace_file(os.path.join(schema_dir, FORMATS[schema_format][0]), body)
+    # версия записывается последней: прерванная запись не будет принята за актуальную схему
+    replace_file(os.path.join(schema_dir, VERSION_FILE), version.encode())
+
+
+def read_schema(version):
+    """Схема из файлов, если она построена для версии кода version, иначе None."""
+    schema_dir = get_schema_dir()
+    try:
+        with open(os.path.join(schema_dir, VERSION_FILE)) as file:
+            if file.read().strip() != version:
+                return None
+        documents = {}
+        for schema_format, (name, _) in FORMATS.items():
+            with open(os.path.join(schema_dir, name), "rb") as file:
+                documents[schema_format] = file.read()
+    except FileNotFoundError:
+        return None
+    return documents
+
+
+def build_schema(force=False):
+    """Построение и запись схемы для текущей версии кода. Возвращает (версия, построена ли схема заново)."""
+    version = get_code_version()
+    if not force and read_schema(version) is not None:
+        return version, False
+    write_schema(generate_schema(), version)
+    return version, True
+
+
+class SchemaStore:
+    """Схема в памяти процесса: {формат: (тело, ETag)}."""
+
+    def __init__(self):
+        self._documents = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        version = get_code_version()
+        documents = read_schema(version)
+        if documents is None:
+            documents = generate_schema()
+            try:
+                write_schema(documents, version)
+            except OSError:
+                # каталог схемы недоступен для записи, схема остается только в памяти
+                pass
+        return {
+            schema_format: (body, hashlib.sha256(body).hexdigest()[:32])
+            for schema_format, body in documents.items()
+        }
+
+    def get(self, schema_format):
+        with self._lock:
+            if self._documents is None:
+                self._documents = self.load()
+        return self._documents[schema_format]
+
+    def clear(self):
+        with self._lock:
+            self._documents = None
+
+
+schema_store = SchemaStore()
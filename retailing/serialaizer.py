@@ -1,7 +1,32 @@
+from django.core.files.storage import default_storage
 from rest_framework import serializers
 
-from retailing.models import (Category, Country, Order, Payable, Product,
-                              Supplier, Warehouse)
+from retailing.cache import FragmentCacheMixin, FragmentListSerializer
+from retailing.models import (Category, Country, Order, OrderDocument,
+                              OrderImportJob, OrderImportResult, Payable,
+                              PayableArchive, Product, Supplier, Warehouse)
+
+
+class ImageVariantsField(serializers.Field):
+    """Адреса вариантов изображения {вариант: {формат: URL}}, построенных в фоне (retailing/images.py)."""
+
+    def __init__(self, **kwargs):
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        request = self.context.get("request")
+        result = {}
+        for name, paths in value.items():
+            if name == "source":
+                continue
+            result[name] = {}
+            for image_format, path in paths.items():
+                url = default_storage.url(path)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                result[name][image_format] = url
+        return result
 
 
 class SupplierSerializer(serializers.ModelSerializer):
@@ -20,10 +45,11 @@ class SupplierSerializer(serializers.ModelSerializer):
         )
 
 
-class SupplierSerializerReadOnly(serializers.ModelSerializer):
+class SupplierSerializerReadOnly(FragmentCacheMixin, serializers.ModelSerializer):
     class Meta:
         model = Supplier
-        fields = "__all__"
+        exclude = ("version",)
+        list_serializer_class = FragmentListSerializer
 
 
 class CountrySerializer(serializers.ModelSerializer):
@@ -38,10 +64,14 @@ class CategorySerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
-class ProductSerializerReadOnly(serializers.ModelSerializer):
+class ProductSerializerReadOnly(FragmentCacheMixin, serializers.ModelSerializer):
+    image_variants = ImageVariantsField()
+    volatile_fields = ("view_counter",)
+
     class Meta:
         model = Product
-        fields = "__all__"
+        exclude = ("version",)
+        list_serializer_class = FragmentListSerializer
 
 
 class ProductSerializer(serializers.ModelSerializer):
@@ -57,12 +87,45 @@ class ProductSerializer(serializers.ModelSerializer):
 
 
 class WarehouseSerializer(serializers.ModelSerializer):
+    quantity = serializers.IntegerField(source="stock_quantity", read_only=True)
+
     class Meta:
         model = Warehouse
         fields = (
+            "id",
             "owner",
+            "product",
+            "quantity",
+            "shard",
+            "updated_at",
+        )
+
+
+class OfferSerializer(serializers.ModelSerializer):
+    """Предложение товара: поставщик, у которого товар есть на складе, и его последняя цена продажи."""
+
+    supplier = serializers.IntegerField(source="owner_id")
+    name = serializers.CharField(source="owner.name")
+    type = serializers.CharField(source="owner.type")
+    country = serializers.IntegerField(source="owner.country_id")
+    city = serializers.CharField(source="owner.city")
+    last_price = serializers.DecimalField(
+        max_digits=8, decimal_places=2, allow_null=True, read_only=True
+    )
+    last_sold_at = serializers.DateField(allow_null=True, read_only=True)
+    quantity = serializers.IntegerField(source="stock_quantity", read_only=True)
+
+    class Meta:
+        model = Warehouse
+        fields = (
             "supplier",
+            "name",
+            "type",
+            "country",
+            "city",
             "quantity",
+            "last_price",
+            "last_sold_at",
         )
 
 
@@ -84,7 +147,74 @@ class OrderSerializer(serializers.ModelSerializer):
         )
 
 
+class OrderDocumentLineSerializer(serializers.ModelSerializer):
+    """Строка документа. Товар передается по id, товары всех строк читаются одним запросом при проведении."""
+
+    product = serializers.IntegerField(source="product_id")
+
+    class Meta:
+        model = Order
+        fields = ("id", "product", "quantity", "price", "amount", "payment_amount")
+        read_only_fields = ("id", "amount", "payment_amount")
+
+
+class OrderDocumentSerializer(serializers.ModelSerializer):
+    lines = OrderDocumentLineSerializer(many=True, source="document_line")
+
+    class Meta:
+        model = OrderDocument
+        fields = (
+            "id",
+            "owner",
+            "supplier",
+            "operation",
+            "amount",
+            "payment_amount",
+            "created_at",
+            "lines",
+        )
+        read_only_fields = ("owner", "amount", "created_at")
+
+    def validate_lines(self, lines):
+        if not lines:
+            raise serializers.ValidationError("Документ должен содержать строки !")
+        return lines
+
+
 class PayableSerializer(serializers.ModelSerializer):
     class Meta:
         model = Payable
         fields = "__all__"
+
+
+class PayableArchiveSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PayableArchive
+        fields = "__all__"
+
+
+class OrderImportFileSerializer(serializers.Serializer):
+    """Файл пакетной загрузки операций: JSONL, операция в каждой строке."""
+
+    file = serializers.FileField()
+
+
+class OrderImportJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = OrderImportJob
+        fields = (
+            "id",
+            "status",
+            "total",
+            "processed",
+            "failed",
+            "error",
+            "created_at",
+            "finished_at",
+        )
+
+
+class OrderImportResultSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = OrderImportResult
+        fields = ("line", "order_id", "error")
@@ -0,0 +1,105 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from retailing.cache import bump_generation
+from retailing.events import record_event
+from retailing.images import schedule_variants
+from retailing.invalidation import dispatch, model_label, publish, subscribe
+from retailing.models import Category, Country, Product, Supplier, Warehouse
+from retailing.stock import total_stock
+from retailing.sync import record_change
+
+
+def is_view_counter_update(update_fields):
+    """Сохранение только счетчика просмотров продукта (и его версии)."""
+    return update_fields is not None and set(update_fields) <= {
+        "view_counter",
+        "version",
+    }
+
+
+def bump_scopes(scopes):
+    for scope in scopes:
+        bump_generation(scope)
+
+
+def notify_changed(sender, instance):
+    """Оповещаем подписчиков шины инвалидации. В текущем процессе кеши сбрасываются сразу и повторно после
+    фиксации транзакции, чтобы параллельный запрос не успел закешировать еще не зафиксированное состояние.
+    Остальные процессы получают сообщение NOTIFY после фиксации."""
+    label = model_label(sender)
+    pk = str(instance.pk)
+    publish(label, pk)
+    transaction.on_commit(lambda: dispatch(label, pk))
+
+
+def invalidate_supplier_cache(pk):
+    if pk is None:
+        bump_scopes(("supplier_list", "supplier_detail"))
+    else:
+        bump_scopes(("supplier_list", f"supplier:{pk}"))
+
+
+def invalidate_product_cache(pk):
+    bump_scopes(("product_list",))
+
+
+subscribe(model_label(Supplier), invalidate_supplier_cache)
+subscribe(model_label(Product), invalidate_product_cache)
+# по категории выполняется поиск в списке продуктов
+subscribe(model_label(Category), invalidate_product_cache)
+
+
+@receiver(post_save, sender=Supplier)
+@receiver(post_delete, sender=Supplier)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Country)
+@receiver(post_delete, sender=Country)
+def catalog_changed(sender, instance, **kwargs):
+    notify_changed(sender, instance)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_changed(sender, instance, update_fields=None, **kwargs):
+    if is_view_counter_update(update_fields):
+        # счетчик просмотров меняется при каждом просмотре продукта, список из-за него не сбрасываем
+        return
+    notify_changed(sender, instance)
+
+
+@receiver(post_save, sender=Product)
+def product_image_saved(sender, instance, update_fields=None, **kwargs):
+    if not is_view_counter_update(update_fields):
+        schedule_variants(instance, "image")
+
+
+@receiver(post_save, sender=Supplier)
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Warehouse)
+def sync_saved(sender, instance, update_fields=None, **kwargs):
+    if sender is Product and is_view_counter_update(update_fields):
+        return
+    record_change(instance, "upsert")
+
+
+@receiver(post_delete, sender=Supplier)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Warehouse)
+def sync_deleted(sender, instance, **kwargs):
+    record_change(instance, "delete")
+
+
+@receiver(post_save, sender=Warehouse)
+def stock_changed(sender, instance, **kwargs):
+    # остаток популярного товара разбит на секции, в событие передаем сумму секций
+    record_event(
+        instance.owner_id,
+        "stock_changed",
+        {
+            "product": instance.product_id,
+            "quantity": total_stock(instance.owner_id, instance.product_id),
+        },
+    )
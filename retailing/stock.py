@@ -0,0 +1,218 @@
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from retailing.events import record_events
+from retailing.models import HotStock, Warehouse
+from retailing.sync import record_changes
+
+# Изменение остатков. Остаток товара собственника хранится в одной строке (секция 0), а для популярных товаров
+# (HotStock) - в нескольких секциях. Поступление и списание блокируют одну случайную незаблокированную
+# секцию (FOR UPDATE SKIP LOCKED), поэтому пропускная способность покупок популярного товара растет
+# с количеством секций. Если все секции с нужным количеством заняты, списание ждет одну случайную из них.
+# Только если ни в одной секции нет нужного количества, блокируются все секции по порядку и количество
+# списывается из нескольких секций. Документ из нескольких товаров блокирует строки
+# всех своих товаров одним запросом и изменяет их постоянным числом запросов независимо от количества товаров
+# (add_stock_many, take_stock_many): bulk_update, bulk_create и пакетная запись журнала синхронизации и событий
+# остатков вместо сигналов post_save каждой строки.
+
+
+def stock_rows(owner_id, product_id):
+    return Warehouse.objects.filter(owner_id=owner_id, product_id=product_id)
+
+
+def add_stock(owner, product, quantity):
+    """Поступление товара на остаток собственника."""
+    with transaction.atomic():
+        warehouse = (
+            stock_rows(owner.pk, product.pk)
+            .select_for_update(skip_locked=True)
+            .order_by("?")
+            .first()
+        )
+        if warehouse is None:
+            warehouse, created = (
+                stock_rows(owner.pk, product.pk)
+                .select_for_update()
+                .get_or_create(
+                    owner=owner, product=product, shard=0, defaults={"quantity": 0}
+                )
+            )
+        warehouse.quantity += quantity
+        warehouse.save()
+
+
+def take_stock(owner, product, quantity):
+    """Списание товара с остатка собственника. Если товара недостаточно, вызывается ValidationError."""
+    with transaction.atomic():
+        # сначала свободная секция, затем ожидание одной случайной занятой секции с нужным количеством:
+        # все секции блокируются, только если ни одной из них не хватает на списание
+        for skip_locked in (True, False):
+            warehouse = (
+                stock_rows(owner.pk, product.pk)
+                .filter(quantity__gte=quantity)
+                .select_for_update(skip_locked=skip_locked)
+                .order_by("?")
+                .first()
+            )
+            if warehouse is not None:
+                warehouse.quantity -= quantity
+                warehouse.save()
+                return
+
+        shards = list(
+            stock_rows(owner.pk, product.pk).select_for_update().order_by("shard")
+        )
+        if sum(warehouse.quantity for warehouse in shards) < quantity:
+            raise ValidationError("У поставщика недостаточно требуемого товара !")
+        for warehouse in shards:
+            taken = min(warehouse.quantity, quantity)
+            if taken:
+                warehouse.quantity -= taken
+                warehouse.save()
+                quantity -= taken
+            if not quantity:
+                return
+
+
+def stock_saved(owner_id, rows):
+    """Журнал синхронизации и события stock_changed для строк остатков, сохраненных пакетно. Суммы секций
+    товаров читаются одним запросом."""
+    record_changes(rows, "upsert")
+    product_ids = {warehouse.product_id for warehouse in rows}
+    totals = dict(
+        Warehouse.objects.filter(owner_id=owner_id, product_id__in=product_ids)
+        .values("product")
+        .annotate(total=Sum("quantity"))
+        .values_list("product", "total")
+    )
+    record_events(
+        [
+            (
+                owner_id,
+                "stock_changed",
+                {"product": product_id, "quantity": totals.get(product_id, 0)},
+            )
+            for product_id in sorted(product_ids)
+        ]
+    )
+
+
+def update_stock_rows(rows):
+    """Одним UPDATE записываем количество строк остатков (bulk_update не заполняет auto_now)."""
+    now = timezone.now()
+    for warehouse in rows:
+        warehouse.updated_at = now
+    Warehouse.objects.bulk_update(rows, ["quantity", "updated_at"])
+
+
+def lock_stock_rows(owner, quantities):
+    """Блокируем строки остатков собственника по всем товарам одним запросом: {id товара: [секции]}."""
+    rows = {}
+    for warehouse in (
+        Warehouse.objects.filter(owner=owner.pk, product__in=quantities)
+        .select_for_update()
+        .order_by("product", "shard")
+    ):
+        rows.setdefault(warehouse.product_id, []).append(warehouse)
+    return rows
+
+
+def add_stock_many(owner, quantities):
+    """Поступление нескольких товаров {товар: количество} на остаток собственника: количество добавляется
+    в первую секцию товара, недостающие строки создаются. Один товар проводится через add_stock."""
+    if len(quantities) == 1:
+        [(product, quantity)] = quantities.items()
+        return add_stock(owner, product, quantity)
+    with transaction.atomic():
+        rows = lock_stock_rows(owner, quantities)
+        updated = []
+        created = []
+        for product, quantity in quantities.items():
+            if product.pk in rows:
+                warehouse = rows[product.pk][0]
+                warehouse.quantity += quantity
+                updated.append(warehouse)
+            else:
+                created.append(
+                    Warehouse(owner=owner, product=product, quantity=quantity)
+                )
+        update_stock_rows(updated)
+        stock_saved(owner.pk, updated + Warehouse.objects.bulk_create(created))
+
+
+def take_stock_many(owner, quantities):
+    """Списание нескольких товаров {товар: количество} с остатка собственника: все строки остатков блокируются
+    и проверяются одним запросом. Если какого-либо товара недостаточно, ничего не списывается и вызывается
+    ValidationError. Один товар проводится через take_stock."""
+    if len(quantities) == 1:
+        [(product, quantity)] = quantities.items()
+        return take_stock(owner, product, quantity)
+    with transaction.atomic():
+        rows = lock_stock_rows(owner, quantities)
+        for product, quantity in quantities.items():
+            if sum(row.quantity for row in rows.get(product.pk, ())) < quantity:
+                raise ValidationError(
+                    f"У поставщика недостаточно товара {product.pk} !"
+                )
+        updated = []
+        for product, quantity in quantities.items():
+            for warehouse in rows[product.pk]:
+                taken = min(warehouse.quantity, quantity)
+                if taken:
+                    warehouse.quantity -= taken
+                    updated.append(warehouse)
+                    quantity -= taken
+                if not quantity:
+                    break
+        update_stock_rows(updated)
+        stock_saved(owner.pk, updated)
+
+
+def rebalance_stock(owner_id, product_id, shards):
+    """Равномерно распределяем остаток по shards секциям. Лишние секции (если количество уменьшено) удаляются,
+    недостающие создаются."""
+    with transaction.atomic():
+        rows = list(
+            stock_rows(owner_id, product_id).select_for_update().order_by("shard")
+        )
+        total = sum(warehouse.quantity for warehouse in rows)
+        by_shard = {warehouse.shard: warehouse for warehouse in rows}
+        for shard in range(shards):
+            quantity = total // shards + (1 if shard < total % shards else 0)
+            warehouse = by_shard.pop(shard, None)
+            if warehouse is None:
+                Warehouse.objects.create(
+                    owner_id=owner_id,
+                    product_id=product_id,
+                    shard=shard,
+                    quantity=quantity,
+                )
+            elif warehouse.quantity != quantity:
+                warehouse.quantity = quantity
+                warehouse.save()
+        for warehouse in by_shard.values():
+            warehouse.delete()
+
+
+def rebalance_all():
+    """Выравниваем секции всех популярных товаров, секции товаров, исключенных из популярных, сливаются
+    в одну строку. Возвращает количество обработанных товаров."""
+    pairs = {
+        (hot.owner_id, hot.product_id): hot.shards for hot in HotStock.objects.all()
+    }
+    for row in Warehouse.objects.filter(shard__gt=0).values("owner", "product"):
+        pairs.setdefault((row["owner"], row["product"]), 1)
+    count = 0
+    for (owner_id, product_id), shards in pairs.items():
+        if stock_rows(owner_id, product_id).exists():
+            rebalance_stock(owner_id, product_id, shards)
+            count += 1
+    return count
+
+
+def total_stock(owner_id, product_id):
+    return (
+        stock_rows(owner_id, product_id).aggregate(total=Sum("quantity"))["total"] or 0
+    )
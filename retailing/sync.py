@@ -0,0 +1,231 @@
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from rest_framework.exceptions import ValidationError
+
+from retailing.models import Product, Supplier, SyncChange, Warehouse
+
+# Инкрементальная синхронизация каталога и остатков. Курсор - пара (txid, id) последнего выданного изменения.
+# В PostgreSQL выдаются только изменения транзакций с номером меньше xmin текущего снимка: все такие транзакции
+# уже завершены, и изменение с меньшим курсором после выдачи страницы появиться не может.
+#
+# Остаток выдается так же, как в WarehouseViewSet: основная строка (секция 0) с суммой секций. Изменение
+# любой секции записывается в журнал как изменение основной строки.
+#
+# Журнал хранится SYNC_RETENTION_DAYS дней (команда prune_sync). Последнее удаленное изменение остается
+# в журнале меткой границы очистки (operation = "prune"): клиент с курсором до метки пропустил бы удаленные
+# изменения, поэтому получает ответ resync - загрузить данные заново списками и продолжить с выданного курсора.
+
+SYNC_MODELS = {
+    "supplier": Supplier,
+    "product": Product,
+    "warehouse": Warehouse,
+}
+
+
+def get_sync_page_size():
+    return getattr(settings, "SYNC_PAGE_SIZE", 500)
+
+
+def get_sync_retention_days():
+    return getattr(settings, "SYNC_RETENTION_DAYS", 30)
+
+
+def txid_value():
+    """Номер текущей транзакции вычисляется в самом INSERT журнала, без отдельного запроса."""
+    if connection.vendor != "postgresql":
+        return 0
+    return RawSQL("txid_current()", [])
+
+
+def snapshot_xmin():
+    """Номер самой старой незавершенной транзакции. Для других СУБД ограничение не применяется."""
+    if connection.vendor != "postgresql":
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT txid_snapshot_xmin(txid_current_snapshot())")
+        return cursor.fetchone()[0]
+
+
+def change_targets(instances, operation):
+    """Записи журнала {(модель, id объекта): (id собственника, действие)}. Изменение и удаление секции остатка
+    (shard > 0) записываются как изменение основной строки, id основных строк читаются одним запросом."""
+    sharded = [
+        instance
+        for instance in instances
+        if instance._meta.model_name == "warehouse" and instance.shard
+    ]
+    main_ids = {}
+    if sharded:
+        rows = Warehouse.objects.filter(
+            shard=0,
+            owner_id__in={instance.owner_id for instance in sharded},
+            product_id__in={instance.product_id for instance in sharded},
+        ).values_list("owner", "product", "id")
+        main_ids = {(owner_id, product_id): pk for owner_id, product_id, pk in rows}
+
+    targets = {}
+    for instance in instances:
+        model = instance._meta.model_name
+        if model != "warehouse":
+            targets[(model, instance.pk)] = (None, operation)
+        elif not instance.shard:
+            targets[(model, instance.pk)] = (instance.owner_id, operation)
+        else:
+            main_id = main_ids.get((instance.owner_id, instance.product_id))
+            if main_id is not None:
+                targets[(model, main_id)] = (instance.owner_id, "upsert")
+    return targets
+
+
+def record_change(instance, operation):
+    record_changes([instance], operation)
+
+
+def record_changes(instances, operation):
+    """Пакетная запись изменений объектов одним INSERT (сохранение через bulk_create/bulk_update сигналов
+    не вызывает)."""
+    if not instances:
+        return
+    SyncChange.objects.bulk_create(
+        [
+            SyncChange(
+                model=model,
+                object_id=object_id,
+                owner_id=owner_id,
+                operation=target_operation,
+                txid=txid_value(),
+            )
+            for (model, object_id), (owner_id, target_operation) in change_targets(
+                instances, operation
+            ).items()
+        ]
+    )
+
+
+def prune_changes(before):
+    """Удаляем изменения, записанные раньше before. Последнее из них становится меткой границы очистки.
+    Возвращает количество удаленных записей."""
+    last = (
+        SyncChange.objects.filter(created_at__lt=before)
+        .order_by("-txid", "-id")
+        .first()
+    )
+    if last is None:
+        return 0
+    with transaction.atomic():
+        SyncChange.objects.filter(pk=last.pk).update(
+            model="", object_id=0, owner_id=None, operation="prune"
+        )
+        deleted, _ = SyncChange.objects.filter(
+            Q(txid__lt=last.txid) | Q(txid=last.txid, id__lt=last.id)
+        ).delete()
+    return deleted
+
+
+def parse_cursor(cursor):
+    if not cursor:
+        return 0, 0
+    try:
+        txid, change_id = (int(item) for item in cursor.split(":"))
+    except ValueError:
+        raise ValidationError("Некорректный курсор синхронизации !")
+    return txid, change_id
+
+
+def format_cursor(txid, change_id):
+    return f"{txid}:{change_id}"
+
+
+def visible_changes():
+    """Журнал без изменений незавершенных транзакций."""
+    changes = SyncChange.objects.all()
+    xmin = snapshot_xmin()
+    if xmin is not None:
+        changes = changes.filter(txid__lt=xmin)
+    return changes
+
+
+def get_changes(txid, change_id, owner_id, limit):
+    """Страница журнала после курсора. Склады выдаются только собственнику."""
+    changes = (
+        visible_changes()
+        .filter(Q(txid__gt=txid) | Q(txid=txid, id__gt=change_id))
+        .filter(Q(model__in=("supplier", "product")) | Q(owner_id=owner_id))
+    )
+    return list(changes.order_by("txid", "id")[: limit + 1])
+
+
+def is_pruned(txid, change_id):
+    """Курсор раньше метки границы очистки: часть изменений после него удалена. Метка - первая запись журнала,
+    она читается по индексу (txid, id)."""
+    first = SyncChange.objects.order_by("txid", "id").first()
+    return (
+        first is not None
+        and first.operation == "prune"
+        and (txid, change_id) < (first.txid, first.id)
+    )
+
+
+def resync_response():
+    """Ответ клиенту, отставшему больше срока хранения журнала: данные загружаются заново списками, затем
+    синхронизация продолжается с выданного курсора (последнее зафиксированное изменение)."""
+    head = visible_changes().order_by("-txid", "-id").first()
+    return {
+        "changes": [],
+        "cursor": format_cursor(head.txid, head.id) if head is not None else "",
+        "has_more": False,
+        "resync": True,
+    }
+
+
+def sync_queryset(model):
+    if model == "warehouse":
+        # как в WarehouseViewSet: основная строка с суммой секций
+        return Warehouse.objects.with_totals()
+    return SYNC_MODELS[model].objects.all()
+
+
+def build_sync_response(cursor, owner_id, limit, serializer_classes, context):
+    """Изменения страницы схлопываются до последнего по каждому объекту. Текущие версии объектов читаются одним
+    запросом на модель, удаленные к моменту запроса объекты выдаются как tombstone."""
+    txid, change_id = parse_cursor(cursor)
+    if is_pruned(txid, change_id):
+        return resync_response()
+    changes = get_changes(txid, change_id, owner_id, limit)
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+
+    latest = {}
+    for change in changes:
+        key = (change.model, change.object_id)
+        latest.pop(key, None)
+        latest[key] = change
+
+    ids_by_model = {}
+    for model, object_id in latest:
+        ids_by_model.setdefault(model, []).append(object_id)
+    objects = {
+        model: sync_queryset(model).in_bulk(ids) for model, ids in ids_by_model.items()
+    }
+
+    result = []
+    for (model, object_id), change in latest.items():
+        obj = objects[model].get(object_id)
+        if change.operation == "delete" or obj is None:
+            result.append({"model": model, "id": object_id, "op": "delete"})
+        else:
+            data = serializer_classes[model](obj, context=context).data
+            result.append(
+                {"model": model, "id": object_id, "op": "upsert", "data": data}
+            )
+
+    if changes:
+        cursor = format_cursor(changes[-1].txid, changes[-1].id)
+    return {
+        "changes": result,
+        "cursor": cursor or "",
+        "has_more": has_more,
+        "resync": False,
+    }
@@ -4,12 +4,57 @@
 # производная и динамическая информация при выполнении функций API над моделью операции (Order).
 # Endpoint API для них создавались только для просмотра.
 
+import gzip
+import json
+import os
+import tempfile
+import threading
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from rest_framework import status
+from django.utils import timezone as django_timezone
+from PIL import Image
+from rest_framework import serializers, status
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase
 
-from retailing.models import (Category, Country, Order, Payable, Product,
-                              Supplier, Warehouse)
+from retailing.admission import get_limiters, reset_limiters
+from retailing.archive import archive_payables
+from retailing.events import event_stream
+from retailing.images import process_image
+from retailing.imports import read_lines, run_job
+from retailing.inventory import stock_as_of, take_snapshots
+from retailing.leaderboards import (SpaceSaving, flush_views,
+                                    refresh_leaderboards)
+from retailing.middleware import CompressionMiddleware
+from retailing.models import (Category, Country, HotStock, LastPrice, Order,
+                              OrderImportJob, OrderImportResult, OutboxMessage,
+                              Payable, PayableArchive, Product, StreamEvent,
+                              Supplier, SyncChange, Warehouse)
+from retailing.orders import add_payable, post_document
+from retailing.outbox import (claim_batch, dispatch_batch, dispatch_pending,
+                              notify_suppliers)
+from retailing.partitions import add_months, partition_name
+from retailing.renderers import ORJSONParser, ORJSONRenderer
+from retailing.schema import build_schema, schema_store
+from retailing.stock import (add_stock, add_stock_many, rebalance_all,
+                             take_stock, total_stock)
+from retailing.valuation import np, value_stock
+from retailing.views import serve_image_variant
 from users.models import Users
 
 
@@ -176,3 +221,1347 @@ class OrderTestCaseAddition(APITestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(Order.objects.get(pk=1).owner_id, self.user.supplier_id)
+
+    def test_order_list_filter_totals(self):
+        url = reverse("retailing:order_create")
+        for quantity in (5, 3):
+            data = {
+                "supplier": self.supplier.pk,
+                "product": self.product.pk,
+                "operation": "addition",
+                "quantity": quantity,
+                "price": 100.00,
+            }
+            self.client.post(url, data)
+
+        url = reverse("retailing:order_list")
+        response = self.client.get(
+            url,
+            {
+                "operation": "addition",
+                "created_at_after": date.today().isoformat(),
+                "page_size": 1,
+            },
+        )
+        data = response.json()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(data["results"]), 1)
+        self.assertEqual(data["totals"]["quantity"], 8)
+        self.assertEqual(data["totals"]["amount"], "800.00")
+
+        response = self.client.get(url, {"operation": "buying"})
+        self.assertEqual(response.json()["totals"]["quantity"], 0)
+
+    def test_order_list_cursor(self):
+        url = reverse("retailing:order_create")
+        for quantity in (5, 3, 2):
+            data = {
+                "supplier": self.supplier.pk,
+                "product": self.product.pk,
+                "operation": "addition",
+                "quantity": quantity,
+                "price": 100.00,
+            }
+            self.client.post(url, data)
+
+        # операции одного дня проходятся по одной без пропусков и повторов
+        ids = []
+        url = reverse("retailing:order_list") + "?page_size=1"
+        while url:
+            data = self.client.get(url).json()
+            ids += [order["id"] for order in data["results"]]
+            url = data["next"]
+        self.assertEqual(
+            ids, list(Order.objects.order_by("-id").values_list("id", flat=True))
+        )
+        self.assertEqual(len(ids), 3)
+
+
+class CatalogCacheTestCase(APITestCase):
+    """Тестирование кеша ответов публичных справочников."""
+
+    def setUp(self):
+        cache.clear()
+        self.country = Country.objects.create(code="US", name="США")
+        self.supplier = Supplier.objects.create(
+            name="Sony Corporation",
+            type="vendor",
+            email="info@sony.us",
+            country_id=self.country.pk,
+            city="New York",
+            street="Manhattan",
+            house_number=4,
+        )
+
+    def test_supplier_list_cached(self):
+        url = reverse("retailing:supplier_list")
+        self.client.get(url, {"page": 1})
+        with self.assertNumQueries(0):
+            response = self.client.get(url, {"page": 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["count"], 1)
+
+    def test_supplier_cache_invalidation(self):
+        url = reverse("retailing:supplier_retrieve", args=(self.supplier.pk,))
+        self.client.get(url)
+        self.client.get(reverse("retailing:supplier_list"))
+        self.supplier.city = "Tokyo"
+        self.supplier.save()
+
+        response = self.client.get(url)
+        self.assertEqual(response.json().get("city"), "Tokyo")
+        response = self.client.get(reverse("retailing:supplier_list"))
+        self.assertEqual(response.json()["results"][0]["city"], "Tokyo")
+
+    def test_supplier_filter_and_facets(self):
+        country = Country.objects.create(code="JP", name="Япония")
+        Supplier.objects.create(
+            name="Panasonic",
+            type="distributor",
+            email="info@panasonic.jp",
+            country_id=country.pk,
+            city="Osaka",
+            street="Kadoma",
+            house_number=1,
+        )
+        url = reverse("retailing:supplier_list")
+        data = self.client.get(url, {"country_code": "us"}).json()
+        self.assertEqual(
+            [item["name"] for item in data["results"]], ["Sony Corporation"]
+        )
+
+        data = self.client.get(url, {"facets": "true"}).json()
+        self.assertEqual(
+            data["facets"]["type"],
+            [{"type": "distributor", "count": 1}, {"type": "vendor", "count": 1}],
+        )
+        self.assertEqual(len(data["facets"]["country"]), 2)
+
+    def test_supplier_fragment_cache(self):
+        url = reverse("retailing:supplier_list")
+        self.client.get(url)
+        with mock.patch.object(
+            serializers.Serializer, "to_representation"
+        ) as to_representation:
+            response = self.client.get(url, {"page_size": 10})
+        to_representation.assert_not_called()
+        self.assertEqual(response.json()["results"][0]["name"], "Sony Corporation")
+
+        version = self.supplier.version
+        self.supplier.save()
+        self.assertEqual(self.supplier.version, version + 1)
+
+        # версия увеличивается в БД, а не по значению, прочитанному каждым экземпляром
+        other = Supplier.objects.get(pk=self.supplier.pk)
+        self.supplier.save(update_fields=["name"])
+        other.save(update_fields=["name"])
+        self.assertEqual(other.version, version + 3)
+        self.assertEqual(Supplier.objects.get(pk=self.supplier.pk).version, version + 3)
+
+
+class ORJSONRendererTestCase(APITestCase):
+    """Ответ ORJSONRenderer должен совпадать с JSONRenderer."""
+
+    def test_render_same_as_json_renderer(self):
+        data = {
+            "price": Decimal("45000.50"),
+            "created_at": datetime(
+                2024, 10, 1, 12, 30, 15, 123456, tzinfo=timezone.utc
+            ),
+            "release_date": date(2024, 10, 1),
+            "name": "Телевизор Sony",
+            "results": [{"id": 1}, {"id": 2}],
+        }
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_parse(self):
+        data = ORJSONParser().parse(BytesIO('{"name": "Sony", "price": 1.5}'.encode()))
+        self.assertEqual(data, {"name": "Sony", "price": 1.5})
+
+
+class CompressionMiddlewareTestCase(APITestCase):
+    """Тестирование согласованного сжатия ответов."""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.content = b'{"results": [' + b'{"name": "Sony Bravia"},' * 200 + b"{}]}"
+
+    def test_gzip_response(self):
+        middleware = CompressionMiddleware(
+            lambda request: HttpResponse(self.content, content_type="application/json")
+        )
+        request = self.factory.get(
+            "/product/", HTTP_ACCEPT_ENCODING="gzip;q=1.0, br;q=0"
+        )
+        response = middleware(request)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.content), self.content)
+        self.assertIn("Accept-Encoding", response["Vary"])
+
+    def test_streaming_response(self):
+        chunks = [self.content[i : i + 100] for i in range(0, len(self.content), 100)]
+        middleware = CompressionMiddleware(
+            lambda request: StreamingHttpResponse(chunks, content_type="text/csv")
+        )
+        request = self.factory.get("/export/", HTTP_ACCEPT_ENCODING="gzip")
+        response = middleware(request)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(
+            gzip.decompress(b"".join(response.streaming_content)), self.content
+        )
+
+    def test_small_response_not_compressed(self):
+        middleware = CompressionMiddleware(
+            lambda request: HttpResponse(b"{}", content_type="application/json")
+        )
+        request = self.factory.get("/product/", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertFalse(middleware(request).has_header("Content-Encoding"))
+
+
+class BatchRetrieveTestCase(APITestCase):
+    """Тестирование пакетного получения поставщиков и продуктов по списку id."""
+
+    def setUp(self):
+        cache.clear()
+        self.country = Country.objects.create(code="US", name="США")
+        self.category = Category.objects.create(name="Телевизоры")
+        self.supplier = Supplier.objects.create(
+            name="Sony Corporation",
+            type="vendor",
+            email="info@sony.us",
+            country_id=self.country.pk,
+            city="New York",
+            street="Manhattan",
+            house_number=4,
+        )
+        self.product = Product.objects.create(
+            name="Sony",
+            model="Bravia",
+            category_id=self.category.pk,
+            supplier_id=self.supplier.pk,
+            release_date="2024-10-01",
+        )
+
+    def test_supplier_batch(self):
+        url = reverse("retailing:supplier_batch")
+        missing_id = self.supplier.pk + 100
+        response = self.client.get(url, {"ids": f"{self.supplier.pk},{missing_id}"})
+        data = response.json()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(data["results"][0]["name"], "Sony Corporation")
+        self.assertEqual(data["errors"], [{"id": missing_id, "error": "not_found"}])
+
+    def test_product_batch_post(self):
+        url = reverse("retailing:product-batch")
+        response = self.client.post(url, {"ids": [self.product.pk]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.json()["results"]), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.view_counter, 0)
+
+
+class SyncTestCase(APITestCase):
+    """Тестирование инкрементальной синхронизации каталога и остатков."""
+
+    def setUp(self):
+        self.user = Users.objects.create(
+            username="Лукин В.М.",
+            email="foxship@yandex.ru",
+            password="123qwe",
+            is_active=True,
+        )
+        self.country = Country.objects.create(code="US", name="США")
+        self.category = Category.objects.create(name="Телевизоры")
+        self.supplier = Supplier.objects.create(
+            name="Sony Corporation",
+            type="vendor",
+            email="info@sony.us",
+            country_id=self.country.pk,
+            city="New York",
+            street="Manhattan",
+            house_number=4,
+            user_id=self.user.pk,
+        )
+        self.user.supplier_id = self.supplier.pk
+        self.user.supplier_type = self.supplier.type
+        self.product = Product.objects.create(
+            name="Sony",
+            model="Bravia",
+            category_id=self.category.pk,
+            supplier_id=self.supplier.pk,
+            release_date="2024-10-01",
+        )
+        self.warehouse = Warehouse.objects.create(
+            owner=self.supplier, product=self.product, quantity=5
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def test_sync_upserts_and_tombstones(self):
+        url = reverse("retailing:sync")
+        data = self.client.get(url).json()
+        self.assertEqual(
+            [(change["model"], change["op"]) for change in data["changes"]],
+            [("supplier", "upsert"), ("product", "upsert"), ("warehouse", "upsert")],
+        )
+        self.assertEqual(data["changes"][2]["data"]["quantity"], 5)
+
+        warehouse_id = self.warehouse.pk
+        self.warehouse.delete()
+        data = self.client.get(url, {"cursor": data["cursor"]}).json()
+        self.assertEqual(
+            data["changes"],
+            [{"model": "warehouse", "id": warehouse_id, "op": "delete"}],
+        )
+        self.assertFalse(data["has_more"])
+
+    def test_sync_sharded_stock(self):
+        url = reverse("retailing:sync")
+        cursor = self.client.get(url).json()["cursor"]
+        # изменение секции выдается как основная строка с суммой секций
+        Warehouse.objects.create(
+            owner=self.supplier, product=self.product, shard=1, quantity=3
+        )
+        data = self.client.get(url, {"cursor": cursor}).json()
+        self.assertEqual(
+            [(change["id"], change["op"]) for change in data["changes"]],
+            [(self.warehouse.pk, "upsert")],
+        )
+        self.assertEqual(data["changes"][0]["data"]["quantity"], 8)
+        self.assertEqual(data["changes"][0]["data"]["shard"], 0)
+
+    def test_sync_resync_after_prune(self):
+        url = reverse("retailing:sync")
+        cursor = self.client.get(url).json()["cursor"]
+        self.product.name = "Sony Bravia"
+        self.product.save()
+        call_command("prune_sync", "--days", "-1", stdout=StringIO())
+
+        # изменения после курсора удалены: клиент загружает данные заново
+        for stale in ("", cursor):
+            data = self.client.get(url, {"cursor": stale}).json()
+            self.assertTrue(data["resync"])
+            self.assertEqual(data["changes"], [])
+
+        data = self.client.get(url, {"cursor": data["cursor"]}).json()
+        self.assertEqual((data["changes"], data["resync"]), ([], False))
+        self.supplier.name = "Sony"
+        self.supplier.save()
+        data = self.client.get(url, {"cursor": data["cursor"]}).json()
+        self.assertEqual(
+            [(change["model"], change["op"]) for change in data["changes"]],
+            [("supplier", "upsert")],
+        )
+
+
+class EventStreamTestCase(APITestCase):
+    """Тестирование потока событий поставщика."""
+
+    async def test_resume_from_last_event_id(self):
+        first = await StreamEvent.objects.acreate(
+            supplier_id=1, type="stock_changed", data={"product": 1, "quantity": 5}
+        )
+        second = await StreamEvent.objects.acreate(
+            supplier_id=1, type="order_posted", data={"order": 1, "quantity": 2}
+        )
+        await StreamEvent.objects.acreate(
+            supplier_id=2, type="order_posted", data={"order": 2, "quantity": 1}
+        )
+        stream = event_stream(1, first.id)
+        self.assertEqual(await anext(stream), "retry: 3000\n\n")
+        self.assertEqual(
+            await anext(stream),
+            f'id: {second.id}\nevent: order_posted\ndata: {{"order": 1, "quantity": 2}}\n\n',
+        )
+        await stream.aclose()
+
+    def test_requires_asgi(self):
+        supplier = Supplier.objects.create(
+            name="Best Buy",
+            type="distributor",
+            email="info@bestbuy.us",
+            country=Country.objects.create(code="US", name="США"),
+            city="New York",
+            street="Manhattan",
+            house_number=4,
+        )
+        user = Users.objects.create(
+            email="foxship@yandex.ru", is_active=True, supplier=supplier
+        )
+        self.client.force_authenticate(user=user)
+        response = self.client.get(reverse("retailing:events"))
+        self.assertEqual(response.status_code, status.HTTP_501_NOT_IMPLEMENTED)
+
+
+class ProductOffersTestCase(APITestCase):
+    """Тестирование предложений товара (наличие у поставщиков и последняя цена)."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = Users.objects.create(
+            email="foxship@yandex.ru", password="123qwe", is_active=True
+        )
+        self.client.force_authenticate(user=self.user)
+        self.country = Country.objects.create(code="US", name="США")
+        self.category = Category.objects.create(name="Телевизоры")
+        self.vendor = Supplier.objects.create(
+            name="Sony Corporation",
+            type="vendor",
+            email="info@sony.us",
+            country_id=self.country.pk,
+            city="New York",
+            street="Manhattan",
+            house_number=4,
+        )
+        self.distributor = Supplier.objects.create(
+            name="Best Buy",
+            type="distributor",
+            email="info@bestbuy.us",
+            country_id=self.country.pk,
+            city="Chicago",
+            street="Main",
+            house_number=1,
+        )
+        self.product = Product.objects.create(
+            name="Sony",
+            model="Bravia",
+            category_id=self.category.pk,
+            supplier_id=self.vendor.pk,
+            release_date="2024-10-01",
+        )
+        Warehouse.objects.create(owner=self.vendor, product=self.product, quantity=0)
+        Warehouse.objects.create(
+            owner=self.distributor, product=self.product, quantity=3
+        )
+        LastPrice.objects.create(
+            supplier=self.distributor,
+            product=self.product,
+            price=Decimal("52000.00"),
+            sold_at=date(2024, 10, 2),
+        )
+
+    def test_product_offers(self):
+        url = reverse("retailing:product-offers", args=(self.product.pk,))
+        response = self.client.get(url, {"type": "distributor"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.json()["results"]
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]["supplier"], self.distributor.pk)
+        self.assertEqual(results[0]["last_price"], "52000.00")
+
+    def test_product_offers_sharded_stock(self):
+        # остаток вендора только во второй секции, основная строка пуста
+        Warehouse.objects.create(
+            owner=self.vendor, product=self.product, shard=1, quantity=2
+        )
+        url = reverse("retailing:product-offers", args=(self.product.pk,))
+        results = self.client.get(url).json()["results"]
+        self.assertEqual(
+            sorted(result["supplier"] for result in results),
+            [self.vendor.pk, self.distributor.pk],
+        )
+
+    def test_product_retrieve_queries(self):
+        url = reverse("retailing:product-detail", args=(self.product.pk,))
+        self.addCleanup(flush_views)
+        # товар читается один раз, затем увеличение счетчика просмотров (версия при этом не меняется)
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.json()["view_counter"], 1)
+        # закешированный фрагмент остается действительным, счетчик берется из объекта
+        response = self.client.get(url)
+        self.assertEqual(response.json()["view_counter"], 2)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.version, 0)
+
+
+class LeaderboardTestCase(APITestCase):
+    """Тестирование рейтингов товаров."""
+
+    def setUp(self):
+        self.country = Country.objects.create(code="US", name="США")
+        self.category = Category.objects.create(name="Телевизоры")
+        self.vendor = Supplier.objects.create(
+            name="Sony Corporation",
+            type="vendor",
+            email="info@sony.us",
+            country_id=self.country.pk,
+            city="New York",
+            street="Manhattan",
+            house_number=4,
+        )
+        self.products = [
+            Product.objects.create(
+                name=f"Sony {number}",
+                category_id=self.category.pk,
+                supplier_id=self.vendor.pk,
+                release_date="2024-10-01",
+            )
+            for number in range(3)
+        ]
+        for product, quantity in zip(self.products, (2, 7, 4)):
+            Order.objects.create(
+                supplier=self.vendor,
+                product=product,
+                operation="buying",
+                quantity=quantity,
+                price=Decimal("100.00"),
+            )
+
+    def test_selling_leaderboard(self):
+        refresh_leaderboards()
+        url = reverse("retailing:product-leaderboard")
+        response = self.client.get(
+            url,
+            {
+                "kind": "selling",
+                "scope": "category",
+                "scope_id": self.category.pk,
+                "window": 7,
+            },
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [row["product"] for row in response.json()],
+            [self.products[1].pk, self.products[2].pk, self.products[0].pk],
+        )
+
+    def test_space_saving(self):
+        counter = SpaceSaving(2)
+        for item in (1, 1, 1, 2, 3):
+            counter.add(item)
+        self.assertEqual(counter.counts, {1: 3, 3: 2})
+
+
+class OrderPartitionsTestCase(APITestCase):
+    """Тестирование вспомогательных функций секционирования журнала операций."""
+
+    def test_partition_months(self):
+        self.assertEqual(add_months(date(2024, 11, 1), 3), date(2025, 2, 1))
+        self.assertEqual(add_months(date(2024, 1, 1), -24), date(2022, 1, 1))
+        self.assertEqual(partition_name(date(2024, 3, 1)), "retailing_order_p2024_03")
+
+
+class PayableArchiveTestCase(APITestCase):
+    """Тестирование переноса списанных задолженностей в архив."""
+
+    def setUp(self):
+        self.user = Users.objects.create(
+            username="Лукин В.М.",
+            email="foxship@yandex.ru",
+            password="123qwe",
+            is_active="True",
+        )
+        self.country = Country.objects.create(code="US", name="США")
+        self.vendor = Supplier.objects.create(
+            name="Sony Corporation",
+            type="vendor",
+            email="info@sony.us",
+            country_id=self.country.pk,
+        )
+        self.supplier = Supplier.objects.create(
+            name="Retail",
+            type="retail",
+            email="info@retail.us",
+            country_id=self.country.pk,
+        )
+        self.user.supplier_id = self.supplier.pk
+        self.user.supplier_type = self.supplier.type
+        self.user.save()
+        self.client.force_authenticate(user=self.user)
+        old = date.today() - timedelta(days=100)
+        for is_paid, paid_date in ((True, old), (True, date.today()), (False, None)):
+            Payable.objects.create(
+                owner=self.supplier,
+                supplier=self.vendor,
+                amount=0 if is_paid else 100,
+                created_at=old,
+                is_paid=is_paid,
+                paid_date=paid_date,
+            )
+
+    def test_archive_payables(self):
+        self.assertEqual(archive_payables(days=30, batch_size=1), 1)
+        self.assertEqual(Payable.objects.count(), 2)
+        self.assertEqual(PayableArchive.objects.count(), 1)
+
+        response = self.client.get(reverse("retailing:payable-archive"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["count"], 1)
+
+        response = self.client.get(reverse("retailing:payable-list"))
+        self.assertEqual(response.json()["count"], 1)
+
+    def test_new_debt_after_payment(self):
+        Payable.objects.filter(is_paid=False).delete()
+        add_payable(self.supplier, self.vendor, Decimal("50.00"))
+        self.assertEqual(archive_payables(days=30), 1)
+        self.assertEqual(archive_payables(days=30), 0)
+        payable = Payable.objects.get(is_paid=False)
+        self.assertEqual(payable.amount, Decimal("50.00"))
+        self.assertFalse(PayableArchive.objects.filter(pk=payable.pk).exists())
+        self.assertEqual(Payable.objects.count(), 2)
+
+
+class StockAsOfTestCase(APITestCase):
+    """Тестирование остатков на дату по снимкам и журналу операций."""
+
+    def setUp(self):
+        self.user = Users.objects.create(
+            username="Лукин В.М.",
+            email="foxship@yandex.ru",
+            password="123qwe",
+            is_active="True",
+        )
+        self.country = Country.objects.create(code="US", name="США")
+        self.category = Category.objects.create(name="Телевизоры")
+        self.vendor = Supplier.objects.create(
+            name="Sony Corporation",
+            type="vendor",
+            email="info@sony.us",
+            country_id=self.country.pk,
+        )
+        self.retail = Supplier.objects.create(
+            name="Retail",
+            type="retail",
+            email="info@retail.us",
+            country_id=self.country.pk,
+        )
+        self.user.supplier_id = self.vendor.pk
+        self.user.supplier_type = self.vendor.type
+        self.user.save()
+        self.client.force_authenticate(user=self.user)
+        self.product = Product.objects.create(
+            name="Sony",
+            model="Bravia",
+            category_id=self.category.pk,
+            supplier_id=self.vendor.pk,
+            release_date="2024-10-01",
+        )
+        self.today = date.today()
+        for days, owner, operation, quantity in (
+            (5, self.vendor, "addition", 10),
+            (3, self.retail, "buying", 4),
+            (1, self.vendor, "addition", 5),
+        ):
+            Order.objects.create(
+                owner=owner,
+                supplier=self.vendor,
+                product=self.product,
+                operation=operation,
+                quantity=quantity,
+                price=100,
+                created_at=self.today - timedelta(days=days),
+            )
+        Warehouse.objects.create(owner=self.vendor, product=self.product, quantity=11)
+        Warehouse.objects.create(owner=self.retail, product=self.product, quantity=4)
+
+    def test_stock_as_of(self):
+        day = self.today - timedelta(days=4)
+        self.assertEqual(stock_as_of(self.vendor.pk, day), {self.product.pk: 10})
+
+        self.assertEqual(take_snapshots(day), 2)
+        Warehouse.objects.all().update(quantity=0)
+        self.assertEqual(stock_as_of(self.vendor.pk, day), {self.product.pk: 10})
+        self.assertEqual(
+            stock_as_of(self.vendor.pk, self.today - timedelta(days=2)),
+            {self.product.pk: 6},
+        )
+        self.assertEqual(stock_as_of(self.retail.pk, day), {})
+
+    def test_stock_as_of_api(self):
+        url = reverse("retailing:warehouse-as-of")
+        response = self.client.get(url, {"date": self.today.isoformat()})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.json()["results"], [{"product": self.product.pk, "quantity": 11}]
+        )
+
+        response = self.client.get(url, {"date": "01.03.2024"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_stock_as_of_before_archive(self):
+        start = self.today - timedelta(days=3)
+        take_snapshots(self.today - timedelta(days=5))
+        Warehouse.objects.filter(owner=self.vendor).update(quantity=20)
+        with mock.patch("retailing.inventory.history_start", return_value=start):
+            # операции до start выгружены в архив
+            with self.assertRaises(ValidationError):
+                stock_as_of(self.vendor.pk, self.today - timedelta(days=5))
+            # снимок раньше границы не используется: остаток считается от текущего
+            self.assertEqual(
+                stock_as_of(self.vendor.pk, start - timedelta(days=1)),
+                {self.product.pk: 19},
+            )
+            response = self.client.get(
+                reverse("retailing:warehouse-as-of"),
+                {"date": (self.today - timedelta(days=5)).isoformat()},
+            )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class StockValuationTestCase(APITestCase):
+    """Тестирование стоимостной оценки остатков."""
+
+    def setUp(self):
+        self.user = Users.objects.create(
+            username="Лукин В.М.",
+            email="foxship@yandex.ru",
+            password="123qwe",
+            is_active="True",
+        )
+        self.country = Country.objects.create(code="US", name="США")
+        self.category = Category.objects.create(name="Телевизоры")
+        self.vendor = Supplier.objects.create(
+            name="Sony Corporation",
+            type="vendor",
+            email="info@sony.us",
+            country_id=self.country.pk,
+        )
+        self.user.supplier_id = self.vendor.pk
+        self.user.supplier_type = self.vendor.type
+        self.user.save()
+        self.client.force_authenticate(user=self.user)
+        self.products = [
+            Product.objects.create(
+                name="Sony",
+                model=model,
+                category_id=self.category.pk,
+                supplier_id=self.vendor.pk,
+                release_date="2024-10-01",
+            )
+            for model in ("Bravia", "Trinitron")
+        ]
+        for days, product, quantity, price in (
+            (3, 0, 10, 100),
+            (2, 0, 10, 200),
+            (1, 0, 5, 400),
+            (1, 1, 2, 50),
+        ):
+            Order.objects.create(
+                owner=self.vendor,
+                supplier=self.vendor,
+                product=self.products[product],
+                operation="addition",
+                quantity=quantity,
+                price=price,
+                created_at=date.today() - timedelta(days=days),
+            )
+        Warehouse.objects.create(
+            owner=self.vendor, product=self.products[0], quantity=12
+        )
+        Warehouse.objects.create(
+            owner=self.vendor, product=self.products[1], quantity=2
+        )
+
+    def test_valuation(self):
+        response = self.client.get(reverse("retailing:warehouse-valuation"))
+        data = response.json()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            data["results"][0],
+            {
+                "product": self.products[0].pk,
+                "quantity": 12,
+                "average_cost": "200.00",
+                "average_value": "2400.00",
+                "fifo_value": "3400.00",
+            },
+        )
+        self.assertEqual(data["results"][1]["fifo_value"], "100.00")
+        self.assertEqual(data["totals"]["fifo_value"], "3500.00")
+
+    @skipUnless(np, "требуется пакет numpy")
+    def test_valuation_without_numpy(self):
+        Order.objects.create(
+            owner=self.vendor,
+            supplier=self.vendor,
+            product=self.products[1],
+            operation="addition",
+            quantity=3,
+            price=Decimal("0.10"),
+        )
+        Warehouse.objects.filter(product=self.products[1]).update(quantity=4)
+        results = value_stock(self.vendor.pk)
+        with mock.patch("retailing.valuation.np", None):
+            self.assertEqual(value_stock(self.vendor.pk), results)
+        self.assertEqual(results[1]["average_cost"], "20.06")
+        self.assertEqual(results[1]["fifo_value"], "50.30")
+
+
+class ShardedStockTestCase(APITestCase):
+    """Тестирование секционированных остатков популярных товаров."""
+
+    def setUp(self):
+        self.user = Users.objects.create(
+            username="Лукин В.М.",
+            email="foxship@yandex.ru",
+            password="123qwe",
+            is_active="True",
+        )
+        self.country = Country.objects.create(code="US", name="США")
+        self.category = Category.objects.create(name="Телевизоры")
+        self.vendor = Supplier.objects.create(
+            name="Sony Corporation",
+            type="vendor",
+            email="info@sony.us",
+            country_id=self.country.pk,
+        )
+        self.user.supplier_id = self.vendor.pk
+        self.user.supplier_type = self.vendor.type
+        self.user.save()
+        self.client.force_authenticate(user=self.user)
+        self.product = Product.objects.create(
+            name="Sony",
+            model="Bravia",
+            category_id=self.category.pk,
+            supplier_id=self.vendor.pk,
+            release_date="2024-10-01",
+        )
+        add_stock(self.vendor, self.product, 10)
+        HotStock.objects.create(owner=self.vendor, product=self.product, shards=3)
+
+    def test_sharded_stock(self):
+        self.assertEqual(rebalance_all(), 1)
+        self.assertEqual(
+            list(Warehouse.objects.order_by("shard").values_list("shard", "quantity")),
+            [(0, 4), (1, 3), (2, 3)],
+        )
+
+        take_stock(self.vendor, self.product, 6)
+        add_stock(self.vendor, self.product, 1)
+        self.assertEqual(total_stock(self.vendor.pk, self.product.pk), 5)
+        with self.assertRaises(ValidationError):
+            take_stock(self.vendor, self.product, 6)
+
+        response = self.client.get(reverse("retailing:warehouse-list"))
+        self.assertEqual(response.json()["results"][0]["quantity"], 5)
+
+        HotStock.objects.all().delete()
+        rebalance_all()
+        self.assertEqual(
+            list(Warehouse.objects.values_list("shard", "quantity")), [(0, 5)]
+        )
+
+
+class TemporaryDirsMixin:
+    """Настройки-каталоги temporary_dirs на время тестов класса указывают на временные каталоги, которые
+    удаляются после тестов класса."""
+
+    temporary_dirs = ()
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        overrides = {}
+        for name in cls.temporary_dirs:
+            directory = tempfile.TemporaryDirectory()
+            cls.addClassCleanup(directory.cleanup)
+            overrides[name] = directory.name
+        settings_override = override_settings(**overrides)
+        settings_override.enable()
+        cls.addClassCleanup(settings_override.disable)
+
+
+class OrderImportTestCase(TemporaryDirsMixin, APITestCase):
+    """Тестирование пакетной загрузки операций."""
+
+    temporary_dirs = ("MEDIA_ROOT",)
+
+    def setUp(self):
+        self.user = Users.objects.create(
+            username="Лукин В.М.",
+            email="foxship@yandex.ru",
+            password="123qwe",
+            is_active="True",
+        )
+        self.country = Country.objects.create(code="US", name="США")
+        self.category = Category.objects.create(name="Телевизоры")
+        self.vendor = Supplier.objects.create(
+            name="Sony Corporation",
+            type="vendor",
+            email="info@sony.us",
+            country_id=self.country.pk,
+        )
+        self.distributor = Supplier.objects.create(
+            name="Distributor",
+            type="distributor",
+            email="info@distributor.us",
+            country_id=self.country.pk,
+        )
+        self.user.supplier_id = self.distributor.pk
+        self.user.supplier_type = self.distributor.type
+        self.user.save()
+        self.client.force_authenticate(user=self.user)
+        self.product = Product.objects.create(
+            name="Sony",
+            model="Bravia",
+            category_id=self.category.pk,
+            supplier_id=self.vendor.pk,
+            release_date="2024-10-01",
+        )
+        add_stock(self.vendor, self.product, 10)
+
+    def test_order_import(self):
+        line = {
+            "supplier": self.vendor.pk,
+            "product": self.product.pk,
+            "operation": "buying",
+            "price": 100,
+        }
+        content = "\n".join(
+            [
+                json.dumps({**line, "quantity": 4}),
+                json.dumps({**line, "quantity": 5}),
+                "",
+                json.dumps({**line, "quantity": 5}),
+                "{",
+            ]
+        )
+        file = SimpleUploadedFile("orders.jsonl", content.encode())
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(
+                reverse("retailing:order_import"), {"file": file}
+            )
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(len(callbacks), 1)
+
+        job_id = response.json()["id"]
+        with mock.patch("retailing.imports.close_old_connections"):
+            run_job(job_id)
+
+        response = self.client.get(
+            reverse("retailing:order_import_retrieve", args=(job_id,))
+        )
+        data = response.json()
+        self.assertEqual(data["status"], "done")
+        self.assertEqual((data["processed"], data["failed"]), (4, 2))
+        self.assertEqual(total_stock(self.vendor.pk, self.product.pk), 1)
+        self.assertEqual(total_stock(self.distributor.pk, self.product.pk), 9)
+        self.assertEqual(Payable.objects.get().amount, 900)
+
+        response = self.client.get(
+            reverse("retailing:order_import_results", args=(job_id,)),
+            {"errors": "true"},
+        )
+        self.assertEqual([row["line"] for row in response.json()["results"]], [4, 5])
+
+    def test_requeue_stale_job(self):
+        line = {
+            "supplier": self.vendor.pk,
+            "product": self.product.pk,
+            "operation": "buying",
+            "price": 100,
+        }
+        content = "\n".join(
+            json.dumps({**line, "quantity": quantity}) for quantity in (1, 2, 3)
+        )
+        stale = django_timezone.now() - timedelta(hours=1)
+        # процесс остановлен после первой порции из двух строк
+        job = OrderImportJob.objects.create(
+            user=self.user,
+            file=SimpleUploadedFile("orders.jsonl", content.encode()),
+            status="running",
+            total=3,
+            processed=2,
+            heartbeat_at=stale,
+        )
+        fresh = OrderImportJob.objects.create(
+            user=self.user,
+            file=SimpleUploadedFile("orders.jsonl", content.encode()),
+            status="running",
+            heartbeat_at=django_timezone.now(),
+        )
+        with mock.patch("retailing.imports.close_old_connections"):
+            call_command("requeue_imports", stdout=StringIO())
+            # задание, уже выполняемое другим потоком, повторно не обрабатывается
+            run_job(fresh.pk)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed), ("done", 3))
+        self.assertEqual(total_stock(self.distributor.pk, self.product.pk), 3)
+        fresh.refresh_from_db()
+        self.assertEqual(fresh.status, "running")
+        self.assertEqual(OrderImportResult.objects.filter(job=fresh).count(), 0)
+
+    def test_requeued_job_not_posted_twice(self):
+        line = {
+            "supplier": self.vendor.pk,
+            "product": self.product.pk,
+            "operation": "buying",
+            "price": 100,
+            "quantity": 2,
+        }
+        job = OrderImportJob.objects.create(
+            user=self.user,
+            file=SimpleUploadedFile("orders.jsonl", json.dumps(line).encode()),
+        )
+
+        def taken_over(file):
+            # медленное задание возвращено в очередь, и его порцию уже провел другой поток
+            OrderImportJob.objects.filter(pk=job.pk).update(processed=1)
+            return read_lines(file)
+
+        with mock.patch("retailing.imports.close_old_connections"), mock.patch(
+            "retailing.imports.read_lines", side_effect=taken_over
+        ):
+            run_job(job.pk)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed), ("running", 1))
+        self.assertEqual(total_stock(self.distributor.pk, self.product.pk), 0)
+        self.assertFalse(OrderImportResult.objects.exists())
+
+
+class OrderDocumentTestCase(APITestCase):
+    """Тестирование документов операций с несколькими товарами."""
+
+    def setUp(self):
+        self.user = Users.objects.create(
+            username="Лукин В.М.",
+            email="foxship@yandex.ru",
+            password="123qwe",
+            is_active="True",
+        )
+        self.country = Country.objects.create(code="US", name="США")
+        self.category = Category.objects.create(name="Телевизоры")
+        self.vendor = Supplier.objects.create(
+            name="Sony Corporation",
+            type="vendor",
+            email="info@sony.us",
+            country_id=self.country.pk,
+        )
+        self.distributor = Supplier.objects.create(
+            name="Distributor",
+            type="distributor",
+            email="info@distributor.us",
+            country_id=self.country.pk,
+        )
+        self.user.supplier_id = self.distributor.pk
+        self.user.supplier_type = self.distributor.type
+        self.user.save()
+        self.client.force_authenticate(user=self.user)
+        self.products = [
+            Product.objects.create(
+                name="Sony",
+                model=model,
+                category_id=self.category.pk,
+                supplier_id=self.vendor.pk,
+                release_date="2024-10-01",
+            )
+            for model in ("Bravia", "Trinitron")
+        ]
+        add_stock_many(self.vendor, {product: 10 for product in self.products})
+
+    def post_document(self, quantities):
+        data = {
+            "supplier": self.vendor.pk,
+            "operation": "buying",
+            "payment_amount": "500.00",
+            "lines": [
+                {"product": product.pk, "quantity": quantity, "price": "100.00"}
+                for product, quantity in zip(self.products, quantities)
+            ],
+        }
+        return self.client.post(
+            reverse("retailing:order_document_create"), data, format="json"
+        )
+
+    def test_document_create(self):
+        response = self.post_document((3, 4))
+        data = response.json()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(data["amount"], "700.00")
+        self.assertEqual(
+            [line["payment_amount"] for line in data["lines"]], ["300.00", "200.00"]
+        )
+        self.assertEqual(Order.objects.filter(document=data["id"]).count(), 2)
+        self.assertEqual(total_stock(self.vendor.pk, self.products[1].pk), 6)
+        self.assertEqual(total_stock(self.distributor.pk, self.products[0].pk), 3)
+        self.assertEqual(Payable.objects.get().amount, 200)
+
+        response = self.client.get(
+            reverse("retailing:order_document_retrieve", args=(data["id"],))
+        )
+        self.assertEqual(len(response.json()["lines"]), 2)
+
+    def test_document_insufficient_stock(self):
+        response = self.post_document((3, 11))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Order.objects.count(), 0)
+        self.assertEqual(total_stock(self.vendor.pk, self.products[0].pk), 10)
+
+    def document_lines(self, count):
+        products = [
+            Product.objects.create(
+                name="Sony",
+                model=f"KD-{number}",
+                category_id=self.category.pk,
+                supplier_id=self.vendor.pk,
+                release_date="2024-10-01",
+            )
+            for number in range(count)
+        ]
+        add_stock_many(self.vendor, {product: 10 for product in products})
+        return [(product, 2, Decimal("100.00")) for product in products]
+
+    def test_document_queries(self):
+        # оба проведения начинают с одинакового состояния:
+        # задолженность уже есть, компания пользователя загружена
+        Payable.objects.create(owner=self.distributor, supplier=self.vendor, amount=0)
+        self.user.supplier = self.distributor
+        lines = self.document_lines(2)
+        with CaptureQueriesContext(connection) as queries:
+            post_document(self.user, self.vendor, "buying", lines, Decimal("50.00"))
+        # количество запросов не зависит от количества строк документа
+        lines = self.document_lines(10)
+        with self.assertNumQueries(len(queries)):
+            post_document(self.user, self.vendor, "buying", lines, Decimal("50.00"))
+        self.assertEqual(total_stock(self.vendor.pk, lines[0][0].pk), 8)
+        self.assertEqual(total_stock(self.distributor.pk, lines[-1][0].pk), 2)
+        self.assertEqual(
+            SyncChange.objects.filter(
+                model="warehouse", owner_id=self.distributor.pk
+            ).count(),
+            12,
+        )
+
+    def test_document_negative_payment(self):
+        with self.assertRaises(ValidationError):
+            post_document(
+                self.user, self.vendor, "buying", self.document_lines(2), Decimal("-1")
+            )
+
+    def test_document_admission_control(self):
+        config = {"concurrency": 1, "queue": 0, "per_supplier": 1, "retry_after": 3}
+        reset_limiters()
+        self.addCleanup(reset_limiters)
+        with override_settings(ADMISSION_CONTROL={"order_write": config}):
+            limiter, supplier_limiter = get_limiters("order_write", config)
+            # параллельный запрос того же поставщика
+            supplier_limiter.acquire(self.distributor.pk, 1)
+            response = self.post_document((1, 1))
+            self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            self.assertEqual(response["Retry-After"], "3")
+            supplier_limiter.release(self.distributor.pk)
+
+            # все слоты области заняты запросами других поставщиков
+            limiter.acquire(0)
+            response = self.post_document((1, 1))
+            self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+            self.assertEqual(response["Retry-After"], "3")
+            self.assertEqual(supplier_limiter.active, {})
+            limiter.release()
+
+            response = self.post_document((1, 1))
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertEqual((limiter.active, supplier_limiter.active), (0, {}))
+            # чтение не ограничивается
+            limiter.acquire(0)
+            response = self.client.get(reverse("retailing:order_list"))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class TelegramStandInHandler(BaseHTTPRequestHandler):
+    """Локальная замена Telegram Bot API: принимает sendMessage, на чат "fail" отвечает ошибкой 500."""
+
+    requests = []
+
+    def do_POST(self):
+        data = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.requests.append((self.path, data))
+        self.send_response(500 if data["chat_id"] == "fail" else 200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(b'{"ok": true}')
+
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(
+    EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend",
+    TELEGRAM_BOT_TOKEN="token",
+    OUTBOX_RATE_LIMIT=0,
+)
+class OutboxTestCase(APITestCase):
+    """Тестирование исходящих уведомлений на локальных заменах SMTP (locmem) и Telegram (HTTP-сервер)."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = HTTPServer(("127.0.0.1", 0), TelegramStandInHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        TelegramStandInHandler.requests.clear()
+        self.country = Country.objects.create(code="US", name="США")
+        self.supplier = Supplier.objects.create(
+            name="Sony Corporation",
+            type="vendor",
+            email="info@sony.us",
+            country_id=self.country.pk,
+        )
+        for email, chat_id in (("one@sony.us", "1"), ("two@sony.us", "fail")):
+            Users.objects.create(
+                username=email,
+                email=email,
+                is_active=True,
+                supplier=self.supplier,
+                tg_chat_id=chat_id,
+            )
+
+    def test_dispatch(self):
+        notify_suppliers([self.supplier.pk], "Новая покупка", "Текст")
+        self.assertEqual(OutboxMessage.objects.count(), 4)
+
+        with self.settings(
+            TELEGRAM_API_URL=f"http://127.0.0.1:{self.server.server_port}"
+        ):
+            self.assertEqual(dispatch_pending(), 3)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(mail.outbox[0].subject, "Новая покупка")
+        self.assertEqual(
+            [path for path, _ in TelegramStandInHandler.requests],
+            ["/bottoken/sendMessage"] * 2,
+        )
+
+        failed = OutboxMessage.objects.get(status="pending")
+        self.assertEqual((failed.recipient, failed.attempts), ("fail", 1))
+        self.assertGreater(failed.next_attempt_at, django_timezone.now())
+
+    def test_expired_claim_is_not_sent(self):
+        notify_suppliers([self.supplier.pk], "Новая покупка", "Текст")
+        messages = claim_batch()
+        # захват первого уведомления истек, и его забрал другой процесс
+        taken = messages[0]
+        OutboxMessage.objects.filter(pk=taken.pk).update(
+            next_attempt_at=django_timezone.now() + timedelta(minutes=10)
+        )
+        with self.settings(
+            TELEGRAM_API_URL=f"http://127.0.0.1:{self.server.server_port}"
+        ):
+            self.assertEqual(dispatch_batch(messages), 2)
+        taken.refresh_from_db()
+        self.assertEqual((taken.status, taken.attempts), ("pending", 0))
+
+    def test_user_registration_notification(self):
+        data = {
+            "username": "Новый сотрудник",
+            "email": "new@sony.us",
+            "password": "123qwe",
+            "phone": "+7 9655965333",
+            "supplier": self.supplier.pk,
+        }
+        response = self.client.post(reverse("users:register"), data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            OutboxMessage.objects.filter(
+                subject="Пользователь ожидает подтверждения"
+            ).count(),
+            4,
+        )
+
+
+class ImageVariantsTestCase(TemporaryDirsMixin, APITestCase):
+    """Тестирование фоновой обработки изображений продуктов."""
+
+    temporary_dirs = ("MEDIA_ROOT",)
+
+    def setUp(self):
+        self.user = Users.objects.create(email="foxship@yandex.ru", is_active=True)
+        self.client.force_authenticate(user=self.user)
+        country = Country.objects.create(code="US", name="США")
+        category = Category.objects.create(name="Телевизоры")
+        vendor = Supplier.objects.create(
+            name="Sony Corporation",
+            type="vendor",
+            email="info@sony.us",
+            country_id=country.pk,
+        )
+        buffer = BytesIO()
+        Image.new("RGB", (1200, 800), "red").save(buffer, "PNG")
+        self.product = Product.objects.create(
+            name="Sony",
+            model="Bravia",
+            category_id=category.pk,
+            supplier_id=vendor.pk,
+            release_date="2024-10-01",
+            image=SimpleUploadedFile("bravia.png", buffer.getvalue()),
+        )
+
+    def test_variants(self):
+        with mock.patch("retailing.images.close_old_connections"):
+            process_image("retailing.product", self.product.pk, "image")
+        self.product.refresh_from_db()
+        variants = self.product.image_variants
+        self.assertEqual(variants["source"], self.product.image.name)
+        with Image.open(
+            os.path.join(settings.MEDIA_ROOT, variants["thumbnail"]["jpeg"])
+        ) as image:
+            self.assertEqual(image.size, (160, 107))
+
+        self.addCleanup(flush_views)
+        response = self.client.get(
+            reverse("retailing:product-detail", args=(self.product.pk,))
+        )
+        url = response.json()["image_variants"]["card"]["jpeg"]
+        prefix = "http://testserver/media/variants/"
+        self.assertTrue(url.startswith(prefix))
+        # при DEBUG = False варианты отдает веб-сервер, представление подключается только для разработки
+        response = serve_image_variant(
+            RequestFactory().get(url), url.removeprefix(prefix)
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("immutable", response["Cache-Control"])
+
+
+@override_settings(OPENAPI_CODE_VERSION="1.0")
+class OpenAPISchemaTestCase(TemporaryDirsMixin, APITestCase):
+    """Тестирование заранее построенной схемы OpenAPI."""
+
+    temporary_dirs = ("OPENAPI_SCHEMA_DIR",)
+
+    def setUp(self):
+        schema_store.clear()
+        self.addCleanup(schema_store.clear)
+
+    def test_prebuilt_schema(self):
+        # все представления описываются без запроса, без ошибок в журнале drf_yasg
+        with self.assertNoLogs("drf_yasg", level="WARNING"):
+            self.assertEqual(build_schema(), ("1.0", True))
+        self.assertEqual(build_schema(), ("1.0", False))
+        # временные файлы записи заменены готовыми файлами
+        self.assertFalse(
+            [
+                name
+                for name in os.listdir(settings.OPENAPI_SCHEMA_DIR)
+                if name.endswith(".tmp")
+            ]
+        )
+
+        # схема читается из файлов, а не строится заново
+        with mock.patch("retailing.schema.generate_schema") as generate_schema:
+            response = self.client.get("/swagger.json")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertIn("/order/create/", response.json()["paths"])
+            response = self.client.get(
+                "/swagger.json", HTTP_IF_NONE_MATCH=response["ETag"]
+            )
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(self.client.get("/swagger.yaml").status_code, 200)
+        generate_schema.assert_not_called()
+
+        response = self.client.get("/swagger/")
+        self.assertContains(response, "/swagger.json")
+        # схема по адресу страницы документации - заранее построенная схема
+        for url in ("/swagger/", "/redoc/"):
+            response = self.client.get(url, {"format": "openapi"})
+            self.assertRedirects(
+                response, "/swagger.json", fetch_redirect_response=False
+            )
@@ -6,23 +6,31 @@ from rest_framework.routers import SimpleRouter
 
 from retailing.apps import RetailingConfig
 from retailing.views import (CategoryViewSet, CountryViewSet,
-                             OrderCreateApiView, OrderDestroyApiView,
-                             OrderDetailApiView, OrderListApiView,
+                             EventStreamApiView, OrderCreateApiView,
+                             OrderDestroyApiView, OrderDetailApiView,
+                             OrderDocumentCreateApiView,
+                             OrderDocumentDetailApiView, OrderImportApiView,
+                             OrderImportDetailApiView,
+                             OrderImportResultListApiView, OrderListApiView,
                              OrderUpdateApiView, PayableViewSet,
-                             ProductViewSet, SupplierCreateApiView,
-                             SupplierDestroyApiView, SupplierDetailApiView,
-                             SupplierListApiView, SupplierUpdateApiView,
+                             ProductViewSet, SupplierBatchApiView,
+                             SupplierCreateApiView, SupplierDestroyApiView,
+                             SupplierDetailApiView, SupplierListApiView,
+                             SupplierUpdateApiView, SyncApiView,
                              WarehouseViewSet)
 
+api_info = openapi.Info(
+    title="API Documentation",
+    default_version="v1",
+    description="API управления торговой сетью электроники.",
+    terms_of_service="http://localhost:8000/retailing/",
+    contact=openapi.Contact(email="foxship@yandex.ru"),
+    license=openapi.License(name="BSD License"),
+)
+
+# страницы swagger/ и redoc/ загружают заранее построенную схему (SWAGGER_SETTINGS["SPEC_URL"], retailing/schema.py)
 schema_view = get_schema_view(
-    openapi.Info(
-        title="API Documentation",
-        default_version="v1",
-        description="API управления торговой сетью электроники.",
-        terms_of_service="http://localhost:8000/retailing/",
-        contact=openapi.Contact(email="foxship@yandex.ru"),
-        license=openapi.License(name="BSD License"),
-    ),
+    api_info,
     public=True,
     permission_classes=[permissions.AllowAny],
 )
@@ -43,6 +51,7 @@ router_payable.register("payable", PayableViewSet, basename="payable")
 urlpatterns = [
     path("supplier/", SupplierListApiView.as_view(), name="supplier_list"),
     path("supplier/create/", SupplierCreateApiView.as_view(), name="supplier_create"),
+    path("supplier/batch/", SupplierBatchApiView.as_view(), name="supplier_batch"),
     path(
         "supplier/<int:pk>/", SupplierDetailApiView.as_view(), name="supplier_retrieve"
     ),
@@ -56,8 +65,31 @@ urlpatterns = [
         SupplierDestroyApiView.as_view(),
         name="supplier_delete",
     ),
+    path("sync/", SyncApiView.as_view(), name="sync"),
+    path("events/", EventStreamApiView.as_view(), name="events"),
     path("order/", OrderListApiView.as_view(), name="order_list"),
     path("order/create/", OrderCreateApiView.as_view(), name="order_create"),
+    path(
+        "order/document/create/",
+        OrderDocumentCreateApiView.as_view(),
+        name="order_document_create",
+    ),
+    path(
+        "order/document/<int:pk>/",
+        OrderDocumentDetailApiView.as_view(),
+        name="order_document_retrieve",
+    ),
+    path("order/import/", OrderImportApiView.as_view(), name="order_import"),
+    path(
+        "order/import/<int:pk>/",
+        OrderImportDetailApiView.as_view(),
+        name="order_import_retrieve",
+    ),
+    path(
+        "order/import/<int:pk>/results/",
+        OrderImportResultListApiView.as_view(),
+        name="order_import_results",
+    ),
     path("order/<int:pk>/", OrderDetailApiView.as_view(), name="order_retrieve"),
     path("order/update/<int:pk>/", OrderUpdateApiView.as_view(), name="order_update"),
     path("order/delete/<int:pk>/", OrderDestroyApiView.as_view(), name="order_delete"),
@@ -0,0 +1,114 @@
+from decimal import ROUND_HALF_UP, Decimal
+
+from retailing.inventory import INCOMING_OPERATIONS, current_stock
+from retailing.models import Order
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Стоимостная оценка остатков собственника. Поступления (пополнение и покупки собственника) загружаются одним
+# запросом, отсортированными по товару и от новых к старым, цены переводятся в целые копейки:
+# - средневзвешенная себестоимость - сумма (количество * цена) поступлений товара, деленная на их количество;
+# - FIFO - текущий остаток товара состоит из последних поступлений: с самого нового слоя берется
+#   min(количество слоя, остаток минус количество в более новых слоях).
+# Суммы считаются в целых копейках без потери точности, в Decimal переводятся и округляются только итоги.
+# С пакетом numpy (extra valuation) слои считаются векторно по всем товарам сразу, без него - тем же расчетом
+# в цикле. Количество на складе берется из текущих остатков (Warehouse). Поступления читаются из журнала
+# операций, поэтому после выгрузки старых секций в архив (order_partitions --archive) средняя себестоимость
+# считается по поступлениям за срок хранения журнала (ORDER_PARTITION_RETENTION_MONTHS).
+
+CENT = Decimal("0.01")
+
+
+def load_layers(owner_id):
+    """Слои поступлений собственника (товар, количество, цена в копейках) по товару и от новых к старым."""
+    rows = (
+        Order.objects.filter(owner_id=owner_id, operation__in=INCOMING_OPERATIONS)
+        .order_by("product", "-created_at", "-id")
+        .values_list("product", "quantity", "price")
+    )
+    return [(product, quantity, int(price * 100)) for product, quantity, price in rows]
+
+
+def layer_totals(products, on_hand, layers):
+    """Количество и стоимость поступлений и стоимость по FIFO (копейки) по товарам products."""
+    position = {product: index for index, product in enumerate(products)}
+    total_quantity = [0] * len(products)
+    total_cost = [0] * len(products)
+    fifo = [0] * len(products)
+    for product, quantity, price in layers:
+        index = position.get(product)
+        if index is None:
+            continue
+        # слои товара идут от новых к старым: накопленное количество - количество в более новых слоях
+        taken = max(0, min(quantity, on_hand[index] - total_quantity[index]))
+        total_quantity[index] += quantity
+        total_cost[index] += quantity * price
+        fifo[index] += taken * price
+    return total_quantity, total_cost, fifo
+
+
+def layer_totals_numpy(products, on_hand, layers):
+    """То же, что layer_totals, векторно в целочисленных массивах NumPy."""
+    products = np.array(products, dtype=np.int64)
+    on_hand = np.array(on_hand, dtype=np.int64)
+    layer_products, quantities, prices = (
+        np.array(layers, dtype=np.int64).reshape(-1, 3).T
+    )
+    index = np.searchsorted(products, layer_products)
+    in_stock = index < len(products)
+    in_stock[in_stock] = products[index[in_stock]] == layer_products[in_stock]
+    index, quantities, prices = index[in_stock], quantities[in_stock], prices[in_stock]
+
+    size = len(products)
+    total_quantity = np.zeros(size, dtype=np.int64)
+    total_cost = np.zeros(size, dtype=np.int64)
+    fifo = np.zeros(size, dtype=np.int64)
+    np.add.at(total_quantity, index, quantities)
+    np.add.at(total_cost, index, quantities * prices)
+
+    # количество в более новых слоях того же товара: накопленная сумма внутри группы товара
+    new_group = (
+        np.r_[True, index[1:] != index[:-1]] if len(index) else np.array([], bool)
+    )
+    group = np.cumsum(new_group) - 1
+    cumulative = np.cumsum(quantities)
+    group_offset = (cumulative - quantities)[new_group]
+    newer = cumulative - quantities - group_offset[group]
+    taken = np.clip(on_hand[index] - newer, 0, quantities)
+    np.add.at(fifo, index, taken * prices)
+    return total_quantity.tolist(), total_cost.tolist(), fifo.tolist()
+
+
+def to_money(cents, divisor=1):
+    return (Decimal(cents) / divisor / 100).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def value_stock(owner_id):
+    """Оценка остатков собственника по товарам: количество, средняя себестоимость, стоимость по средней и по
+    FIFO."""
+    stock = {
+        product: quantity for (_, product), quantity in current_stock(owner_id).items()
+    }
+    if not stock:
+        return []
+    products = sorted(stock)
+    on_hand = [stock[product] for product in products]
+    totals = layer_totals_numpy if np is not None else layer_totals
+    total_quantity, total_cost, fifo = totals(products, on_hand, load_layers(owner_id))
+
+    results = []
+    for position, product in enumerate(products):
+        quantity = total_quantity[position] or 1
+        results.append(
+            {
+                "product": product,
+                "quantity": on_hand[position],
+                "average_cost": f"{to_money(total_cost[position], quantity)}",
+                "average_value": f"{to_money(total_cost[position] * on_hand[position], quantity)}",
+                "fifo_value": f"{to_money(fifo[position])}",
+            }
+        )
+    return results
@@ -1,25 +1,66 @@
-from django.db.models import Q, Sum
-from rest_framework import viewsets
+import os
+from datetime import date
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.db.models import Count, F, FilteredRelation, Q, Sum
+from django.http import HttpResponse, StreamingHttpResponse
+from django.shortcuts import redirect
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition, require_GET
+from django.views.static import serve
+from drf_yasg import openapi
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
 from rest_framework.exceptions import ValidationError
 from rest_framework.filters import OrderingFilter, SearchFilter
 from rest_framework.generics import (CreateAPIView, DestroyAPIView,
-                                     ListAPIView, RetrieveAPIView,
-                                     UpdateAPIView)
+                                     GenericAPIView, ListAPIView,
+                                     RetrieveAPIView, UpdateAPIView)
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import AllowAny
-
-from retailing.models import (Category, Country, Order, Payable, Product,
-                              Supplier, Warehouse)
+from rest_framework.response import Response
+
+from retailing.admission import AdmissionControlMixin
+from retailing.batch import BatchRetrieveMixin
+from retailing.cache import CatalogCacheMixin
+from retailing.events import event_stream, stream_available
+from retailing.filters import OrderFilter, SupplierFilter
+from retailing.identity import IdentityMapMixin, get_supplier, remember
+from retailing.images import VARIANTS_DIR, get_variants_max_age
+from retailing.imports import get_import_max_lines, submit_job
+from retailing.inventory import stock_as_of
+from retailing.leaderboards import get_windows, record_view
+from retailing.models import (Category, Country, Leaderboard, Order,
+                              OrderDocument, OrderImportJob, OrderImportResult,
+                              Payable, PayableArchive, Product, Supplier,
+                              Warehouse)
+from retailing.orders import (check_order_rules, check_stock, get_available,
+                              post_document, post_order)
 from retailing.paginations import (CategoryPaginator, CountryPaginator,
+                                   OfferPaginator, OrderImportResultPaginator,
                                    OrderPaginator, PayablePaginator,
                                    ProductPaginator, SupplierPaginator,
                                    WarehousePaginator)
+from retailing.renderers import EventStreamRenderer, ORJSONRenderer
+from retailing.schema import FORMATS, is_schema_view, schema_store
 from retailing.serialaizer import (CategorySerializer, CountrySerializer,
+                                   OfferSerializer, OrderDocumentSerializer,
+                                   OrderImportFileSerializer,
+                                   OrderImportJobSerializer,
+                                   OrderImportResultSerializer,
                                    OrderSerializer, OrderSerializerReadOnly,
-                                   PayableSerializer, ProductSerializer,
+                                   PayableArchiveSerializer, PayableSerializer,
+                                   ProductSerializer,
                                    ProductSerializerReadOnly,
                                    SupplierSerializer,
                                    SupplierSerializerReadOnly,
                                    WarehouseSerializer)
+from retailing.sync import build_sync_response, get_sync_page_size
+from retailing.valuation import value_stock
 from users.models import Users
 from users.permissions import IsActiveAndNotSuperuser
 
@@ -44,18 +85,72 @@ class CountryViewSet(viewsets.ModelViewSet):
         return super().get_permissions()
 
 
-class SupplierListApiView(ListAPIView):
+class SupplierListApiView(CatalogCacheMixin, ListAPIView):
+    """Список поставщиков с фильтрами country, country_code, type и city. С параметром facets=true в ответ
+    добавляется количество поставщиков по странам и типам для отфильтрованного списка."""
+
     queryset = Supplier.objects.all().order_by("name")
     serializer_class = SupplierSerializerReadOnly
     pagination_class = SupplierPaginator
     permission_classes = (AllowAny,)
+    filterset_class = SupplierFilter
+    cache_scopes = ("supplier_list",)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.request.query_params.get("facets") in ("1", "true", "True"):
+            response.data["facets"] = self.get_facets()
+        return response
+
+    def get_facets(self):
+        """Оба среза считаются одним запросом с группировкой по (страна, тип)."""
+        groups = (
+            self.filter_queryset(self.get_queryset())
+            .order_by()
+            .values("country", "type")
+            .annotate(count=Count("id"))
+        )
+        countries = {}
+        types = {}
+        for group in groups:
+            countries[group["country"]] = (
+                countries.get(group["country"], 0) + group["count"]
+            )
+            types[group["type"]] = types.get(group["type"], 0) + group["count"]
+        return {
+            "country": [
+                {"country": country, "count": count}
+                for country, count in sorted(countries.items())
+            ],
+            "type": [
+                {"type": supplier_type, "count": count}
+                for supplier_type, count in sorted(types.items())
+            ],
+        }
+
+
+class SupplierDetailApiView(CatalogCacheMixin, RetrieveAPIView):
+    queryset = Supplier.objects.all()
+    serializer_class = SupplierSerializerReadOnly
+    permission_classes = (AllowAny,)
 
+    def get_cache_scopes(self):
+        return ("supplier_detail", f"supplier:{self.kwargs['pk']}")
+
+
+class SupplierBatchApiView(BatchRetrieveMixin, GenericAPIView):
+    """Получение поставщиков по списку id: GET ?ids=1,2,3 или POST {"ids": [1, 2, 3]}."""
 
-class SupplierDetailApiView(RetrieveAPIView):
     queryset = Supplier.objects.all()
     serializer_class = SupplierSerializerReadOnly
     permission_classes = (AllowAny,)
 
+    def get(self, request, *args, **kwargs):
+        return self.batch_retrieve(request, *args, **kwargs)
+
+    def post(self, request, *args, **kwargs):
+        return self.batch_retrieve(request, *args, **kwargs)
+
 
 class SupplierCreateApiView(CreateAPIView):
     """Создание поставщика. Пользователь может создает поставщика и становится сотрудником у поставщика. Другого
@@ -68,7 +163,7 @@ class SupplierCreateApiView(CreateAPIView):
     def perform_create(self, serializer):
         """Создаем поставщика и заполним у пользователя номер поставщика."""
         if self.request.user.supplier_id is not None:
-            supplier_object = Supplier.objects.get(pk=self.request.user.supplier_id)
+            supplier_object = get_supplier(self.request)
             raise ValidationError(
                 f"Этот сотрудник уже зарегистрировал поставщика {supplier_object.name}!"
             )
@@ -90,6 +185,8 @@ class SupplierUpdateApiView(UpdateAPIView):
     serializer_class = SupplierSerializer
 
     def get_queryset(self):
+        if is_schema_view(self):
+            return Supplier.objects.none()
         return Supplier.objects.filter(pk=self.request.user.supplier_id)
 
     def perform_update(self, serializer):
@@ -103,6 +200,8 @@ class SupplierDestroyApiView(DestroyAPIView):
     """Право на удаление только у сотрудника компании поставщика."""
 
     def get_queryset(self):
+        if is_schema_view(self):
+            return Supplier.objects.none()
         return Supplier.objects.filter(pk=self.request.user.supplier_id)
 
     def perform_destroy(self, serializer):
@@ -123,6 +222,8 @@ class CategoryViewSet(viewsets.ModelViewSet):
     """Представление для категорий товаров."""
 
     def get_queryset(self):
+        if is_schema_view(self):
+            return Category.objects.none()
         if (
             self.action == "destroy"
             and Product.objects.filter(category=self.kwargs["pk"]) is not None
@@ -142,10 +243,20 @@ class CategoryViewSet(viewsets.ModelViewSet):
     permission_classes = (AllowAny,)
 
 
-class ProductViewSet(viewsets.ModelViewSet):
-    """Представление для товаров. Продукт может создавать только сотрудник завода производителя (вендора)."""
+class ProductViewSet(
+    IdentityMapMixin, BatchRetrieveMixin, CatalogCacheMixin, viewsets.ModelViewSet
+):
+    """Представление для товаров. Продукт может создавать только сотрудник завода производителя (вендора).
+    Кешируется только список, просмотр продукта увеличивает счетчик просмотров и не кешируется."""
+
+    def get_cache_scopes(self):
+        if self.action == "list":
+            return ("product_list",)
+        return ()
 
     def get_queryset(self):
+        if is_schema_view(self):
+            return Product.objects.none()
         if (
             self.action == "destroy"
             and Order.objects.filter(product=self.kwargs["pk"]) is not None
@@ -166,7 +277,7 @@ class ProductViewSet(viewsets.ModelViewSet):
             return ProductSerializerReadOnly
 
     def get_permissions(self):
-        if self.action in ["list", "retrieve"]:
+        if self.action in ["list", "retrieve", "batch", "leaderboard"]:
             self.permission_classes = (AllowAny,)
         else:
             self.permission_classes = (IsActiveAndNotSuperuser,)
@@ -181,7 +292,7 @@ class ProductViewSet(viewsets.ModelViewSet):
             )
         product = serializer.save()
         product.user = self.request.user
-        product.supplier = self.request.user.supplier
+        product.supplier = get_supplier(self.request)
         product.save()
 
     def retrieve(self, request, *args, **kwargs):
@@ -189,8 +300,90 @@ class ProductViewSet(viewsets.ModelViewSet):
         obj = self.get_object()
         obj.view_counter = obj.view_counter + 1
         obj.save(update_fields=("view_counter",))
+        record_view(obj.pk)
         return super().retrieve(request, *args, **kwargs)
 
+    @action(detail=True, methods=["get"])
+    def offers(self, request, *args, **kwargs):
+        """Поставщики, у которых товар есть на складе, с последней ценой продажи. Фильтры: country,
+        country_code, type. Цена присоединяется из таблицы LastPrice одним LEFT JOIN по уникальному индексу
+        (товар, поставщик), остаток поставщика - сумма секций остатка (with_totals). Поставщики с остатком
+        выбираются по частичному индексу warehouse_in_stock_idx: у них есть секция с quantity > 0 (по сумме
+        секций, вычисляемой подзапросом, индекс не используется)."""
+        product = self.get_object()
+        in_stock = Warehouse.objects.filter(product=product.pk, quantity__gt=0).values(
+            "owner"
+        )
+        offers = (
+            Warehouse.objects.with_totals()
+            .filter(product=product.pk, owner__in=in_stock)
+            .select_related("owner")
+            .annotate(
+                offer_price=FilteredRelation(
+                    "owner__supplier_last_price",
+                    condition=Q(owner__supplier_last_price__product=product.pk),
+                ),
+                last_price=F("offer_price__price"),
+                last_sold_at=F("offer_price__sold_at"),
+            )
+        )
+        if request.query_params.get("country"):
+            offers = offers.filter(owner__country=request.query_params["country"])
+        if request.query_params.get("country_code"):
+            offers = offers.filter(
+                owner__country__code=request.query_params["country_code"].upper()
+            )
+        if request.query_params.get("type"):
+            offers = offers.filter(owner__type=request.query_params["type"])
+        offers = offers.order_by(F("last_price").asc(nulls_last=True), "owner__name")
+
+        paginator = OfferPaginator()
+        page = paginator.paginate_queryset(offers, request, view=self)
+        return paginator.get_paginated_response(OfferSerializer(page, many=True).data)
+
+    @action(detail=False, methods=["get"])
+    def leaderboard(self, request, *args, **kwargs):
+        """Рейтинг товаров: kind=viewed|selling, scope=global|category|country (scope_id - id категории или
+        страны производителя), window - окно в днях из LEADERBOARD_WINDOWS."""
+        kind = request.query_params.get("kind", "selling")
+        scope = request.query_params.get("scope", "global")
+        if kind not in dict(Leaderboard.KIND) or scope not in dict(Leaderboard.SCOPE):
+            raise ValidationError("Неизвестный вид или срез рейтинга !")
+        try:
+            window = int(request.query_params.get("window", get_windows()[0]))
+            scope_id = (
+                int(request.query_params["scope_id"]) if scope != "global" else None
+            )
+        except (KeyError, ValueError):
+            raise ValidationError("Некорректные параметры window или scope_id !")
+        if window not in get_windows():
+            raise ValidationError(f"Доступные окна рейтинга: {get_windows()} !")
+
+        rows = (
+            Leaderboard.objects.filter(
+                kind=kind, scope=scope, scope_id=scope_id, window=window
+            )
+            .select_related("product")
+            .order_by("rank")
+        )
+        return Response(
+            [
+                {
+                    "rank": row.rank,
+                    "product": row.product_id,
+                    "name": row.product.name,
+                    "score": row.score,
+                }
+                for row in rows
+            ]
+        )
+
+    @action(detail=False, methods=["get", "post"])
+    def batch(self, request, *args, **kwargs):
+        """Получение продуктов по списку id. Используется для сверки каталогов, поэтому счетчик просмотров
+        не увеличивается."""
+        return self.batch_retrieve(request, *args, **kwargs)
+
     filter_backends = [SearchFilter, OrderingFilter]
     ordering_fields = ("name",)
     search_fields = ("name", "category")
@@ -202,139 +395,297 @@ class WarehouseViewSet(viewsets.ModelViewSet):
     товаров (owner = supplier_id)."""
 
     def get_queryset(self):
+        if is_schema_view(self):
+            return Warehouse.objects.none()
         if self.action in ["list", "retrieve"]:
-            return Warehouse.objects.filter(owner=self.request.user.supplier_id)
+            return Warehouse.objects.with_totals().filter(
+                owner=self.request.user.supplier_id
+            )
         else:
             raise ValidationError(
                 "Невозможно создать, изменить и удалить товар на складе, разрешен только просмотр !"
             )
 
+    @action(detail=False, methods=["get"], url_path="as-of")
+    def as_of(self, request):
+        """Остатки своих товаров на конец указанного дня (?date=ГГГГ-ММ-ДД)."""
+        try:
+            day = date.fromisoformat(request.query_params.get("date", ""))
+        except ValueError:
+            raise ValidationError("Укажите дату в формате ГГГГ-ММ-ДД (?date=...) !")
+        stock = stock_as_of(request.user.supplier_id, day)
+        return Response(
+            {
+                "date": day,
+                "results": [
+                    {"product": product, "quantity": quantity}
+                    for product, quantity in sorted(stock.items())
+                ],
+            }
+        )
+
+    @action(detail=False, methods=["get"])
+    def valuation(self, request):
+        """Стоимостная оценка своих остатков по средневзвешенной себестоимости и FIFO."""
+        results = value_stock(request.user.supplier_id)
+        totals = {
+            key: f"{sum(Decimal(item[key]) for item in results):.2f}"
+            for key in ("average_value", "fifo_value")
+        }
+        return Response({"results": results, "totals": totals})
+
     serializer_class = WarehouseSerializer
     pagination_class = WarehousePaginator
 
     permission_classes = (IsActiveAndNotSuperuser,)
 
 
+class SyncApiView(GenericAPIView):
+    """Изменения поставщиков, продуктов и своих складов после курсора (?cursor=...&limit=...). Ответ содержит
+    изменения (upsert) и удаления (delete) в порядке фиксации и новый курсор для следующего запроса. Без курсора
+    журнал выдается с начала. Если курсор старше срока хранения журнала (или журнал уже очищался, а курсора нет),
+    ответ содержит resync: true - данные загружаются заново списками, синхронизация продолжается с курсора
+    ответа."""
+
+    permission_classes = (IsActiveAndNotSuperuser,)
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter("cursor", openapi.IN_QUERY, type=openapi.TYPE_STRING),
+            openapi.Parameter("limit", openapi.IN_QUERY, type=openapi.TYPE_INTEGER),
+        ],
+        responses={
+            status.HTTP_200_OK: "Изменения (upsert, delete), новый курсор и признак resync"
+        },
+    )
+    def get(self, request, *args, **kwargs):
+        try:
+            limit = int(request.query_params.get("limit", get_sync_page_size()))
+        except ValueError:
+            raise ValidationError("Параметр limit должен быть целым числом !")
+        limit = max(1, min(limit, get_sync_page_size()))
+        data = build_sync_response(
+            request.query_params.get("cursor", ""),
+            request.user.supplier_id,
+            limit,
+            {
+                "supplier": SupplierSerializerReadOnly,
+                "product": ProductSerializerReadOnly,
+                "warehouse": WarehouseSerializer,
+            },
+            self.get_serializer_context(),
+        )
+        return Response(data)
+
+
+class EventStreamApiView(GenericAPIView):
+    """Поток событий поставщика (server-sent events): order_posted - покупка у поставщика, stock_changed -
+    изменение его остатка. Для возобновления передается заголовок Last-Event-ID (или параметр last_event_id).
+    Требует запуска через ASGI (config/asgi.py)."""
+
+    permission_classes = (IsActiveAndNotSuperuser,)
+    renderer_classes = (EventStreamRenderer, ORJSONRenderer)
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter(
+                "last_event_id", openapi.IN_QUERY, type=openapi.TYPE_INTEGER
+            ),
+        ],
+        responses={status.HTTP_200_OK: "Поток событий text/event-stream"},
+    )
+    def get(self, request, *args, **kwargs):
+        if request.user.supplier_id is None:
+            raise ValidationError("Пользователь не является сотрудником поставщика !")
+        if not isinstance(request._request, ASGIRequest):
+            # под WSGI бесконечный поток занимал бы рабочий поток процесса до отключения клиента
+            return Response(
+                {"detail": "Поток событий доступен только при запуске через ASGI !"},
+                status=status.HTTP_501_NOT_IMPLEMENTED,
+            )
+        if not stream_available():
+            return Response(
+                {"detail": "Превышено количество одновременных потоков событий !"},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={"Retry-After": "5"},
+            )
+        last_event_id = request.headers.get(
+            "Last-Event-ID", request.query_params.get("last_event_id")
+        )
+        try:
+            last_event_id = int(last_event_id) if last_event_id else None
+        except ValueError:
+            raise ValidationError("Некорректный Last-Event-ID !")
+
+        response = StreamingHttpResponse(
+            event_stream(request.user.supplier_id, last_event_id),
+            content_type="text/event-stream",
+        )
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+
 class OrderListApiView(ListAPIView):
+    """Операции собственника с фильтрами по периоду, товару, поставщику и виду операции. В ответ добавляются
+    итоги (quantity, amount, payment_amount) по всему отфильтрованному набору, посчитанные одним запросом."""
+
     def get_queryset(self):
-        return Order.objects.filter(owner=self.request.user.supplier)
+        if is_schema_view(self):
+            return Order.objects.none()
+        return Order.objects.filter(owner=self.request.user.supplier_id)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        response.data["totals"] = self.get_totals()
+        return response
+
+    def get_totals(self):
+        totals = self.filter_queryset(self.get_queryset()).aggregate(
+            quantity=Sum("quantity"),
+            amount=Sum("amount"),
+            payment_amount=Sum("payment_amount"),
+        )
+        return {
+            "quantity": totals["quantity"] or 0,
+            "amount": f"{totals['amount'] or 0:.2f}",
+            "payment_amount": f"{totals['payment_amount'] or 0:.2f}",
+        }
 
     serializer_class = OrderSerializerReadOnly
     pagination_class = OrderPaginator
+    filterset_class = OrderFilter
     permission_classes = (IsActiveAndNotSuperuser,)
 
 
-class OrderCreateApiView(CreateAPIView):
+class OrderCreateApiView(AdmissionControlMixin, CreateAPIView):
     """Реализованы операции addition - пополнение склада вендором и buying - покупка другими участниками торговой сети"""
 
+    admission_scope = "order_write"
     serializer_class = OrderSerializer
     permission_classes = (IsActiveAndNotSuperuser,)
 
+    @transaction.atomic
     def perform_create(self, serializer):
         operation = serializer.validated_data["operation"]
         supplier = serializer.validated_data["supplier"]
-
-        if operation == "addition" and self.request.user.supplier_type != "vendor":
-            raise ValidationError(
-                f"Пополнить склад готовой продукций может только вендор !"
-            )
-        if (
-            operation == "addition"
-            and self.request.user.supplier_type == "vendor"
-            and supplier.pk != self.request.user.supplier_id
-        ):
-            raise ValidationError(
-                f"Пополнить склад готовой продукции может только сотрудник вендора !"
+        check_order_rules(self.request.user, operation, supplier)
+        # при пополнении склада поставщик операции - компания пользователя, повторно ее не читаем
+        remember(self.request, supplier)
+        get_supplier(self.request)
+        if operation == "buying":
+            # проверяем есть ли у поставщика требуемое количество товара
+            check_stock(
+                get_available(supplier, serializer.validated_data["product"]),
+                serializer.validated_data["quantity"],
             )
+        post_order(serializer.save(), self.request.user)
 
-        if operation == "buying" and supplier.pk == self.request.user.supplier_id:
-            raise ValidationError(f"Нельзя купить товар у самого себя !")
 
-        if operation == "buying" and self.request.user.supplier_type == "vendor":
-            raise ValidationError(
-                f"Вендор может пополнить склад готовой продукции но не может купить !"
-            )
+class OrderDocumentCreateApiView(AdmissionControlMixin, CreateAPIView):
+    """Документ операции с несколькими товарами одного поставщика. Проводится одной транзакцией по тем же
+    правилам, что и отдельная операция."""
 
-        if (
-            operation == "buying"
-            and self.request.user.supplier_type == "distributor"
-            and supplier.type != "vendor"
-        ):
-            raise ValidationError(
-                f"Дистрибьютор может купить товар только у завода производителя !"
-            )
+    admission_scope = "order_write"
+    serializer_class = OrderDocumentSerializer
+    permission_classes = (IsActiveAndNotSuperuser,)
 
-        if (
-            operation == "buying"
-            and self.request.user.supplier_type == "retailer"
-            and supplier.type not in ["vendor", "distributor"]
-        ):
+    @transaction.atomic
+    def perform_create(self, serializer):
+        lines = serializer.validated_data["document_line"]
+        products = Product.objects.in_bulk({line["product_id"] for line in lines})
+        missing = {line["product_id"] for line in lines} - set(products)
+        if missing:
+            raise ValidationError(f"Товары не найдены: {sorted(missing)} !")
+        remember(self.request, serializer.validated_data["supplier"])
+        get_supplier(self.request)
+        serializer.instance = post_document(
+            self.request.user,
+            serializer.validated_data["supplier"],
+            serializer.validated_data["operation"],
+            [
+                (products[line["product_id"]], line["quantity"], line["price"])
+                for line in lines
+            ],
+            serializer.validated_data.get("payment_amount", 0),
+        )
+
+
+class OrderDocumentDetailApiView(RetrieveAPIView):
+    def get_queryset(self):
+        if is_schema_view(self):
+            return OrderDocument.objects.none()
+        return OrderDocument.objects.filter(
+            owner=self.request.user.supplier_id
+        ).prefetch_related("document_line")
+
+    serializer_class = OrderDocumentSerializer
+    permission_classes = (IsActiveAndNotSuperuser,)
+
+
+class OrderImportApiView(AdmissionControlMixin, GenericAPIView):
+    """Пакетная загрузка операций: файл JSONL в поле file, в каждой строке операция в формате создания
+    операции. Операции проводятся в фоне по тем же правилам, ответ - задание загрузки для опроса прогресса."""
+
+    admission_scope = "order_import"
+    permission_classes = (IsActiveAndNotSuperuser,)
+    serializer_class = OrderImportFileSerializer
+    parser_classes = (MultiPartParser,)
+
+    @swagger_auto_schema(responses={status.HTTP_202_ACCEPTED: OrderImportJobSerializer})
+    def post(self, request, *args, **kwargs):
+        file = request.FILES.get("file")
+        if file is None:
+            raise ValidationError("Не передан файл операций (file) !")
+        lines = sum(1 for line in file if line.strip())
+        if not lines:
+            raise ValidationError("Файл операций пуст !")
+        if lines > get_import_max_lines():
             raise ValidationError(
-                f"Ритейлер может купить товар только у завода производителя (вендора) или дистрибьютера !"
+                f"Можно загрузить не более {get_import_max_lines()} операций за раз !"
             )
+        file.seek(0)
+        job = OrderImportJob.objects.create(user=request.user, file=file, total=lines)
+        submit_job(job)
+        return Response(
+            OrderImportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED
+        )
 
-        if operation == "buying":
-            # проверяем есть ли у поставщика требуемое количество товара
-            warehouse_quantity = Warehouse.objects.filter(
-                owner=supplier.pk, product=serializer.validated_data["product"]
-            ).aggregate(Sum("quantity"))
-            if warehouse_quantity["quantity__sum"] is None:
-                raise ValidationError(f"У поставщика отсутствует требуемый товар !")
-            if (
-                warehouse_quantity["quantity__sum"]
-                < serializer.validated_data["quantity"]
-            ):
-                raise ValidationError(f"У поставщика недостаточно требуемого товара !")
-
-        order = serializer.save()
-        order.user = self.request.user
-        order.owner = self.request.user.supplier
-        order.amount = order.price * order.quantity
-        order.save()
-        if operation in ["addition", "buying"]:
-            # перемещаем купленный товар на остаток покупателя
-            warehouse_owner = list(
-                Warehouse.objects.filter(owner=order.owner.id, product=order.product.id)
-            )
-            if len(warehouse_owner) == 1:
-                warehouse_owner[0].quantity += order.quantity
-                warehouse_owner[0].save()
-            else:
-                Warehouse.objects.create(
-                    owner=order.owner, product=order.product, quantity=order.quantity
-                )
-            if self.request.user.supplier_type != "vendor":
-                # уменьшаем у поставщика остаток товара если это покупка
-                warehouse_supplier = list(
-                    Warehouse.objects.filter(
-                        owner=order.supplier, product=order.product
-                    )
-                )
-                warehouse_supplier[0].quantity -= order.quantity
-                warehouse_supplier[0].save()
-
-            if (
-                self.request.user.supplier_type != "vendor"
-                and order.quantity != order.payment_amount
-            ):
-                # Если стоимость товара отличается от оплаченной суммы то разницу записываем в долг поставщику
-                # или покупателю. Если положительная сумма должник покупатель, отрицательная - поставщик.
-                payable = list(
-                    Payable.objects.filter(owner=order.owner, supplier=order.supplier)
-                )
-                if len(payable) == 1:
-                    payable[0].amount += order.amount - order.payment_amount
-                    payable[0].save()
-                else:
-                    Payable.objects.create(
-                        owner=order.owner,
-                        supplier=order.supplier,
-                        amount=order.amount - order.payment_amount,
-                    )
+
+class OrderImportDetailApiView(RetrieveAPIView):
+    """Статус и прогресс своего задания загрузки операций."""
+
+    def get_queryset(self):
+        if is_schema_view(self):
+            return OrderImportJob.objects.none()
+        return OrderImportJob.objects.filter(user=self.request.user)
+
+    serializer_class = OrderImportJobSerializer
+    permission_classes = (IsActiveAndNotSuperuser,)
+
+
+class OrderImportResultListApiView(ListAPIView):
+    """Результаты строк своего задания загрузки по порядку строк, ?errors=true - только строки с ошибками."""
+
+    def get_queryset(self):
+        if is_schema_view(self):
+            return OrderImportResult.objects.none()
+        results = OrderImportResult.objects.filter(
+            job=self.kwargs["pk"], job__user=self.request.user
+        ).order_by("line")
+        if self.request.query_params.get("errors") == "true":
+            results = results.filter(error__isnull=False)
+        return results
+
+    serializer_class = OrderImportResultSerializer
+    pagination_class = OrderImportResultPaginator
+    permission_classes = (IsActiveAndNotSuperuser,)
 
 
 class OrderDetailApiView(RetrieveAPIView):
     def get_queryset(self):
+        if is_schema_view(self):
+            return Order.objects.none()
         return Order.objects.filter(pk=self.kwargs["pk"], user=self.request.user)
 
     serializer_class = OrderSerializerReadOnly
@@ -342,7 +693,11 @@ class OrderDetailApiView(RetrieveAPIView):
 
 
 class OrderUpdateApiView(UpdateAPIView):
+    serializer_class = OrderSerializer
+
     def get_queryset(self):
+        if is_schema_view(self):
+            return Order.objects.none()
         raise ValidationError(
             "Невозможно изменить операцию, разрешены только создание и просмотр !"
         )
@@ -350,6 +705,8 @@ class OrderUpdateApiView(UpdateAPIView):
 
 class OrderDestroyApiView(DestroyAPIView):
     def get_queryset(self):
+        if is_schema_view(self):
+            return Order.objects.none()
         raise ValidationError(
             "Невозможно удалить операцию, разрешены только создание и просмотр !"
         )
@@ -363,11 +720,13 @@ class PayableViewSet(viewsets.ModelViewSet):
     только с админ-панели."""
 
     def get_queryset(self):
+        if is_schema_view(self):
+            return Payable.objects.none()
         if self.action in ["list", "retrieve"]:
             # из модели задолженностей выводятся только несписанные задолженности.
             return Payable.objects.filter(
-                Q(owner=self.request.user.supplier)
-                | Q(supplier=self.request.user.supplier),
+                Q(owner=self.request.user.supplier_id)
+                | Q(supplier=self.request.user.supplier_id),
                 is_paid=False,
             )
         else:
@@ -375,6 +734,56 @@ class PayableViewSet(viewsets.ModelViewSet):
                 "Невозможно создать, изменить и удалить задолженность, разрешен только просмотр !"
             )
 
+    @action(detail=False, methods=["get"])
+    def archive(self, request):
+        """История списанных задолженностей, перенесенных в архив (команда archive_payables)."""
+        supplier = request.user.supplier_id
+        queryset = PayableArchive.objects.filter(
+            Q(owner=supplier) | Q(supplier=supplier)
+        ).order_by("-paid_date", "-id")
+        page = self.paginate_queryset(queryset)
+        serializer = PayableArchiveSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
     serializer_class = PayableSerializer
     pagination_class = PayablePaginator
     permission_classes = (IsActiveAndNotSuperuser,)
+
+
+def serve_image_variant(request, path):
+    """Отдача вариантов изображений из MEDIA_ROOT/variants при разработке (подключается только при DEBUG).
+    Адрес варианта содержит хеш исходного файла и не меняется вместе с содержимым, поэтому ответ кешируется
+    клиентом и прокси на IMAGE_VARIANTS_MAX_AGE секунд. В рабочем режиме каталог отдает веб-сервер с таким же
+    заголовком Cache-Control (README) или хранилище файлов (STORAGES) с CDN."""
+    response = serve(
+        request, path, document_root=os.path.join(settings.MEDIA_ROOT, VARIANTS_DIR)
+    )
+    response["Cache-Control"] = f"public, max-age={get_variants_max_age()}, immutable"
+    return response
+
+
+def schema_etag(request, schema_format):
+    return schema_store.get(schema_format)[1]
+
+
+@require_GET
+@condition(etag_func=schema_etag)
+def openapi_schema(request, schema_format):
+    """Заранее построенная схема OpenAPI из памяти процесса. Клиент проверяет актуальность схемы по ETag
+    и при неизменной версии кода получает 304."""
+    body, _ = schema_store.get(schema_format)
+    response = HttpResponse(body, content_type=FORMATS[schema_format][1])
+    patch_cache_control(response, public=True, no_cache=True)
+    return response
+
+
+def schema_ui(ui_view):
+    """Страница документации drf_yasg (swagger/, redoc/). Запрос схемы по адресу страницы (?format=openapi)
+    перенаправляется на заранее построенную схему, иначе drf_yasg строит ее заново при каждом запросе."""
+
+    def view(request, *args, **kwargs):
+        if request.GET.get("format") == "openapi":
+            return redirect("schema-json")
+        return ui_view(request, *args, **kwargs)
+
+    return view
@@ -11,3 +11,4 @@ class UserAdmin(admin.ModelAdmin):
         "phone",
         "tg_chat_id",
     )
+    readonly_fields = ("avatar_variants",)
@@ -0,0 +1,32 @@
+import copy
+
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+
+from retailing.invalidation import LocalCache, listener_running
+
+# Пользователи по id в памяти процесса. Записи удаляются шиной инвалидации при изменении пользователя
+# в любом рабочем процессе. Без запущенного слушателя шины (CACHE_INVALIDATION_LISTENER) кеш не используется,
+# иначе деактивация пользователя или смена поставщика в другом процессе не действовали бы до 300 секунд.
+identity_cache = LocalCache("users.users", timeout=300)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWT-аутентификация без запроса пользователя из БД на каждый запрос. Представления изменяют request.user,
+    поэтому каждому запросу выдается копия закешированного объекта."""
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None or api_settings.CHECK_REVOKE_TOKEN or not listener_running():
+            return super().get_user(validated_token)
+
+        user = identity_cache.get(user_id)
+        if user is None:
+            user = super().get_user(validated_token)
+            identity_cache.set(user.pk, user)
+        elif not api_settings.USER_AUTHENTICATION_RULE(user):
+            identity_cache.evict(user_id)
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return copy.copy(user)
@@ -0,0 +1,115 @@
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import (check_password, get_hasher,
+                                         identify_hasher, make_password)
+
+from retailing.admission import ServiceOverloaded
+
+# Проверка паролей при входе выполняется в отдельном пуле из LOGIN_HASH_WORKERS потоков (PBKDF2 в hashlib
+# отпускает GIL): сколько бы запросов входа ни обрабатывал сервер, одновременно хешируется не больше
+# LOGIN_HASH_WORKERS паролей, поэтому всплеск входов не отнимает процессор у остальных запросов. Рабочий поток
+# запроса (WSGI или ASGI) ждет результат проверки, то есть каждая принятая проверка, в том числе ожидающая
+# в очереди, занимает рабочий поток. Поэтому в пул принимается не более LOGIN_HASH_WORKERS + LOGIN_HASH_QUEUE
+# проверок, и эта сумма должна быть заметно меньше количества потоков процесса; остальные попытки входа сразу
+# получают 503 с Retry-After. Пул и очередь у каждого процесса свои: сервер из N процессов хеширует одновременно
+# до N * LOGIN_HASH_WORKERS паролей.
+# Успешные обновления access-токена по refresh-токену кешируются в памяти процесса на
+# TOKEN_REFRESH_CACHE_TIMEOUT секунд.
+
+
+def get_hash_workers():
+    return getattr(settings, "LOGIN_HASH_WORKERS", 2)
+
+
+def get_hash_queue():
+    return getattr(settings, "LOGIN_HASH_QUEUE", 2)
+
+
+def get_retry_after():
+    return getattr(settings, "LOGIN_RETRY_AFTER", 1)
+
+
+def get_refresh_cache_timeout():
+    return getattr(settings, "TOKEN_REFRESH_CACHE_TIMEOUT", 30)
+
+
+class HashingOverloaded(ServiceOverloaded):
+    default_detail = "Слишком много одновременных входов, повторите попытку позже !"
+
+
+_executor = ThreadPoolExecutor(
+    max_workers=get_hash_workers(), thread_name_prefix="login-hash"
+)
+_slots = threading.BoundedSemaphore(get_hash_workers() + get_hash_queue())
+
+
+def verify_password(password, encoded):
+    """Проверка пароля по хешу. Возвращает (пароль верен, новый хеш или None). Новый хеш вычисляется, если
+    пароль захеширован не первым алгоритмом PASSWORD_HASHERS или с устаревшими параметрами.
+    """
+    if encoded is None:
+        # пользователь не найден: хешируем пароль, чтобы время ответа не выдавало наличие учетной записи
+        make_password(password)
+        return False, None
+    if not check_password(password, encoded):
+        return False, None
+    default = get_hasher()
+    if identify_hasher(encoded).algorithm != default.algorithm or default.must_update(
+        encoded
+    ):
+        return True, make_password(password)
+    return True, None
+
+
+def run_hashing(func, *args):
+    """Выполняем func в пуле хеширования и ждем результат. Если пул и очередь заполнены - HashingOverloaded."""
+    if not _slots.acquire(blocking=False):
+        raise HashingOverloaded(get_retry_after())
+    try:
+        future = _executor.submit(func, *args)
+    except RuntimeError:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    return future.result()
+
+
+class RefreshCache:
+    """Ответы обновления токена по дайджесту refresh-токена с ограниченным временем жизни."""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(token):
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token):
+        with self._lock:
+            item = self._data.get(self.key(token))
+        if item is None or item[0] < time.monotonic():
+            return None
+        return item[1]
+
+    def set(self, token, data, expires_in):
+        timeout = min(get_refresh_cache_timeout(), expires_in)
+        if timeout <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._data = {
+                key: item for key, item in self._data.items() if item[0] >= now
+            }
+            self._data[self.key(token)] = (now + timeout, data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+refresh_cache = RefreshCache()
@@ -20,6 +20,9 @@ class Users(AbstractUser):
     avatar = models.ImageField(
         upload_to="users/avatars/", verbose_name="Аватар", **NULLABLE
     )
+    avatar_variants = models.JSONField(
+        default=dict, blank=True, verbose_name="варианты аватара"
+    )
     tg_chat_id = models.CharField(
         max_length=50, verbose_name="Telergram chat_id", **NULLABLE
     )
@@ -1,10 +1,13 @@
 from rest_framework import serializers
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 
+from retailing.serialaizer import ImageVariantsField
 from users.models import Users
 
 
 class UserSerializer(serializers.ModelSerializer):
+    avatar_variants = ImageVariantsField()
+
     class Meta:
         model = Users
         fields = (
@@ -15,13 +18,16 @@ class UserSerializer(serializers.ModelSerializer):
             "supplier",
             "supplier_type",
             "is_personal_data",
+            "avatar_variants",
         )
 
 
 class UserSerializerReadOnly(serializers.ModelSerializer):
+    avatar_variants = ImageVariantsField()
+
     class Meta:
         model = Users
-        fields = ("id", "username", "email")
+        fields = ("id", "username", "email", "avatar_variants")
 
 
 class UserSerializerForSuperuser(serializers.ModelSerializer):
@@ -34,6 +40,20 @@ class UserSerializerForSuperuser(serializers.ModelSerializer):
         fields = ("is_active",)
 
 
+class UserLoginSerializer(serializers.Serializer):
+    """Проверка полей запроса входа. Пароль проверяется представлением в пуле хеширования."""
+
+    email = serializers.CharField()
+    password = serializers.CharField(trim_whitespace=False)
+
+
+class TokenPairSerializer(serializers.Serializer):
+    """Ответ входа (для схемы OpenAPI)."""
+
+    refresh = serializers.CharField()
+    access = serializers.CharField()
+
+
 class UserTokenObtainPairSerializer(TokenObtainPairSerializer):
     @classmethod
     def get_token(cls, user):
@@ -0,0 +1,17 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from retailing.images import schedule_variants
+from retailing.signals import notify_changed
+from users.models import Users
+
+
+@receiver(post_save, sender=Users)
+@receiver(post_delete, sender=Users)
+def user_changed(sender, instance, **kwargs):
+    notify_changed(sender, instance)
+
+
+@receiver(post_save, sender=Users)
+def avatar_saved(sender, instance, **kwargs):
+    schedule_variants(instance, "avatar")
@@ -1,7 +1,19 @@
+import json
+import threading
+from unittest import mock
+
+from django.contrib.auth.hashers import make_password
+from django.test import override_settings
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import AccessToken
 
+from retailing.models import Country, Supplier
+from retailing.schema import generate_schema
+from users.authentication import CachedJWTAuthentication, identity_cache
+from users.login import refresh_cache
 from users.models import Users
 
 
@@ -77,3 +89,155 @@ class UsersTestCase(APITestCase):
         response = self.client.delete(url)
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         self.assertEqual(Users.objects.all().count(), 1)
+
+    def test_user_batch(self):
+        """Суперпользователь получает всех запрошенных пользователей."""
+        url = reverse("users:users_batch")
+        response = self.client.get(
+            url, {"ids": f"{self.user.pk},{self.user_vendor.pk}"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.json()["results"]), 2)
+
+
+class IdentityMapTestCase(APITestCase):
+    """Количество запросов к БД при работе сотрудника компании с пользователями: каждый объект читается
+    не более одного раза за запрос."""
+
+    def setUp(self):
+        country = Country.objects.create(code="RU", name="Россия")
+        self.supplier = Supplier.objects.create(
+            name="Звезда", type="vendor", email="info@zvezda.ru", country=country
+        )
+        self.user = Users.objects.create(
+            email="foxship@zdship.ru",
+            is_active=True,
+            supplier=self.supplier,
+            supplier_type="vendor",
+        )
+        self.colleague = Users.objects.create(
+            email="sveta@zdship.ru", supplier=self.supplier
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def test_retrieve_queries(self):
+        url = reverse("users:users_retrieve", args=(self.colleague.pk,))
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_update_queries(self):
+        url = reverse("users:users_update", args=(self.user.pk,))
+        # пользователь, проверка уникальности email, компания, два сохранения пользователя
+        with self.assertNumQueries(5):
+            response = self.client.patch(
+                url, {"email": "new@zdship.ru", "password": "123qwe"}
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertEqual(
+            (self.user.email, self.user.supplier_type), ("new@zdship.ru", "vendor")
+        )
+
+
+class IdentityCacheTestCase(APITestCase):
+    """Тестирование кеша пользователей JWT-аутентификации."""
+
+    def setUp(self):
+        identity_cache.evict()
+        self.user = Users.objects.create(email="ivc@gmail.com", is_active=True)
+        self.token = AccessToken.for_user(self.user)
+
+    @mock.patch("users.authentication.listener_running", return_value=True)
+    def test_user_cached_and_evicted(self, _):
+        authentication = CachedJWTAuthentication()
+        authentication.get_user(self.token)
+        with self.assertNumQueries(0):
+            user = authentication.get_user(self.token)
+        self.assertEqual(user.pk, self.user.pk)
+
+        self.user.phone = "+7 9655965222"
+        self.user.save()
+        self.assertIsNone(identity_cache.get(self.user.pk))
+        self.assertEqual(authentication.get_user(self.token).phone, "+7 9655965222")
+
+    def test_cache_bypassed_without_listener(self):
+        """Без слушателя шины изменения из других процессов не сбрасывают кеш, поэтому пользователь читается
+        из БД на каждый запрос."""
+        authentication = CachedJWTAuthentication()
+        authentication.get_user(self.token)
+        Users.objects.filter(pk=self.user.pk).update(is_active=False)
+        with self.assertRaises(AuthenticationFailed):
+            authentication.get_user(self.token)
+
+    @mock.patch("users.authentication.listener_running", return_value=True)
+    def test_cached_inactive_user_rejected(self, _):
+        authentication = CachedJWTAuthentication()
+        user = authentication.get_user(self.token)
+        identity_cache.get(user.pk).is_active = False
+        with self.assertNumQueries(0), self.assertRaises(AuthenticationFailed):
+            authentication.get_user(self.token)
+        self.assertIsNone(identity_cache.get(self.user.pk))
+
+
+@override_settings(
+    PASSWORD_HASHERS=[
+        "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+        "django.contrib.auth.hashers.MD5PasswordHasher",
+    ]
+)
+class LoginTestCase(APITestCase):
+    """Тестирование входа и обновления токена."""
+
+    def setUp(self):
+        self.user = Users.objects.create(
+            email="foxship@zdship.ru",
+            password=make_password("123qwe", hasher="md5"),
+            is_active=True,
+        )
+        refresh_cache.clear()
+
+    def login(self, password):
+        return self.client.post(
+            reverse("users:login"),
+            {"email": self.user.email, "password": password},
+            format="json",
+        )
+
+    def test_login_and_rehash(self):
+        response = self.login("wrong")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        response = self.login("123qwe")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            AccessToken(response.json()["access"])["email"], self.user.email
+        )
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith("pbkdf2_sha256$"))
+        self.assertEqual(self.login("123qwe").status_code, status.HTTP_200_OK)
+
+        # пул хеширования и очередь заполнены
+        with mock.patch("users.login._slots", threading.BoundedSemaphore(1)) as slots:
+            slots.acquire()
+            response = self.login("123qwe")
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response["Retry-After"], "1")
+
+    def test_refresh_cached(self):
+        refresh = self.login("123qwe").json()["refresh"]
+        url = reverse("users:token_refresh")
+        first = self.client.post(url, {"refresh": refresh}, format="json")
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(0):
+            second = self.client.post(url, {"refresh": refresh}, format="json")
+        self.assertEqual(first.json()["access"], second.json()["access"])
+
+        response = self.client.post(url, {"refresh": "broken"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_login_schema(self):
+        paths = json.loads(generate_schema()["json"])["paths"]
+        response = paths["/users/login/"]["post"]["responses"]["200"]
+        self.assertEqual(response["schema"]["$ref"], "#/definitions/TokenPair")
+        self.assertIn("/users/token/refresh/", paths)
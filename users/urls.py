@@ -1,11 +1,10 @@
 from django.urls import path
-from rest_framework.permissions import AllowAny
-from rest_framework_simplejwt.views import TokenRefreshView
 
 from users.apps import UsersConfig
-from users.views import (UserCreateAPIView, UserDestroyAPIView,
-                         UserListAPIView, UserRetrieveAPIView,
-                         UserTokenObtainPairView, UserUpdateAPIView)
+from users.views import (UserBatchAPIView, UserCreateAPIView,
+                         UserDestroyAPIView, UserListAPIView, UserLoginView,
+                         UserRetrieveAPIView, UserTokenRefreshView,
+                         UserUpdateAPIView)
 
 app_name = UsersConfig.name
 
@@ -13,16 +12,9 @@ urlpatterns = [
     path("", UserListAPIView.as_view(), name="users_list"),
     path("register/", UserCreateAPIView.as_view(), name="register"),
     path("<int:pk>/", UserRetrieveAPIView.as_view(), name="users_retrieve"),
+    path("batch/", UserBatchAPIView.as_view(), name="users_batch"),
     path("update/<int:pk>/", UserUpdateAPIView.as_view(), name="users_update"),
     path("delete/<int:pk>/", UserDestroyAPIView.as_view(), name="users_delete"),
-    path(
-        "login/",
-        UserTokenObtainPairView.as_view(permission_classes=(AllowAny,)),
-        name="login",
-    ),
-    path(
-        "token/refresh/",
-        TokenRefreshView.as_view(permission_classes=(AllowAny,)),
-        name="token_refresh",
-    ),
+    path("login/", UserLoginView.as_view(), name="login"),
+    path("token/refresh/", UserTokenRefreshView.as_view(), name="token_refresh"),
 ]
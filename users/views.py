@@ -9,16 +9,33 @@
 
 # Примечание: суперпользователь создается командой csu и имеет права только на управление пользователями.
 
-from rest_framework.exceptions import ValidationError
+import time
+
+from django.contrib.auth.models import update_last_login
+from django.db import transaction
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed, ValidationError
 from rest_framework.generics import (CreateAPIView, DestroyAPIView,
-                                     ListAPIView, RetrieveAPIView,
-                                     UpdateAPIView)
-from rest_framework_simplejwt.views import TokenObtainPairView
+                                     GenericAPIView, ListAPIView,
+                                     RetrieveAPIView, UpdateAPIView)
+from rest_framework.response import Response
+from rest_framework_simplejwt.serializers import (TokenObtainSerializer,
+                                                  TokenRefreshSerializer)
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.views import TokenRefreshView, TokenViewBase
 
+from retailing.batch import BatchRetrieveMixin
+from retailing.identity import get_instance, remember
 from retailing.models import Supplier
+from retailing.outbox import notify_superusers, notify_suppliers
+from retailing.schema import is_schema_view
+from users.login import refresh_cache, run_hashing, verify_password
 from users.models import Users
 from users.permissions import IsActive, IsActiveAndNotSuperuser, IsSuperuser
-from users.serializer import (UserSerializer, UserSerializerForSuperuser,
+from users.serializer import (TokenPairSerializer, UserLoginSerializer,
+                              UserSerializer, UserSerializerForSuperuser,
                               UserSerializerReadOnly,
                               UserTokenObtainPairSerializer)
 
@@ -31,45 +48,74 @@ class UserListAPIView(ListAPIView):
     ]
 
 
-class UserRetrieveAPIView(RetrieveAPIView):
+class UserObjectMixin:
+    """Пользователь из URL загружается через карту объектов запроса один раз за запрос. Если задано
+    denied_message, не суперпользователь получает доступ только к пользователям своей компании."""
+
+    queryset = Users.objects.all()
+    denied_message = None
+
+    def get_object(self):
+        user = get_instance(self.request, Users, self.kwargs["pk"])
+        if (
+            self.denied_message is not None
+            and not IsSuperuser().has_permission(self.request, self)
+            and user.supplier_id != self.request.user.supplier_id
+        ):
+            raise ValidationError(self.denied_message)
+        self.check_object_permissions(self.request, user)
+        return user
+
+
+class UserRetrieveAPIView(UserObjectMixin, RetrieveAPIView):
     serializer_class = UserSerializerReadOnly
+    denied_message = (
+        "У вас недостаточно прав для просмотра учетных данных пользователя !"
+    )
+
+    permission_classes = [
+        IsActive,
+    ]
 
-    def get_queryset(self):
+
+class UserBatchAPIView(BatchRetrieveMixin, GenericAPIView):
+    """Получение пользователей по списку id с теми же правами, что и при просмотре одного пользователя:
+    суперпользователь видит всех, остальные - только сотрудников своей компании."""
+
+    serializer_class = UserSerializerReadOnly
+    queryset = Users.objects.all()
+
+    def has_batch_object_permission(self, obj):
         if IsSuperuser().has_permission(self.request, self):
-            return Users.objects.all()
-        else:
-            user = Users.objects.get(pk=self.kwargs["pk"])
-            if user.supplier != self.request.user.supplier:
-                raise ValidationError(
-                    "У вас недостаточно прав для просмотра учетных данных пользователя !"
-                )
-            return Users.objects.filter(pk=self.kwargs["pk"])
+            return True
+        return obj.supplier_id == self.request.user.supplier_id
+
+    def get(self, request, *args, **kwargs):
+        return self.batch_retrieve(request, *args, **kwargs)
+
+    def post(self, request, *args, **kwargs):
+        return self.batch_retrieve(request, *args, **kwargs)
 
     permission_classes = [
         IsActive,
     ]
 
 
-class UserUpdateAPIView(UpdateAPIView):
+class UserUpdateAPIView(UserObjectMixin, UpdateAPIView):
     """Изменение аттрибутов пользователя, кроме принадлежности работодателю (supplier_id > 0), если он уже зарегистирован
     в торговой сети за определенной компанией. Можно отвязать (supplier_id = None), если это не нарушает целостность БД
     а затем заново привязать к другой компании."""
 
-    def get_queryset(self):
-        if IsSuperuser().has_permission(self.request, self):
-            return Users.objects.all()
-        else:
-            # проверяем действительно ли пользователь зарегистрировался в той же компании
-            user = Users.objects.get(pk=self.kwargs["pk"])
-            if user.supplier != self.request.user.supplier:
-                raise ValidationError(
-                    "У вас недостаточно прав для изменения учетных данных пользователя !"
-                )
-            return Users.objects.filter(pk=self.kwargs["pk"])
+    # проверяем действительно ли пользователь зарегистрировался в той же компании
+    denied_message = (
+        "У вас недостаточно прав для изменения учетных данных пользователя !"
+    )
 
     def get_serializer_class(self):
+        if is_schema_view(self):
+            return UserSerializer
         if IsActiveAndNotSuperuser().has_permission(self.request, self):
-            user = Users.objects.get(pk=self.kwargs["pk"])
+            user = get_instance(self.request, Users, self.kwargs["pk"])
             if user == self.request.user:
                 # необходимо дать разрешение менять собственные данные
                 return UserSerializer
@@ -79,27 +125,26 @@ class UserUpdateAPIView(UpdateAPIView):
             return UserSerializer
 
     def perform_update(self, serializer):
-        user_obj = Users.objects.get(pk=self.kwargs["pk"])
+        # сериализатор изменяет экземпляр из карты запроса, прежнее место работы запоминаем до сохранения
+        old_supplier_id = serializer.instance.supplier_id
         user = serializer.save()
         if IsSuperuser().has_permission(self.request, self):
-            if user.is_personal_data:
-                user_obj.is_active = user.is_active
-            else:
+            if not user.is_personal_data:
                 raise ValidationError(
                     "Пользователь не дал разрешение на обработку персональных данных !"
                 )
         else:
             if (
-                user.supplier is not None
-                and user_obj.supplier is not None
-                and user_obj.supplier_id != user.supplier_id
+                user.supplier_id is not None
+                and old_supplier_id is not None
+                and old_supplier_id != user.supplier_id
             ):
                 raise ValidationError(
                     "Невозможно изменить место работы у пользователя зарегистрированного в сети за другой компанией !"
                 )
 
-            if user.supplier is not None:
-                supplier_object = Supplier.objects.get(pk=user.supplier_id)
+            if user.supplier_id is not None:
+                supplier_object = get_instance(self.request, Supplier, user.supplier_id)
                 user.supplier_type = supplier_object.type
             else:
                 user.supplier_type = None
@@ -111,15 +156,14 @@ class UserUpdateAPIView(UpdateAPIView):
     ]
 
 
-class UserDestroyAPIView(DestroyAPIView):
+class UserDestroyAPIView(UserObjectMixin, DestroyAPIView):
 
-    def get_queryset(self):
-        user_obj = Users.objects.get(pk=self.kwargs["pk"])
-        if user_obj.supplier is not None:
+    def perform_destroy(self, instance):
+        if instance.supplier_id is not None:
             raise ValidationError(
                 "Невозможно удалить пользователя который зарегистрирован в сети за компанией !"
             )
-        return Users.objects.all()
+        instance.delete()
 
     permission_classes = [
         IsSuperuser,
@@ -136,16 +180,80 @@ class UserCreateAPIView(CreateAPIView):
     queryset = Users.objects.all()
     permission_classes = []
 
+    @transaction.atomic
     def perform_create(self, serializer):
         user = serializer.save(is_active=False)
         user.set_password(self.request.data.get("password"))
         if user.supplier is not None:
-            supplier_object = Supplier.objects.get(pk=user.supplier_id)
-            user.supplier_type = supplier_object.type
+            # компания уже загружена сериализатором при проверке поля supplier
+            user.supplier_type = remember(self.request, user.supplier).type
         if IsSuperuser().has_permission(self.request, self):
             user.is_active = True
         user.save()
+        if not user.is_active:
+            # уведомление записывается в той же транзакции и отправляется процессом dispatch_outbox
+            subject = "Пользователь ожидает подтверждения"
+            body = (
+                f"Зарегистрирован пользователь {user.email}, требуется подтверждение."
+            )
+            if user.supplier_id is not None:
+                notify_suppliers([user.supplier_id], subject, body)
+            else:
+                notify_superusers(subject, body)
+
 
+class UserLoginView(TokenViewBase):
+    """Вход по email и паролю: пароль проверяется в ограниченном пуле хеширования (users/login.py), хеш
+    в устаревшем формате при успешном входе заменяется хешем первого алгоритма PASSWORD_HASHERS.
+    Ответ совпадает с ответом TokenObtainPairView."""
 
-class UserTokenObtainPairView(TokenObtainPairView):
-    serializer_class = UserTokenObtainPairSerializer
+    serializer_class = UserLoginSerializer
+
+    @swagger_auto_schema(responses={status.HTTP_200_OK: TokenPairSerializer})
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        email = serializer.validated_data["email"]
+        password = serializer.validated_data["password"]
+
+        user = Users.objects.filter(email=email).first()
+        is_valid, new_password = run_hashing(
+            verify_password, password, user.password if user else None
+        )
+        if not is_valid or not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(
+                TokenObtainSerializer.default_error_messages["no_active_account"],
+                "no_active_account",
+            )
+        if new_password is not None:
+            user.password = new_password
+            user.save(update_fields=["password"])
+        if api_settings.UPDATE_LAST_LOGIN:
+            update_last_login(None, user)
+
+        refresh = UserTokenObtainPairSerializer.get_token(user)
+        return Response({"refresh": str(refresh), "access": str(refresh.access_token)})
+
+
+class UserTokenRefreshView(TokenRefreshView):
+    """Обновление access-токена. Без ротации refresh-токенов успешный ответ кешируется, и повторные обновления
+    тем же токеном в течение TOKEN_REFRESH_CACHE_TIMEOUT секунд не обращаются к БД."""
+
+    serializer_class = TokenRefreshSerializer
+
+    def post(self, request, *args, **kwargs):
+        token = request.data.get("refresh")
+        cached = refresh_cache.get(token) if isinstance(token, str) else None
+        if cached is not None:
+            return Response(cached)
+        try:
+            response = super().post(request, *args, **kwargs)
+        except Users.DoesNotExist:
+            raise AuthenticationFailed(
+                TokenRefreshSerializer.default_error_messages["no_active_account"],
+                "no_active_account",
+            )
+        if not api_settings.ROTATE_REFRESH_TOKENS:
+            expires_in = RefreshToken(token, verify=False)["exp"] - time.time()
+            refresh_cache.set(token, response.data, expires_in)
+        return response